@@ -0,0 +1,86 @@
+import asyncio
+import csv
+import io
+import logging
+import os
+from database import credit_many
+from utils import send_with_retry
+from metrics import timed_handler
+from money import Money
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated Telegram user IDs allowed to run admin commands
+ADMIN_IDS = {int(uid) for uid in os.environ.get('ADMIN_IDS', '').split(',') if uid.strip()}
+MAX_REPORTED_ERRORS = 5
+
+def is_admin(user_id):
+    return user_id in ADMIN_IDS
+
+def parse_credits(lines, errors):
+    """
+    Read (user_id, amount) pairs from CSV lines, skipping a header row and bad rows.
+
+    Args:
+        lines (iterable): CSV text lines, `user_id,amount` per row.
+        errors (list): Receives (line_number, message) for every rejected row.
+
+    Yields:
+        tuple: (user_id, Money) for every valid row.
+    """
+    for line_number, row in enumerate(csv.reader(lines), 1):
+        if not row or not ''.join(row).strip():
+            continue
+        if line_number == 1 and not row[0].strip().lstrip('-').isdigit():
+            continue
+        try:
+            if len(row) < 2:
+                raise ValueError("expected user_id,amount")
+            user_id = int(row[0])
+            amount = Money.parse(row[1])
+            if amount <= 0:
+                raise ValueError("amount must be positive")
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+            continue
+        yield user_id, amount
+
+@timed_handler
+async def credit_command(update, context):
+    """
+    /credit [batch_id], sent as a reply to a CSV document of `user_id,amount` rows.
+
+    The batch ID defaults to the document's unique file ID, so sending the same file
+    again credits nobody twice.
+    """
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    if not is_admin(user_id):
+        return
+    reply = update.message.reply_to_message
+    document = reply.document if reply else None
+    if document is None:
+        await send_with_retry(context.bot, chat_id, "Reply to a CSV file of user_id,amount rows with /credit [batch_id].")
+        return
+    batch_id = context.args[0] if context.args else document.file_unique_id
+
+    file = await context.bot.get_file(document.file_id)
+    data = await file.download_as_bytearray()
+    errors = []
+    lines = io.TextIOWrapper(io.BytesIO(bytes(data)), encoding='utf-8-sig', newline='')
+    # credit_many pulls rows from the parser chunk by chunk; the database work runs off the event loop
+    result = await asyncio.to_thread(credit_many, parse_credits(lines, errors), batch_id)
+    logger.info(f"Admin {user_id} ran credit batch {batch_id}: {result}")
+
+    text = (
+        f"💸 Credit batch {batch_id}{'' if result['complete'] else ' (stopped by a database error, run it again)'}\n\n"
+        f"Rows: {result['rows']}\n"
+        f"Credited: {result['credited']} users, ${result['amount']:.2f}\n"
+        f"Already credited: {result['skipped']}\n"
+        f"Unknown users: {result['unknown']}\n"
+        f"Invalid rows: {len(errors)}\n"
+        f"Time: {result['seconds']:.2f}s ({result['rows_per_second']:.0f} rows/s)"
+    )
+    if errors:
+        text += "\n\n" + "\n".join(f"Line {line}: {message}" for line, message in errors[:MAX_REPORTED_ERRORS])
+    await send_with_retry(context.bot, chat_id, text)
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import database
+import utils  # Sets up logging on import
+from metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+# Backup configurations
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+# A write to the source restarts a stepped copy; past either limit the rest is copied in one step
+MAX_RESTARTS = 3
+STEP_BUDGET = 60.0
+KEEP = 24
+PREFIX = 'users-'
+# Seconds between the snapshots the bot schedules itself, see interval()
+DEFAULT_INTERVAL = 3600
+
+BACKUP_DURATION = histogram('bot_backup_seconds', "Time taken by an online snapshot of users.db.",
+                            buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+BACKUP_SIZE = gauge('bot_backup_size_bytes', "Size of the latest snapshot on disk.")
+BACKUP_LAST_SUCCESS = gauge('bot_backup_last_success_timestamp', "Unix time of the latest successful snapshot.")
+BACKUP_FAILURES = counter('bot_backup_failures_total', "Snapshots or restores that failed.", ('operation',))
+BACKUP_FALLBACKS = counter('bot_backup_fallbacks_total', "Stepped copies that kept restarting and were finished in one step.")
+
+class _CopyStalled(Exception):
+    pass
+
+def _open_snapshot(path):
+    # Snapshots may be gzipped; sqlite needs a plain file, so those are unpacked to a temp copy
+    if not path.endswith('.gz'):
+        return path, None
+    with gzip.open(path, 'rb') as src:
+        fd, plain = tempfile.mkstemp(suffix='.db')
+        with os.fdopen(fd, 'wb') as out:
+            shutil.copyfileobj(src, out)
+    return plain, plain
+
+def verify(path):
+    """
+    Check that a snapshot is a consistent database.
+
+    Args:
+        path (str): Snapshot file, plain or gzipped.
+
+    Returns:
+        dict: Schema version and row count per table.
+
+    Raises:
+        sqlite3.DatabaseError: If the snapshot is corrupt.
+    """
+    plain, temp = _open_snapshot(path)
+    try:
+        conn = sqlite3.connect(f"file:{plain}?mode=ro", uri=True)
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f"Integrity check failed for {path}: {result}")
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name")]
+            counts = {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+            version = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] if 'schema_version' in tables else 0
+            return {'schema_version': version, 'tables': counts}
+        finally:
+            conn.close()
+    finally:
+        if temp:
+            os.remove(temp)
+
+def _copy(src, dst, pages, sleep, budget):
+    # Every write to src between two steps starts the copy over, so under steady writes
+    # a stepped copy may never finish; give up on stepping after a few restarts or `budget` seconds
+    start = time.monotonic()
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+        state['remaining'] = remaining
+        if state['restarts'] > MAX_RESTARTS or time.monotonic() - start > budget:
+            raise _CopyStalled()
+
+    try:
+        src.backup(dst, pages=pages, sleep=sleep, progress=progress)
+    except _CopyStalled:
+        BACKUP_FALLBACKS.inc()
+        logger.warning(f"Stepped copy restarted {state['restarts']} times in {time.monotonic() - start:.1f}s; "
+                       f"copying the rest in one step")
+        src.backup(dst, pages=-1)
+
+def snapshot(db_path=None, dest_dir=BACKUP_DIR, compress=False, pages=PAGES_PER_STEP, sleep=STEP_SLEEP,
+             budget=STEP_BUDGET):
+    """
+    Take a consistent copy of the live database without stopping the bot.
+
+    The online backup API copies `pages` pages at a time and sleeps in between, so
+    writers only wait for one short step instead of the whole copy. If writes keep
+    restarting the copy, it falls back to a single step. The snapshot is verified
+    before it's moved into place.
+
+    Args:
+        db_path (str): Database to copy, database.DB_PATH by default.
+        dest_dir (str): Directory holding the snapshots.
+        compress (bool): Gzip the snapshot.
+        pages (int): Pages copied per step.
+        sleep (float): Seconds to sleep between steps.
+        budget (float): Seconds of stepped copying before falling back to one step.
+
+    Returns:
+        str: Path of the new snapshot.
+    """
+    db_path = db_path or database.DB_PATH
+    os.makedirs(dest_dir, exist_ok=True)
+    name = f"{PREFIX}{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{time.time_ns() % 1_000_000_000:09d}.db"
+    partial = os.path.join(dest_dir, name + '.partial')
+    start = time.perf_counter()
+    try:
+        src = sqlite3.connect(db_path)
+        dst = sqlite3.connect(partial)
+        try:
+            _copy(src, dst, pages, sleep, budget)
+            # A copy of a WAL database stays in WAL mode; switch it back so the snapshot is one self-contained file
+            dst.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            dst.close()
+            src.close()
+        verify(partial)
+        final = os.path.join(dest_dir, name)
+        if compress:
+            final += '.gz'
+            with open(partial, 'rb') as raw, gzip.open(final + '.partial', 'wb', compresslevel=6) as out:
+                shutil.copyfileobj(raw, out)
+            os.remove(partial)
+            partial = final + '.partial'
+        os.replace(partial, final)
+    except Exception:
+        BACKUP_FAILURES.inc('snapshot')
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    duration = time.perf_counter() - start
+    size = os.path.getsize(final)
+    BACKUP_DURATION.observe(value=duration)
+    BACKUP_SIZE.set(value=size)
+    BACKUP_LAST_SUCCESS.set(value=time.time())
+    logger.info(f"Snapshot {final} written in {duration:.2f}s ({size} bytes)")
+    return final
+
+def list_snapshots(dest_dir=BACKUP_DIR):
+    """
+    Return finished snapshots in dest_dir, oldest first.
+    """
+    if not os.path.isdir(dest_dir):
+        return []
+    names = [n for n in os.listdir(dest_dir) if n.startswith(PREFIX) and (n.endswith('.db') or n.endswith('.db.gz'))]
+    return [os.path.join(dest_dir, n) for n in sorted(names)]
+
+def rotate(dest_dir=BACKUP_DIR, keep=KEEP):
+    """
+    Delete the oldest snapshots so that at most `keep` remain.
+
+    Returns:
+        list: Paths that were removed.
+    """
+    snapshots = list_snapshots(dest_dir)
+    removed = snapshots[:max(len(snapshots) - keep, 0)]
+    for path in removed:
+        os.remove(path)
+        logger.info(f"Removed old snapshot {path}")
+    return removed
+
+def restore(path, db_path=None, pages=PAGES_PER_STEP):
+    """
+    Copy a snapshot over the database and check the result matches it.
+
+    Stop the bot first: a restore replaces every row, including balances
+    changed since the snapshot was taken.
+
+    Args:
+        path (str): Snapshot file, plain or gzipped.
+        db_path (str): Database to overwrite, database.DB_PATH by default.
+        pages (int): Pages copied per step.
+
+    Returns:
+        dict: The verified schema version and table row counts.
+    """
+    db_path = db_path or database.DB_PATH
+    try:
+        expected = verify(path)
+        plain, temp = _open_snapshot(path)
+        try:
+            src = sqlite3.connect(f"file:{plain}?mode=ro", uri=True)
+            dst = sqlite3.connect(db_path)
+            try:
+                src.backup(dst, pages=pages)
+            finally:
+                dst.close()
+                src.close()
+        finally:
+            if temp:
+                os.remove(temp)
+        restored = verify(db_path)
+        if restored != expected:
+            raise sqlite3.DatabaseError(f"Restored database doesn't match {path}: {restored} != {expected}")
+    except Exception:
+        BACKUP_FAILURES.inc('restore')
+        raise
+    logger.info(f"Restored {db_path} from {path}")
+    return restored
+
+def run_backup(dest_dir=BACKUP_DIR, compress=True, keep=KEEP):
+    path = snapshot(dest_dir=dest_dir, compress=compress)
+    rotate(dest_dir, keep)
+    return path
+
+def interval():
+    """
+    Seconds between scheduled snapshots, from BACKUP_INTERVAL; 0 turns them off.
+    sharding.py turns them off in every shard but the first.
+    """
+    return float(os.environ.get('BACKUP_INTERVAL', DEFAULT_INTERVAL))
+
+async def backup_job(context):
+    # For JobQueue.run_repeating; the copy runs in a thread, its page steps keep the database available
+    try:
+        await asyncio.to_thread(run_backup)
+    except Exception as e:
+        logger.error(f"Scheduled backup failed: {e}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Online snapshots of users.db.")
+    parser.add_argument('--db', default=None)
+    parser.add_argument('--dir', default=BACKUP_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+    take = sub.add_parser('snapshot', help="Take a snapshot and apply retention.")
+    take.add_argument('--compress', action='store_true')
+    take.add_argument('--keep', type=int, default=KEEP)
+    sub.add_parser('list', help="List snapshots, oldest first.")
+    check = sub.add_parser('verify', help="Check a snapshot's integrity.")
+    check.add_argument('path')
+    back = sub.add_parser('restore', help="Restore a snapshot over the database. Stop the bot first.")
+    back.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        path = snapshot(args.db, args.dir, compress=args.compress)
+        rotate(args.dir, args.keep)
+        print(path)
+    elif args.command == 'list':
+        for path in list_snapshots(args.dir):
+            print(f"{path}\t{os.path.getsize(path)}")
+    elif args.command == 'verify':
+        print(verify(args.path))
+    elif args.command == 'restore':
+        print(restore(args.path, args.db))
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,15 @@ import asyncio
 import sqlite3
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import user_exists, get_user_balance, update_user_balance
-from utils import send_with_retry, logger
+from database import user_exists, get_user_balance
+from utils import send_with_retry
+from ledger import new_round_id
+from settlement import duel_payouts
+from holds import reserve, capture, available_balance, touch, DUEL_TTL
+from metrics import timed_handler
+from money import Money
+
+logger = logging.getLogger(__name__)
 
 # Helper function to calculate effective score
 def calculate_effective_score(rolls, mode):
@@ -20,7 +27,7 @@ def calculate_effective_score(rolls, mode):
 async def evaluate_round(game, chat_id, game_key, context):
     shots1, shots2 = game['rolls']['player1'], game['rolls']['player2']
     required_shots = game['rolls_needed']
-    logger.info(f"Evaluating round - Mode: {game['mode']}, Player1 shots: {shots1}, Player2 shots: {shots2}")
+    logger.debug("Evaluating round - Mode: %s, Player1 shots: %s, Player2 shots: %s", game['mode'], shots1, shots2)
 
     if len(shots1) < required_shots or len(shots2) < required_shots:
         await send_with_retry(context.bot, chat_id, "Error: Shots incomplete. Please start again.")
@@ -66,8 +73,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         winner = 'player1' if game['scores']['player1'] > game['scores']['player2'] else 'player2'
         winner_id = game[winner]
         prize = game['bet'] * 1.92
-        if winner_id != 'bot':
-            update_user_balance(winner_id, get_user_balance(winner_id) + prize + game['bet'])
+        capture('basketball', game['round_id'], duel_payouts(game, winner, prize))
         winner_username = player1_username if winner == 'player1' else player2_username
 
         text = (
@@ -119,6 +125,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         await send_with_retry(context.bot, chat_id, text, reply_markup=InlineKeyboardMarkup(keyboard))
 
 # Command handler for /basketball
+@timed_handler
 async def basketball_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -133,10 +140,10 @@ async def basketball_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
 
     try:
-        amount = float(args[0])
+        amount = Money.parse(args[0])
         if amount <= 0:
             raise ValueError("Bet must be positive.")
-        balance = get_user_balance(user_id)
+        balance = available_balance(user_id)
         if amount > balance:
             await send_with_retry(context.bot, chat_id, f"Insufficient balance! You have ${balance:.2f}.")
             return
@@ -164,10 +171,14 @@ async def start_game_against_bot(context, chat_id, user_id, bet, mode, points):
     if (chat_id, user_id) in context.bot_data.get('user_games', {}):
         await send_with_retry(context.bot, chat_id, "You are already in a game!")
         return
-    balance = get_user_balance(user_id)
+    balance = available_balance(user_id)
     if bet > balance:
         await send_with_retry(context.bot, chat_id, f"Insufficient balance! You need ${bet:.2f} but have ${balance:.2f}.")
         return
+    round_id = new_round_id()
+    if not reserve({user_id: bet}, 'basketball', round_id, ttl=DUEL_TTL):
+        await send_with_retry(context.bot, chat_id, text="Insufficient balance!")
+        return
     game_key = (chat_id, user_id, 'bot')
     context.bot_data.setdefault('games', {})[game_key] = {
         'player1': user_id,
@@ -180,10 +191,10 @@ async def start_game_against_bot(context, chat_id, user_id, bet, mode, points):
         'rolls': {'player1': [], 'player2': []},
         'rolls_needed': 2 if mode == 'double' else 1,
         'roll_count': {'player1': 0, 'player2': 0},
-        'round_number': 1
+        'round_number': 1,
+        'round_id': round_id
     }
     context.bot_data.setdefault('user_games', {})[(chat_id, user_id)] = game_key
-    update_user_balance(user_id, get_user_balance(user_id) - bet)
     player1_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player1"
     text = (
         f"🏀 Match started!\n"
@@ -196,6 +207,7 @@ async def start_game_against_bot(context, chat_id, user_id, bet, mode, points):
     await send_with_retry(context.bot, chat_id, text, reply_markup=reply_markup)
 
 # Button handler for basketball game
+@timed_handler
 async def basketball_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -313,6 +325,10 @@ async def basketball_button_handler(update: Update, context: ContextTypes.DEFAUL
         if (chat_id, game['initiator']) in context.bot_data.get('user_games', {}) or (chat_id, user_id) in context.bot_data.get('user_games', {}):
             await send_with_retry(context.bot, chat_id, "One of you is already in a game!")
             return
+        round_id = new_round_id()
+        if not reserve({game['initiator']: game['bet'], user_id: game['bet']}, 'basketball', round_id, ttl=DUEL_TTL):
+            await send_with_retry(context.bot, chat_id, text="One of you doesn’t have enough balance!")
+            return
         game_key = (chat_id, game['initiator'], user_id)
         context.bot_data.setdefault('games', {})[game_key] = {
             'player1': game['initiator'],
@@ -325,12 +341,11 @@ async def basketball_button_handler(update: Update, context: ContextTypes.DEFAUL
             'rolls': {'player1': [], 'player2': []},
             'rolls_needed': 2 if game['mode'] == 'double' else 1,
             'roll_count': {'player1': 0, 'player2': 0},
-            'round_number': 1
+            'round_number': 1,
+            'round_id': round_id
         }
         context.bot_data.setdefault('user_games', {})[(chat_id, game['initiator'])] = game_key
         context.bot_data['user_games'][(chat_id, user_id)] = game_key
-        update_user_balance(game['initiator'], get_user_balance(game['initiator']) - game['bet'])
-        update_user_balance(user_id, get_user_balance(user_id) - game['bet'])
         player1_username = (await context.bot.get_chat_member(chat_id, game['initiator'])).user.username or "Player1"
         player2_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player2"
         text = (
@@ -376,6 +391,7 @@ async def basketball_button_handler(update: Update, context: ContextTypes.DEFAUL
         if player_key != game['current_player']:
             await send_with_retry(context.bot, chat_id, "It's not your turn!")
             return
+        touch(game['round_id'])
         
         shot_msg = await context.bot.send_dice(chat_id=chat_id, emoji='🏀')
         await asyncio.sleep(4)  # Wait for dice animation
@@ -439,6 +455,7 @@ async def basketball_button_handler(update: Update, context: ContextTypes.DEFAUL
             await send_with_retry(context.bot, chat_id, "Double is only supported against the bot currently.")
 
 # Text handler for username input in basketball game
+@timed_handler
 async def basketball_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -459,7 +476,7 @@ async def basketball_text_handler(update: Update, context: ContextTypes.DEFAULT_
         if challenged_user_id == user_id:
             await send_with_retry(context.bot, chat_id, "You can't challenge yourself!")
             return
-        if get_user_balance(challenged_user_id) < context.user_data['basketball_bet']:
+        if available_balance(challenged_user_id) < context.user_data['basketball_bet']:
             await send_with_retry(context.bot, chat_id, f"@{username} doesn’t have enough balance!")
             return
         if (chat_id, challenged_user_id) in context.bot_data.get('user_games', {}):
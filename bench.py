@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from collections import defaultdict
+import basketball
+import football
+import mines
+import payouts
+import roulette
+import slots
+import tower
+from database import get_user_balance, update_user_balance, credit_many
+from fakebot import FakeBot
+from money import Money
+import loadtest
+
+# Allowed slowdown against the baseline before a benchmark counts as a regression
+PURE_TOLERANCE = 0.25
+DB_TOLERANCE = 0.50
+HANDLER_TOLERANCE = 0.50
+REPEAT = 5
+SEED = 1234
+
+BENCHMARKS = {}
+CHECKS = {}
+
+def benchmark(name, group, tolerance):
+    def register(func):
+        BENCHMARKS[name] = (group, tolerance, func)
+        return func
+    return register
+
+def check(name):
+    # Equivalence checks run with --check; each returns (passed, details)
+    def register(func):
+        CHECKS[name] = func
+        return func
+    return register
+
+def time_per_op(func, repeat=REPEAT, min_time=0.2):
+    """
+    Time a zero-argument callable the way timeit's autorange does and keep the best run.
+
+    Returns:
+        tuple: (seconds per call, calls per run)
+    """
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number, number
+
+def mines_game(m=5, revealed=3):
+    random.seed(SEED)
+    board = mines.generate_grid(m, 0)
+    game = {
+        'user_id': 1, 'bet_amount': Money.parse(1), 'm': m, 'state': 'playing', 'board': board,
+        'message_id': 1, 'mine_change_counter': 0, 'game_over': False, 'total_multiplier': 0.0
+    }
+    safe = [cell for cell in range(mines.GRID_SIZE * mines.GRID_SIZE) if not board.is_mine(cell)]
+    for n, cell in enumerate(safe[:revealed], 1):
+        board.reveal(cell)
+        game['total_multiplier'] = mines.MULTIPLIERS[m][n - 1]
+    return game
+
+def tower_game(mode='Medium', level=4):
+    random.seed(SEED)
+    columns = tower.MODE_CONFIG[mode]
+    return {
+        'bet_amount': Money.parse(1), 'chosen_mode': mode, 'state': 'playing', 'current_level': level,
+        'monkey_positions': [random.randrange(columns) for _ in range(9)], 'extra_monkeys': [[] for _ in range(9)],
+        'revealed': [random.randrange(columns) if row < level else None for row in range(9)],
+        'game_over': False, 'message_id': 1, 'mode_change_counter': 0
+    }
+
+@benchmark('mines.generate_grid', 'pure', PURE_TOLERANCE)
+def bench_mines_generate_grid():
+    random.seed(SEED)
+    return time_per_op(lambda: mines.generate_grid(5, 0))
+
+def legacy_generate_grid(m, win_streak, extra_mines=2):
+    # The redraw-loop placement generate_grid used before sample_mine_mask, kept as the reference
+    total_mines = min(m + extra_mines, mines.GRID_SIZE * mines.GRID_SIZE)
+    all_positions = [(i, j) for i in range(mines.GRID_SIZE) for j in range(mines.GRID_SIZE)]
+    weights = [10 if pos in mines.COMMON_AREAS else 1 for pos in all_positions]
+    mine_positions = []
+    remaining_positions = all_positions.copy()
+    remaining_weights = weights.copy()
+    while len(mine_positions) < total_mines and remaining_positions:
+        pos = random.choices(remaining_positions, weights=remaining_weights, k=1)[0]
+        mine_positions.append(pos)
+        index = remaining_positions.index(pos)
+        remaining_positions.pop(index)
+        remaining_weights.pop(index)
+    grid = [[{'type': 'mine' if (i, j) in mine_positions else 'safe', 'revealed': False}
+             for j in range(mines.GRID_SIZE)] for i in range(mines.GRID_SIZE)]
+    return grid, mine_positions
+
+@benchmark('mines.generate_grid_legacy', 'pure', PURE_TOLERANCE)
+def bench_mines_generate_grid_legacy():
+    random.seed(SEED)
+    return time_per_op(lambda: legacy_generate_grid(5, 0))
+
+@benchmark('mines.sample_mine_mask', 'pure', PURE_TOLERANCE)
+def bench_mines_sample_mine_mask():
+    random.seed(SEED)
+    return time_per_op(lambda: mines.sample_mine_mask(7))
+
+def exact_mine_marginals(count):
+    """
+    Probability that each cell holds a mine when `count` cells are drawn one at a time
+    in proportion to the weights left, computed exactly.
+
+    Cells of equal weight are interchangeable, so the draw only has to track how many
+    cells of each weight were taken so far.
+    """
+    classes = sorted(set(mines.CELL_WEIGHTS))
+    sizes = [mines.CELL_WEIGHTS.count(weight) for weight in classes]
+    states = {tuple(0 for _ in classes): 1.0}
+    for _ in range(count):
+        following = defaultdict(float)
+        for taken, p in states.items():
+            left = [weight * (size - n) for weight, size, n in zip(classes, sizes, taken)]
+            total = sum(left)
+            for k, weight_left in enumerate(left):
+                if weight_left:
+                    following[taken[:k] + (taken[k] + 1,) + taken[k + 1:]] += p * weight_left / total
+        states = following
+    expected = [sum(p * taken[k] for taken, p in states.items()) / sizes[k] for k in range(len(classes))]
+    return [expected[classes.index(weight)] for weight in mines.CELL_WEIGHTS]
+
+@check('mines.placement_distribution')
+def check_mine_placement(trials=100000, counts=(3, 7, 15, 24), max_z=5.0):
+    # Per-cell mine frequencies of both placements against the exact sequential-draw marginals
+    details = {}
+    passed = True
+    for count in counts:
+        exact = exact_mine_marginals(count)
+        random.seed(SEED + count)
+        new = [0] * len(exact)
+        for _ in range(trials):
+            mask = mines.sample_mine_mask(count)
+            for cell in range(len(exact)):
+                new[cell] += mask >> cell & 1
+        old = [0] * len(exact)
+        for _ in range(trials):
+            for i, j in legacy_generate_grid(count, 0, extra_mines=0)[1]:
+                old[i * mines.GRID_SIZE + j] += 1
+
+        def worst(hits):
+            return max(abs(h / trials - p) / max((p * (1 - p) / trials) ** 0.5, 1e-12) for h, p in zip(hits, exact))
+
+        z_new, z_old = worst(new), worst(old)
+        details[count] = {'max_z_sample_mine_mask': z_new, 'max_z_legacy': z_old}
+        passed = passed and z_new < max_z and z_old < max_z
+    return passed, details
+
+@benchmark('mines.generate_grid_buttons', 'pure', PURE_TOLERANCE)
+def bench_mines_generate_grid_buttons():
+    game = mines_game()
+    return time_per_op(lambda: mines.generate_grid_buttons(game))
+
+@benchmark('mines.generate_grid_buttons_tap', 'pure', PURE_TOLERANCE)
+def bench_mines_render_tap():
+    # One reveal then its undo, each followed by a render of the cached keyboard: one changed cell per render
+    game = mines_game()
+    board = game['board']
+    mines.generate_grid_buttons(game)
+    cell = next(c for c in range(mines.GRID_SIZE * mines.GRID_SIZE) if not board.is_mine(c) and not board.is_revealed(c))
+
+    def tap():
+        board.reveal(cell)
+        mines.generate_grid_buttons(game)
+        board.revealed &= ~(1 << cell)
+        board.order.pop()
+        mines.generate_grid_buttons(game)
+
+    seconds, number = time_per_op(tap)
+    return seconds / 2, number * 2
+
+@benchmark('mines.get_persistent_buttons', 'pure', PURE_TOLERANCE)
+def bench_mines_get_persistent_buttons():
+    game = mines_game()
+    return time_per_op(lambda: mines.get_persistent_buttons(game))
+
+@benchmark('tower.generate_grid_buttons', 'pure', PURE_TOLERANCE)
+def bench_tower_generate_grid_buttons():
+    game = tower_game()
+    return time_per_op(lambda: tower.generate_grid_buttons(game))
+
+@benchmark('tower.generate_grid_buttons_tap', 'pure', PURE_TOLERANCE)
+def bench_tower_render_tap():
+    # Climb one level and back, rendering after each move: two rows change per render
+    game = tower_game()
+    tower.generate_grid_buttons(game)
+    level = game['current_level']
+
+    def tap():
+        game['revealed'][level] = 0
+        game['current_level'] = level + 1
+        tower.generate_grid_buttons(game)
+        game['revealed'][level] = None
+        game['current_level'] = level
+        tower.generate_grid_buttons(game)
+
+    seconds, number = time_per_op(tap)
+    return seconds / 2, number * 2
+
+def legacy_combo_parts(dice_value):
+    # The base-4 decode and emoji comparison chain slots used before SLOTS_TABLE, kept as the reference of the paytable tests
+    values = ["🍫", "🍇", "🍋", "7️⃣"]
+    dice_value -= 1
+    result = []
+    for _ in range(3):
+        result.append(values[dice_value % 4])
+        dice_value //= 4
+    return result
+
+def legacy_payout(symbols):
+    s1, s2, s3 = symbols
+    if s1 == '7️⃣' and s2 == '7️⃣' and s3 == '7️⃣':
+        return 20.0
+    elif s1 == s2 == s3:
+        return 7.0
+    elif s1 == '7️⃣' and s2 == '7️⃣':
+        return 2.0
+    elif s2 == '7️⃣' and s3 == '7️⃣':
+        return 1.0
+    elif s1 == s2:
+        return 0.5 if s1 == '🍫' else 0.25
+    return 0.0
+
+@benchmark('slots.get_combo_parts+get_payout', 'pure', PURE_TOLERANCE)
+def bench_slots_payout():
+    values = range(1, 65)
+    return time_per_op(lambda: [slots.get_payout(slots.get_combo_parts(v)) for v in values])
+
+@benchmark('slots.get_combo_parts+get_payout_legacy', 'pure', PURE_TOLERANCE)
+def bench_slots_payout_legacy():
+    values = range(1, 65)
+    return time_per_op(lambda: [legacy_payout(legacy_combo_parts(v)) for v in values])
+
+@benchmark('slots.SLOTS_TABLE', 'pure', PURE_TOLERANCE)
+def bench_slots_table():
+    # What a spin does now: one index gives the multiplier and the rendered reels
+    table = payouts.SLOTS_TABLE
+    values = range(1, 65)
+    return time_per_op(lambda: [table[v] for v in values])
+
+ROULETTE_BETS = [('number', '17'), ('range', '1-12'), ('range', '19-36'), ('even', None), ('odd', None), ('color', 'red'), ('color', 'black')]
+
+@benchmark('slots.auto_spin', 'pure', PURE_TOLERANCE)
+def bench_slots_auto_spin():
+    # A full run of the largest auto-spin, with its summary
+    rng = random.Random(SEED)
+    bet = Money.parse(1)
+
+    def run():
+        results, reason = slots.auto_spin(bet, slots.AUTO_SPINS[-1], Money.parse(10 ** 6), rng=rng)
+        return slots.auto_spin_summary(bet, results, reason)
+
+    return time_per_op(run)
+
+@benchmark('roulette.spin', 'pure', PURE_TOLERANCE)
+def bench_roulette_spin():
+    # One ticket holding all seven bets
+    random.seed(SEED)
+    ticket = {payouts.roulette_slot(t, v): Money.parse(1) for t, v in ROULETTE_BETS}
+    return time_per_op(lambda: roulette.spin(ticket))
+
+@benchmark('football.calculate_effective_score', 'pure', PURE_TOLERANCE)
+def bench_football_effective_score():
+    cases = [([4], 'normal'), ([2, 5], 'double'), ([1], 'crazy')]
+    return time_per_op(lambda: [football.calculate_effective_score(r, m) for r, m in cases])
+
+@benchmark('basketball.calculate_effective_score', 'pure', PURE_TOLERANCE)
+def bench_basketball_effective_score():
+    cases = [([4], 'normal'), ([2, 5], 'double'), ([1], 'crazy')]
+    return time_per_op(lambda: [basketball.calculate_effective_score(r, m) for r, m in cases])
+
+@benchmark('database.get_user_balance', 'db', DB_TOLERANCE)
+def bench_get_user_balance():
+    return time_per_op(lambda: get_user_balance(1), repeat=3)
+
+@benchmark('database.update_user_balance', 'db', DB_TOLERANCE)
+def bench_update_user_balance():
+    return time_per_op(lambda: update_user_balance(1, Money.parse(1000)), repeat=3)
+
+@benchmark('database.balance_round_trip_contended', 'db', DB_TOLERANCE)
+def bench_balance_contention(threads=8, ops=200):
+    # Every thread does read-modify-write round trips on a small set of hot users
+    def worker(offset):
+        for n in range(ops):
+            user_id = (offset + n) % 16 + 1
+            update_user_balance(user_id, get_user_balance(user_id) + Money.parse(1))
+
+    pool = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return (time.perf_counter() - start) / (threads * ops), threads * ops
+
+def bench_flow(flow, games=100):
+    async def play():
+        random.seed(SEED)
+        bot = FakeBot(seed=SEED)
+        timings = defaultdict(list)
+        players = [loadtest.Player(uid, bot, {}, timings) for uid in range(1, 17)]
+        for n in range(games):
+            await getattr(players[n % len(players)], f"play_{flow}")()
+        values = timings[flow]
+        return sum(values) / len(values), len(values)
+    return asyncio.run(play())
+
+for _flow in ['dice', 'mine', 'tower', 'roulette', 'slots']:
+    benchmark(f"handlers.{_flow}", 'handlers', HANDLER_TOLERANCE)(lambda flow=_flow: bench_flow(flow))
+
+@benchmark('database.credit_many_per_row', 'db', DB_TOLERANCE)
+def bench_credit_many(rows=64):
+    # Per-row cost of a bulk credit, comparable with database.update_user_balance
+    batches = itertools.count()
+    credits = [(uid, Money.parse(1)) for uid in range(1, rows + 1)]
+    seconds, number = time_per_op(lambda: credit_many(credits, f"bench-{next(batches)}"), repeat=3)
+    return seconds / rows, number * rows
+
+def run(selected=None):
+    """
+    Run the benchmarks whose name starts with any of `selected` (all of them by default).
+
+    Returns:
+        dict: Machine-readable results keyed by benchmark name.
+    """
+    results = {}
+    for name, (group, tolerance, func) in BENCHMARKS.items():
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        per_op, ops = func()
+        results[name] = {'group': group, 'per_op_us': per_op * 1e6, 'ops': ops, 'tolerance': tolerance}
+    return results
+
+def run_checks():
+    return {name: dict(zip(('passed', 'details'), func())) for name, func in CHECKS.items()}
+
+def compare(results, baseline):
+    """
+    List benchmarks that got slower than their baseline by more than their tolerance.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        limit = base['per_op_us'] * (1 + result['tolerance'])
+        if result['per_op_us'] > limit:
+            regressions.append({'name': name, 'baseline_us': base['per_op_us'], 'current_us': result['per_op_us'], 'limit_us': limit})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for game hot paths, database calls and handlers.")
+    parser.add_argument('--only', action='append', help="Benchmark name prefix, e.g. 'mines.' or 'handlers.'. Repeatable.")
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default=None, help="Results file to check for regressions against.")
+    parser.add_argument('--check', action='store_true', help="Also run the equivalence checks.")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    loadtest.skip_animations()
+    loadtest.setup_database(64, os.path.join(tempfile.mkdtemp(prefix='bench-'), 'users.db'))
+    results = run(args.only)
+    checks = run_checks() if args.check else {}
+
+    report = {
+        'timestamp': time.time(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'results': results
+    }
+    if checks:
+        report['checks'] = checks
+    if baseline:
+        report['regressions'] = compare(results, baseline)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for name, result in results.items():
+        print(f"{name:45s} {result['per_op_us']:12.2f} us/op")
+    for name, result in checks.items():
+        print(f"{name:45s} {'ok' if result['passed'] else 'FAILED'}")
+    if any(not result['passed'] for result in checks.values()):
+        sys.exit(1)
+    if baseline and report['regressions']:
+        for regression in report['regressions']:
+            print(f"REGRESSION {regression['name']}: {regression['current_us']:.2f} us > {regression['limit_us']:.2f} us")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,21 @@ import logging
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import user_exists, get_user_balance, update_user_balance
-from utils import logger, send_with_retry
+from database import user_exists
+from utils import send_with_retry
+from ledger import new_round_id
+from settlement import duel_payouts
+from holds import reserve, capture, available_balance, touch, DUEL_TTL
+from metrics import timed_handler
+from money import Money
+
+logger = logging.getLogger(__name__)
 
 # Evaluate each round with rolls in scoreboard
 async def evaluate_round(game, chat_id, game_key, context):
     rolls1, rolls2 = game['rolls']['player1'], game['rolls']['player2']
     required_rolls = game['rolls_needed']
-    logger.info(f"Evaluating round: Player1 rolls: {rolls1}, Player2 rolls: {rolls2}, Needed: {required_rolls}")
+    logger.debug("Evaluating round: Player1 rolls: %s, Player2 rolls: %s, Needed: %s", rolls1, rolls2, required_rolls)
 
     if len(rolls1) < required_rolls or len(rolls2) < required_rolls:
         logger.error(f"Incomplete rolls: Player1: {len(rolls1)}, Player2: {len(rolls2)}")
@@ -47,8 +54,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         winner = 'player1' if game['scores']['player1'] > game['scores']['player2'] else 'player2'
         winner_id = game[winner]
         prize = game['bet'] * 1.92
-        if winner_id != 'bot':
-            update_user_balance(winner_id, get_user_balance(winner_id) + prize + game['bet'])
+        capture('bowling', game['round_id'], duel_payouts(game, winner, prize))
         winner_username = player1_username if winner == 'player1' else player2_username
         text = (
             f"🎳 Final Round Results\n"
@@ -103,6 +109,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         await send_with_retry(context.bot, chat_id, text=text, reply_markup=reply_markup)
 
 # Command handler for /bowl
+@timed_handler
 async def bowling_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -117,10 +124,10 @@ async def bowling_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        amount = float(args[0])
+        amount = Money.parse(args[0])
         if amount <= 0:
             raise ValueError("Bet must be positive.")
-        balance = get_user_balance(user_id)
+        balance = available_balance(user_id)
         if amount > balance:
             await send_with_retry(context.bot, chat_id, text=f"Insufficient balance! You have ${balance:.2f}.")
             return
@@ -151,6 +158,10 @@ async def start_game_against_bot(context, chat_id, user_id):
     bet = context.user_data['bowl_bet']
     mode = context.user_data['bowl_mode']
     points = context.user_data['bowl_points']
+    round_id = new_round_id()
+    if not reserve({user_id: bet}, 'bowling', round_id, ttl=DUEL_TTL):
+        await send_with_retry(context.bot, chat_id, text="Insufficient balance!")
+        return
     game_key = (chat_id, user_id, 'bot')
     context.bot_data.setdefault('games', {})[game_key] = {
         'player1': user_id,
@@ -163,10 +174,10 @@ async def start_game_against_bot(context, chat_id, user_id):
         'rolls': {'player1': [], 'player2': []},
         'rolls_needed': 2 if mode == 'double' else 1,
         'roll_count': {'player1': 0, 'player2': 0},
-        'round_number': 1
+        'round_number': 1,
+        'round_id': round_id
     }
     context.bot_data.setdefault('user_games', {})[(chat_id, user_id)] = game_key
-    update_user_balance(user_id, get_user_balance(user_id) - bet)
     player1_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player1"
     text = (
         f"🎳 Match started!\n"
@@ -179,6 +190,7 @@ async def start_game_against_bot(context, chat_id, user_id):
     await send_with_retry(context.bot, chat_id, text=text, reply_markup=reply_markup)
 
 # Button handler for bowling game
+@timed_handler
 async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -292,6 +304,10 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
         if (chat_id, game['initiator']) in context.bot_data.get('user_games', {}) or (chat_id, user_id) in context.bot_data.get('user_games', {}):
             await send_with_retry(context.bot, chat_id, text="One of you is already in a game!")
             return
+        round_id = new_round_id()
+        if not reserve({game['initiator']: game['bet'], user_id: game['bet']}, 'bowling', round_id, ttl=DUEL_TTL):
+            await send_with_retry(context.bot, chat_id, text="One of you doesn’t have enough balance!")
+            return
         game_key = (chat_id, game['initiator'], user_id)
         context.bot_data.setdefault('games', {})[game_key] = {
             'player1': game['initiator'],
@@ -304,12 +320,11 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
             'rolls': {'player1': [], 'player2': []},
             'rolls_needed': 2 if game['mode'] == 'double' else 1,
             'roll_count': {'player1': 0, 'player2': 0},
-            'round_number': 1
+            'round_number': 1,
+            'round_id': round_id
         }
         context.bot_data.setdefault('user_games', {})[(chat_id, game['initiator'])] = game_key
         context.bot_data['user_games'][(chat_id, user_id)] = game_key
-        update_user_balance(game['initiator'], get_user_balance(game['initiator']) - game['bet'])
-        update_user_balance(user_id, get_user_balance(user_id) - game['bet'])
         player1_username = (await context.bot.get_chat_member(chat_id, game['initiator'])).user.username or "Player1"
         player2_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player2"
         text = (
@@ -334,15 +349,15 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
         del context.bot_data['pending_challenges'][game_id]
 
     elif data.startswith("bowl_roll_"):
-        logger.info(f"Roll bowl pressed by user {user_id} in chat {chat_id}")
+        logger.debug("Roll bowl pressed by user %s in chat %s", user_id, chat_id)
         game_key = context.bot_data.get('user_games', {}).get((chat_id, user_id))
         if not game_key:
-            logger.info("No game key found")
+            logger.debug("No game key found")
             await send_with_retry(context.bot, chat_id, text="No active game found!")
             return
         game = context.bot_data.get('games', {}).get(game_key)
         if not game:
-            logger.info("Game not found in bot_data")
+            logger.debug("Game not found in bot_data")
             await send_with_retry(context.bot, chat_id, text="Game data missing!")
             return
         if max(game['scores'].values()) >= game['points_to_win']:
@@ -350,7 +365,7 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
             return
         player_key = 'player1' if game['player1'] == user_id else 'player2' if game['player2'] == user_id else None
         if not player_key:
-            logger.info("User is not a player in this game")
+            logger.debug("User is not a player in this game")
             return
         try:
             turn_round = int(data.split('_')[2])
@@ -361,10 +376,11 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
             await send_with_retry(context.bot, chat_id, text="This button is from a previous round!")
             return
         if player_key != game['current_player']:
-            logger.info(f"User {player_key} is not the current player ({game['current_player']})")
+            logger.debug("User %s is not the current player (%s)", player_key, game['current_player'])
             await send_with_retry(context.bot, chat_id, text="It's not your turn!")
             return
-        logger.info(f"Game state before roll: {game}")
+        touch(game['round_id'])
+        logger.debug("Game state before roll: %s", game)
         # Player's bowl roll with retry logic
         bowl_msg = await send_with_retry(context.bot, chat_id, emoji='🎳')
         if bowl_msg is None:
@@ -374,7 +390,7 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
         bowl_value = bowl_msg.dice.value
         game['rolls'][player_key].append(bowl_value)
         game['roll_count'][player_key] += 1
-        logger.info(f"Player {player_key} rolled: {bowl_value}, Rolls: {game['rolls'][player_key]}")
+        logger.debug("Player %s rolled: %s, Rolls: %s", player_key, bowl_value, game['rolls'][player_key])
 
         if game['roll_count']['player1'] == game['rolls_needed'] and game['roll_count']['player2'] == game['rolls_needed']:
             await evaluate_round(game, chat_id, game_key, context)
@@ -397,7 +413,7 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
                         bot_rolls.append(bowl_msg.dice.value)
                     game['rolls'][other_player].extend(bot_rolls)
                     game['roll_count'][other_player] += len(bot_rolls)
-                    logger.info(f"Bot rolled: {bot_rolls}, Game state: {game}")
+                    logger.debug("Bot rolled: %s, Game state: %s", bot_rolls, game)
                     await evaluate_round(game, chat_id, game_key, context)
                 else:
                     other_username = (await context.bot.get_chat_member(chat_id, game[other_player])).user.username or "Player"
@@ -454,7 +470,7 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
         opponent = last_game['opponent']
         new_bet = last_game['bet'] * 2
         if opponent == 'bot':
-            balance = get_user_balance(user_id)
+            balance = available_balance(user_id)
             if new_bet > balance:
                 await send_with_retry(context.bot, chat_id, text=f"Insufficient balance! You need ${new_bet:.2f} but have ${balance:.2f}.")
                 return
@@ -464,8 +480,8 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
             await start_game_against_bot(context, chat_id, user_id)
         else:
             opponent_id = opponent
-            initiator_balance = get_user_balance(user_id)
-            opponent_balance = get_user_balance(opponent_id)
+            initiator_balance = available_balance(user_id)
+            opponent_balance = available_balance(opponent_id)
             if new_bet > initiator_balance or new_bet > opponent_balance:
                 await send_with_retry(context.bot, chat_id, text="One of you doesn’t have enough balance for the doubled bet!")
                 return
@@ -497,6 +513,7 @@ async def bowling_button_handler(update: Update, context: ContextTypes.DEFAULT_T
             await send_with_retry(context.bot, chat_id, text=text, reply_markup=InlineKeyboardMarkup(keyboard))
 
 # Text handler for username input in bowling game
+@timed_handler
 async def bowling_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -517,7 +534,7 @@ async def bowling_text_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         if challenged_user_id == user_id:
             await send_with_retry(context.bot, chat_id, text="You can't challenge yourself!")
             return
-        if get_user_balance(challenged_user_id) < context.user_data['bowl_bet']:
+        if available_balance(challenged_user_id) < context.user_data['bowl_bet']:
             await send_with_retry(context.bot, chat_id, text=f"@{username} doesn’t have enough balance!")
             return
         if (chat_id, challenged_user_id) in context.bot_data.get('user_games', {}):
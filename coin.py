@@ -1,11 +1,19 @@
 import asyncio
+import logging
 import random
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from database import user_exists, get_user_balance, update_user_balance
-from utils import logger, send_with_retry
+from database import user_exists, get_user_balance
+from holds import available_balance, capture, release, reserve
+from utils import send_with_retry
+from ledger import new_round_id
+from metrics import timed_handler
+from money import Money, ZERO
+
+logger = logging.getLogger(__name__)
 
 # Probability that the player wins (40% player win rate, 60% bot win rate)
 PLAYER_WIN_PROB = 0.4
+WIN_MULTIPLIER = 1.92
 
 # Sticker IDs for heads and tails
 STICKER_IDS = {
@@ -13,6 +21,7 @@ STICKER_IDS = {
     'tails': "CAACAgQAAxkBAAEN6HVnwG1uwwdFCy4enrq4YB3yZPjfJQAC8hQAAhGdAVKUEJvAA6dPaDYE"
 }
 
+@timed_handler
 async def coin_command(update, context):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -21,12 +30,12 @@ async def coin_command(update, context):
     try:
         if len(args) != 1:
             raise ValueError("Usage: /coin <amount>\nExample: /coin 1")
-        amount = float(args[0])
+        amount = Money.parse(args[0])
         if amount <= 0:
             raise ValueError("Bet must be positive.")
         if not user_exists(user_id):
             raise ValueError("Please register with /start.")
-        balance = get_user_balance(user_id)
+        balance = available_balance(user_id)
         if amount > balance:
             raise ValueError(f"Insufficient balance! You have ${balance:.2f}.")
         context.user_data['coin_bet'] = amount
@@ -43,6 +52,7 @@ async def coin_command(update, context):
     except ValueError as e:
         await send_with_retry(context.bot, chat_id, str(e))
 
+@timed_handler
 async def coin_button_handler(update, context):
     query = update.callback_query
     await query.answer()
@@ -67,7 +77,7 @@ async def coin_button_handler(update, context):
             "First to 1 point\n"
             "Mode: Normal Mode\n"
             f"Your bet: ${bet:.2f}\n"
-            "Win multiplier: 1.92x"
+            f"Win multiplier: {WIN_MULTIPLIER}x"
         )
         keyboard = [
             [InlineKeyboardButton("✅ Confirm", callback_data="coin_confirm"),
@@ -83,7 +93,7 @@ async def coin_button_handler(update, context):
         text = (
             f"🪙 {username} wants to play Coinflip!\n\n"
             f"Bet: ${bet:.2f}\n"
-            "Win multiplier: 1.92x\n"
+            f"Win multiplier: {WIN_MULTIPLIER}x\n"
             "Mode: First to 1 point\n\n"
             "Normal Mode\n"
             "Basic game mode. Choose heads or tails, and see if you win the flip."
@@ -114,9 +124,15 @@ async def coin_button_handler(update, context):
         }
 
     elif data == "coin_flip":
-        game = context.bot_data['coin_games'].get((chat_id, user_id))
+        # Taken out first, so a second tap on the button can't flip the same game again
+        game = context.bot_data.get('coin_games', {}).pop((chat_id, user_id), None)
         if not game:
             return
+        # Held while the coin flips and settled as a delta, so nothing settled meanwhile is overwritten
+        round_id = new_round_id()
+        if not reserve({user_id: game['bet']}, 'coin', round_id):
+            await send_with_retry(context.bot, chat_id, f"Insufficient balance! You have ${available_balance(user_id):.2f}.")
+            return
         await asyncio.sleep(2)  # Simulate flip delay
 
         player_choice = game['choice']
@@ -137,10 +153,13 @@ async def coin_button_handler(update, context):
             logger.error(f"Failed to send sticker: {e}")
 
         username = query.from_user.username or "Player"
-        if game['choice'] == coin_result:
-            winnings = game['bet'] * 1.92
-            new_balance = get_user_balance(user_id) + winnings - game['bet']
-            update_user_balance(user_id, new_balance)
+        winnings = game['bet'] * WIN_MULTIPLIER if game['choice'] == coin_result else ZERO
+        if not capture('coin', round_id, {user_id: winnings} if winnings else {}):
+            release(round_id)
+            await send_with_retry(context.bot, chat_id, "The flip couldn't be settled, nothing was charged.")
+            return
+        new_balance = get_user_balance(user_id)
+        if winnings:
             outcome_text = (
                 f"🏆 Game over! The coin landed on {coin_result}.\n\n"
                 f"Score:\n{username} • 1\nBot • 0\n\n"
@@ -148,8 +167,6 @@ async def coin_button_handler(update, context):
                 f"New balance: ${new_balance:.2f}"
             )
         else:
-            new_balance = get_user_balance(user_id) - game['bet']
-            update_user_balance(user_id, new_balance)
             outcome_text = (
                 f"🏆 Game over! The coin landed on {coin_result}.\n\n"
                 f"Score:\n{username} • 0\nBot • 1\n\n"
@@ -171,12 +188,11 @@ async def coin_button_handler(update, context):
 
         if 'coin_initiator' in context.user_data:
             del context.user_data['coin_initiator']
-        del context.bot_data['coin_games'][(chat_id, user_id)]
 
     elif data == "coin_restart":
         if 'coin_bet' in context.user_data:
             bet = context.user_data['coin_bet']
-            balance = get_user_balance(user_id)
+            balance = available_balance(user_id)
             if bet > balance:
                 await send_with_retry(context.bot, chat_id, f"Insufficient balance! You have ${balance:.2f}.")
                 return
@@ -193,7 +209,7 @@ async def coin_button_handler(update, context):
     elif data == "coin_double":
         if 'coin_bet' in context.user_data:
             bet = context.user_data['coin_bet'] * 2
-            balance = get_user_balance(user_id)
+            balance = available_balance(user_id)
             if bet > balance:
                 await send_with_retry(context.bot, chat_id, f"Insufficient balance to double your bet! You have ${balance:.2f}.")
                 return
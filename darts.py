@@ -1,15 +1,23 @@
+import logging
 import sqlite3
 import asyncio
 import telegram.error
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from database import user_exists, get_user_balance, update_user_balance
-from utils import logger, send_with_retry
+from database import user_exists
+from utils import send_with_retry
+from ledger import new_round_id
+from settlement import duel_payouts
+from holds import reserve, capture, available_balance, touch, DUEL_TTL
+from metrics import timed_handler
+from money import Money
+
+logger = logging.getLogger(__name__)
 
 # Evaluate each round with rolls in scoreboard
 async def evaluate_round(game, chat_id, game_key, context):
     rolls1, rolls2 = game['rolls']['player1'], game['rolls']['player2']
     required_rolls = game['rolls_needed']
-    logger.info(f"Evaluating round: Player1 rolls: {rolls1}, Player2 rolls: {rolls2}, Needed: {required_rolls}")
+    logger.debug("Evaluating round: Player1 rolls: %s, Player2 rolls: %s, Needed: %s", rolls1, rolls2, required_rolls)
 
     if len(rolls1) < required_rolls or len(rolls2) < required_rolls:
         logger.error(f"Incomplete rolls: Player1: {len(rolls1)}, Player2: {len(rolls2)}")
@@ -47,8 +55,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         winner = 'player1' if game['scores']['player1'] > game['scores']['player2'] else 'player2'
         winner_id = game[winner]
         prize = game['bet'] * 1.92
-        if winner_id != 'bot':
-            update_user_balance(winner_id, get_user_balance(winner_id) + prize + game['bet'])
+        capture('darts', game['round_id'], duel_payouts(game, winner, prize))
         winner_username = player1_username if winner == 'player1' else player2_username
         text = (
             f"🎯 Final Round Results\n"
@@ -110,6 +117,10 @@ async def start_game_against_bot(context, chat_id, user_id):
     bet = context.user_data['dart_bet']
     mode = context.user_data['dart_mode']
     points = context.user_data['dart_points']
+    round_id = new_round_id()
+    if not reserve({user_id: bet}, 'darts', round_id, ttl=DUEL_TTL):
+        await send_with_retry(context.bot, chat_id, text="Insufficient balance!")
+        return
     game_key = (chat_id, user_id, 'bot')
     context.bot_data.setdefault('games', {})[game_key] = {
         'player1': user_id,
@@ -122,10 +133,10 @@ async def start_game_against_bot(context, chat_id, user_id):
         'rolls': {'player1': [], 'player2': []},
         'rolls_needed': 2 if mode == 'double' else 1,
         'roll_count': {'player1': 0, 'player2': 0},
-        'round_number': 1
+        'round_number': 1,
+        'round_id': round_id
     }
     context.bot_data.setdefault('user_games', {})[(chat_id, user_id)] = game_key
-    update_user_balance(user_id, get_user_balance(user_id) - bet)
     player1_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player1"
     text = (
         f"🎯 Match started!\n"
@@ -138,6 +149,7 @@ async def start_game_against_bot(context, chat_id, user_id):
     await send_with_retry(context.bot, chat_id, text, reply_markup=reply_markup)
 
 # Command handler for /dart
+@timed_handler
 async def dart_command(update, context):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -152,10 +164,10 @@ async def dart_command(update, context):
         return
 
     try:
-        amount = float(args[0])
+        amount = Money.parse(args[0])
         if amount <= 0:
             raise ValueError("Bet must be positive.")
-        balance = get_user_balance(user_id)
+        balance = available_balance(user_id)
         if amount > balance:
             await send_with_retry(context.bot, chat_id, f"Insufficient balance! You have ${balance:.2f}.")
             return
@@ -179,6 +191,7 @@ async def dart_command(update, context):
         await send_with_retry(context.bot, chat_id, f"Invalid bet amount: {str(e)}. Use a positive number.")
 
 # Button handler for darts
+@timed_handler
 async def dart_button_handler(update, context):
     query = update.callback_query
     await query.answer()
@@ -292,6 +305,10 @@ async def dart_button_handler(update, context):
         if (chat_id, game['initiator']) in context.bot_data.get('user_games', {}) or (chat_id, user_id) in context.bot_data.get('user_games', {}):
             await send_with_retry(context.bot, chat_id, "One of you is already in a game!")
             return
+        round_id = new_round_id()
+        if not reserve({game['initiator']: game['bet'], user_id: game['bet']}, 'darts', round_id, ttl=DUEL_TTL):
+            await send_with_retry(context.bot, chat_id, text="One of you doesn’t have enough balance!")
+            return
         game_key = (chat_id, game['initiator'], user_id)
         context.bot_data.setdefault('games', {})[game_key] = {
             'player1': game['initiator'],
@@ -304,12 +321,11 @@ async def dart_button_handler(update, context):
             'rolls': {'player1': [], 'player2': []},
             'rolls_needed': 2 if game['mode'] == 'double' else 1,
             'roll_count': {'player1': 0, 'player2': 0},
-            'round_number': 1
+            'round_number': 1,
+            'round_id': round_id
         }
         context.bot_data.setdefault('user_games', {})[(chat_id, game['initiator'])] = game_key
         context.bot_data['user_games'][(chat_id, user_id)] = game_key
-        update_user_balance(game['initiator'], get_user_balance(game['initiator']) - game['bet'])
-        update_user_balance(user_id, get_user_balance(user_id) - game['bet'])
         player1_username = (await context.bot.get_chat_member(chat_id, game['initiator'])).user.username or "Player1"
         player2_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player2"
         text = (
@@ -335,15 +351,15 @@ async def dart_button_handler(update, context):
         del context.bot_data['pending_challenges'][game_id]
 
     elif data.startswith("dart_throw_"):
-        logger.info(f"Throw dart pressed by user {user_id} in chat {chat_id}")
+        logger.debug("Throw dart pressed by user %s in chat %s", user_id, chat_id)
         game_key = context.bot_data.get('user_games', {}).get((chat_id, user_id))
         if not game_key:
-            logger.info("No game key found")
+            logger.debug("No game key found")
             await send_with_retry(context.bot, chat_id, "No active game found!")
             return
         game = context.bot_data.get('games', {}).get(game_key)
         if not game:
-            logger.info("Game not found in bot_data")
+            logger.debug("Game not found in bot_data")
             await send_with_retry(context.bot, chat_id, "Game data missing!")
             return
         if max(game['scores'].values()) >= game['points_to_win']:
@@ -351,7 +367,7 @@ async def dart_button_handler(update, context):
             return
         player_key = 'player1' if game['player1'] == user_id else 'player2' if game['player2'] == user_id else None
         if not player_key:
-            logger.info("User is not a player in this game")
+            logger.debug("User is not a player in this game")
             return
         try:
             turn_round = int(data.split('_')[2])
@@ -362,10 +378,11 @@ async def dart_button_handler(update, context):
             await send_with_retry(context.bot, chat_id, "This button is from a previous round!")
             return
         if player_key != game['current_player']:
-            logger.info(f"User {player_key} is not the current player ({game['current_player']})")
+            logger.debug("User %s is not the current player (%s)", player_key, game['current_player'])
             await send_with_retry(context.bot, chat_id, "It's not your turn!")
             return
-        logger.info(f"Game state before throw: {game}")
+        touch(game['round_id'])
+        logger.debug("Game state before throw: %s", game)
         dart_msg = await send_with_retry(context.bot, chat_id, text=None, emoji='🎯')
         if dart_msg is None:
             await send_with_retry(context.bot, chat_id, "Failed to throw the dart. Please try again later.")
@@ -374,7 +391,7 @@ async def dart_button_handler(update, context):
         dart_value = dart_msg.dice.value
         game['rolls'][player_key].append(dart_value)
         game['roll_count'][player_key] += 1
-        logger.info(f"Player {player_key} threw: {dart_value}, Rolls: {game['rolls'][player_key]}")
+        logger.debug("Player %s threw: %s, Rolls: %s", player_key, dart_value, game['rolls'][player_key])
 
         if game['roll_count']['player1'] == game['rolls_needed'] and game['roll_count']['player2'] == game['rolls_needed']:
             await evaluate_round(game, chat_id, game_key, context)
@@ -397,7 +414,7 @@ async def dart_button_handler(update, context):
                         bot_rolls.append(dart_msg.dice.value)
                     game['rolls'][other_player].extend(bot_rolls)
                     game['roll_count'][other_player] += len(bot_rolls)
-                    logger.info(f"Bot threw: {bot_rolls}, Game state: {game}")
+                    logger.debug("Bot threw: %s, Game state: %s", bot_rolls, game)
                     await evaluate_round(game, chat_id, game_key, context)
                 else:
                     other_username = (await context.bot.get_chat_member(chat_id, game[other_player])).user.username or "Player"
@@ -454,7 +471,7 @@ async def dart_button_handler(update, context):
         opponent = last_game['opponent']
         new_bet = last_game['bet'] * 2
         if opponent == 'bot':
-            balance = get_user_balance(user_id)
+            balance = available_balance(user_id)
             if new_bet > balance:
                 await send_with_retry(context.bot, chat_id, f"Insufficient balance! You need ${new_bet:.2f} but have ${balance:.2f}.")
                 return
@@ -464,8 +481,8 @@ async def dart_button_handler(update, context):
             await start_game_against_bot(context, chat_id, user_id)
         else:
             opponent_id = opponent
-            initiator_balance = get_user_balance(user_id)
-            opponent_balance = get_user_balance(opponent_id)
+            initiator_balance = available_balance(user_id)
+            opponent_balance = available_balance(opponent_id)
             if new_bet > initiator_balance or new_bet > opponent_balance:
                 await send_with_retry(context.bot, chat_id, "One of you doesn’t have enough balance for the doubled bet!")
                 return
@@ -497,6 +514,7 @@ async def dart_button_handler(update, context):
             await send_with_retry(context.bot, chat_id, text, reply_markup=InlineKeyboardMarkup(keyboard))
 
 # Text handler for darts
+@timed_handler
 async def dart_text_handler(update, context):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -517,7 +535,7 @@ async def dart_text_handler(update, context):
         if challenged_user_id == user_id:
             await send_with_retry(context.bot, chat_id, "You can't challenge yourself!")
             return
-        if get_user_balance(challenged_user_id) < context.user_data['dart_bet']:
+        if available_balance(challenged_user_id) < context.user_data['dart_bet']:
             await send_with_retry(context.bot, chat_id, f"@{username} doesn’t have enough balance!")
             return
         if (chat_id, challenged_user_id) in context.bot_data.get('user_games', {}):
@@ -1,31 +1,28 @@
+import itertools
 import sqlite3
 import logging
+import time
+from metrics import timed_query
+from migrations import run_migrations
+from money import Money, ZERO
 
 # Set up logging for debugging database operations
 logger = logging.getLogger(__name__)
 
+DB_PATH = 'users.db'
+CREDIT_CHUNK_SIZE = 5000
+
 def init_db():
     """
-    Initialize the SQLite database and create the 'users' table if it doesn't exist.
-    Ensures the 'username' column is present for backward compatibility.
+    Initialize the SQLite database by applying any pending schema migrations.
+    See migrations.py for the 'users', 'ledger' and 'user_stats' tables.
     """
     try:
-        conn = sqlite3.connect('users.db')
-        c = conn.cursor()
-        # Create the table with user_id, username, and balance columns
-        c.execute('''CREATE TABLE IF NOT EXISTS users
-                     (user_id INTEGER PRIMARY KEY, username TEXT, balance REAL DEFAULT 100.0)''')
-        # Check if 'username' column exists for older databases
-        c.execute("PRAGMA table_info(users)")
-        columns = [column[1] for column in c.fetchall()]
-        if 'username' not in columns:
-            c.execute("ALTER TABLE users ADD COLUMN username TEXT")
-        conn.commit()
+        run_migrations(DB_PATH)
     except sqlite3.Error as e:
         logger.error(f"Error initializing database: {e}")
-    finally:
-        conn.close()
 
+@timed_query
 def user_exists(user_id):
     """
     Check if a user with the given user_id exists in the database.
@@ -37,7 +34,7 @@ def user_exists(user_id):
         bool: True if the user exists, False otherwise.
     """
     try:
-        with sqlite3.connect('users.db') as conn:
+        with sqlite3.connect(DB_PATH) as conn:
             c = conn.cursor()
             c.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,))
             return c.fetchone() is not None
@@ -45,6 +42,7 @@ def user_exists(user_id):
         logger.error(f"Database error in user_exists: {e}")
         return False
 
+@timed_query
 def get_user_balance(user_id):
     """
     Retrieve the balance for a given user_id.
@@ -53,34 +51,94 @@ def get_user_balance(user_id):
         user_id (int): The Telegram user ID.
     
     Returns:
-        float: The user's balance, or 0 if the user doesn't exist.
+        Money: The user's balance, or 0 if the user doesn't exist.
     """
     try:
-        with sqlite3.connect('users.db') as conn:
+        with sqlite3.connect(DB_PATH) as conn:
             c = conn.cursor()
             c.execute("SELECT balance FROM users WHERE user_id = ?", (user_id,))
             result = c.fetchone()
-            return result[0] if result else 0
+            return Money.micros(result[0]) if result else ZERO
     except sqlite3.Error as e:
         logger.error(f"Database error in get_user_balance: {e}")
-        return 0
+        return ZERO
 
+@timed_query
 def update_user_balance(user_id, new_balance):
     """
     Update the balance for a given user_id.
     
     Args:
         user_id (int): The Telegram user ID.
-        new_balance (float): The new balance to set.
+        new_balance (Money): The new balance to set.
     """
     try:
-        with sqlite3.connect('users.db') as conn:
+        with sqlite3.connect(DB_PATH) as conn:
             c = conn.cursor()
-            c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (new_balance, user_id))
+            c.execute("UPDATE users SET balance = ? WHERE user_id = ?", (Money.parse(new_balance), user_id))
             conn.commit()
     except sqlite3.Error as e:
         logger.error(f"Database error in update_user_balance: {e}")
 
+@timed_query
+def credit_many(credits, batch_id, chunk_size=CREDIT_CHUNK_SIZE):
+    """
+    Add amounts to many balances, one transaction per chunk.
+
+    Each chunk is loaded into a temp table with executemany and applied with a single
+    UPDATE joined against it. Every credited user is recorded under `batch_id`, so
+    running the same batch again, e.g. after a crash halfway, skips users that were
+    already paid; a user appearing twice in one batch is credited once.
+
+    Args:
+        credits (iterable): (user_id, amount) pairs, amount as Money. May be a generator.
+        batch_id (str): Identifier of the whole operation, e.g. the promotion name.
+        chunk_size (int): Rows per transaction.
+
+    Returns:
+        dict: Counts of credited, skipped (already paid), unknown (no such user) and
+            total rows, the amount credited, elapsed seconds and rows per second.
+            'complete' is False if a database error stopped the batch.
+    """
+    result = {'rows': 0, 'credited': 0, 'skipped': 0, 'unknown': 0, 'amount': ZERO, 'complete': True}
+    start = time.perf_counter()
+    credits = iter(credits)
+    try:
+        with sqlite3.connect(DB_PATH) as conn:
+            c = conn.cursor()
+            c.execute("CREATE TEMP TABLE IF NOT EXISTS pending_credits (user_id INTEGER PRIMARY KEY, amount INTEGER NOT NULL)")
+            while True:
+                chunk = [(user_id, Money.parse(amount)) for user_id, amount in itertools.islice(credits, chunk_size)]
+                if not chunk:
+                    break
+                c.execute("DELETE FROM pending_credits")
+                c.executemany("INSERT OR IGNORE INTO pending_credits (user_id, amount) VALUES (?, ?)", chunk)
+                c.execute("DELETE FROM pending_credits WHERE user_id IN (SELECT user_id FROM credit_batches WHERE batch_id = ?)", (batch_id,))
+                skipped = len(chunk) - c.execute("SELECT COUNT(*) FROM pending_credits").fetchone()[0]
+                c.execute("DELETE FROM pending_credits WHERE user_id NOT IN (SELECT user_id FROM users)")
+                unknown = c.rowcount
+                c.execute('''UPDATE users SET balance = balance + (SELECT amount FROM pending_credits p WHERE p.user_id = users.user_id)
+                             WHERE user_id IN (SELECT user_id FROM pending_credits)''')
+                credited = c.rowcount
+                c.execute("INSERT INTO credit_batches (batch_id, user_id, amount, ts) SELECT ?, user_id, amount, ? FROM pending_credits",
+                          (batch_id, time.time_ns()))
+                amount = c.execute("SELECT COALESCE(SUM(amount), 0) FROM pending_credits").fetchone()[0]
+                conn.commit()
+                result['rows'] += len(chunk)
+                result['credited'] += credited
+                result['skipped'] += skipped
+                result['unknown'] += unknown
+                result['amount'] += Money.micros(amount)
+    except sqlite3.Error as e:
+        logger.error(f"Database error in credit_many for batch {batch_id}: {e}")
+        result['complete'] = False
+    result['seconds'] = time.perf_counter() - start
+    result['rows_per_second'] = result['rows'] / result['seconds'] if result['seconds'] else 0.0
+    logger.debug(f"Credit batch {batch_id}: {result['credited']} credited, {result['skipped']} skipped, "
+                f"{result['unknown']} unknown users in {result['seconds']:.2f}s ({result['rows_per_second']:.0f} rows/s)")
+    return result
+
+@timed_query
 def update_user_username(user_id, username):
     """
     Update the username for a given user_id.
@@ -90,7 +148,7 @@ def update_user_username(user_id, username):
         username (str): The new username to set.
     """
     try:
-        with sqlite3.connect('users.db') as conn:
+        with sqlite3.connect(DB_PATH) as conn:
             c = conn.cursor()
             c.execute("UPDATE users SET username = ? WHERE user_id = ?", (username, user_id))
             conn.commit()
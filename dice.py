@@ -3,14 +3,21 @@ import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import sqlite3
-from database import user_exists, get_user_balance, update_user_balance
-from utils import send_with_retry, logger
+from database import user_exists
+from utils import send_with_retry
+from ledger import new_round_id
+from settlement import duel_payouts
+from holds import reserve, capture, available_balance, touch, DUEL_TTL
+from metrics import timed_handler
+from money import Money
+
+logger = logging.getLogger(__name__)
 
 # Evaluate each round with rolls in scoreboard
 async def evaluate_round(game, chat_id, game_key, context):
     rolls1, rolls2 = game['rolls']['player1'], game['rolls']['player2']
     required_rolls = game['rolls_needed']
-    logger.info(f"Evaluating round: Player1 rolls: {rolls1}, Player2 rolls: {rolls2}, Needed: {required_rolls}")
+    logger.debug("Evaluating round: Player1 rolls: %s, Player2 rolls: %s, Needed: %s", rolls1, rolls2, required_rolls)
 
     if len(rolls1) < required_rolls or len(rolls2) < required_rolls:
         logger.error(f"Incomplete rolls: Player1: {len(rolls1)}, Player2: {len(rolls2)}")
@@ -48,8 +55,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         winner = 'player1' if game['scores']['player1'] > game['scores']['player2'] else 'player2'
         winner_id = game[winner]
         prize = game['bet'] * 1.92
-        if winner_id != 'bot':
-            update_user_balance(winner_id, get_user_balance(winner_id) + prize + game['bet'])
+        capture('dice', game['round_id'], duel_payouts(game, winner, prize))
         winner_username = player1_username if winner == 'player1' else player2_username
         text = (
             f"🎲 Final Round Results\n"
@@ -104,6 +110,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         await send_with_retry(context.bot, chat_id, text=text, reply_markup=reply_markup)
 
 # Command handler for /dice
+@timed_handler
 async def dice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -118,10 +125,10 @@ async def dice_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        amount = float(context.user_data['bet_amount'])
+        amount = Money.parse(context.user_data['bet_amount'])
         if amount <= 0:
             raise ValueError("Bet must be positive.")
-        balance = get_user_balance(user_id)
+        balance = available_balance(user_id)
         if amount > balance:
             await send_with_retry(context.bot, chat_id, text=f"Insufficient balance! You have ${balance:.2f}.")
             return
@@ -152,6 +159,10 @@ async def start_game_against_bot(context, chat_id, user_id):
     bet = context.user_data['dice_bet']
     mode = context.user_data['dice_mode']
     points = context.user_data['dice_points']
+    round_id = new_round_id()
+    if not reserve({user_id: bet}, 'dice', round_id, ttl=DUEL_TTL):
+        await send_with_retry(context.bot, chat_id, text="Insufficient balance!")
+        return
     game_key = (chat_id, user_id, 'bot')
     context.bot_data.setdefault('games', {})[game_key] = {
         'player1': user_id,
@@ -164,10 +175,10 @@ async def start_game_against_bot(context, chat_id, user_id):
         'rolls': {'player1': [], 'player2': []},
         'rolls_needed': 2 if mode == 'double' else 1,
         'roll_count': {'player1': 0, 'player2': 0},
-        'round_number': 1
+        'round_number': 1,
+        'round_id': round_id
     }
     context.bot_data.setdefault('user_games', {})[(chat_id, user_id)] = game_key
-    update_user_balance(user_id, get_user_balance(user_id) - bet)
     player1_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player1"
     text = (
         f"🎲 Match started!\n"
@@ -180,13 +191,14 @@ async def start_game_against_bot(context, chat_id, user_id):
     await send_with_retry(context.bot, chat_id, text=text, reply_markup=reply_markup)
 
 # Button handler for dice game
+@timed_handler
 async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
     chat_id = query.message.chat_id
     data = query.data
-    logger.info(f"Received callback data: {data}")  # Added for debugging
+    logger.debug("Received callback data: %s", data)  # Added for debugging
 
     if data == "dice_mode_guide":
         guide_text = (
@@ -294,6 +306,10 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         if (chat_id, game['initiator']) in context.bot_data.get('user_games', {}) or (chat_id, user_id) in context.bot_data.get('user_games', {}):
             await send_with_retry(context.bot, chat_id, text="One of you is already in a game!")
             return
+        round_id = new_round_id()
+        if not reserve({game['initiator']: game['bet'], user_id: game['bet']}, 'dice', round_id, ttl=DUEL_TTL):
+            await send_with_retry(context.bot, chat_id, text="One of you doesn’t have enough balance!")
+            return
         game_key = (chat_id, game['initiator'], user_id)
         context.bot_data.setdefault('games', {})[game_key] = {
             'player1': game['initiator'],
@@ -306,12 +322,11 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             'rolls': {'player1': [], 'player2': []},
             'rolls_needed': 2 if game['mode'] == 'double' else 1,
             'roll_count': {'player1': 0, 'player2': 0},
-            'round_number': 1
+            'round_number': 1,
+            'round_id': round_id
         }
         context.bot_data.setdefault('user_games', {})[(chat_id, game['initiator'])] = game_key
         context.bot_data['user_games'][(chat_id, user_id)] = game_key
-        update_user_balance(game['initiator'], get_user_balance(game['initiator']) - game['bet'])
-        update_user_balance(user_id, get_user_balance(user_id) - game['bet'])
         player1_username = (await context.bot.get_chat_member(chat_id, game['initiator'])).user.username or "Player1"
         player2_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player2"
         text = (
@@ -336,15 +351,15 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         del context.bot_data['pending_challenges'][game_id]
 
     elif data.startswith("dice_roll_"):
-        logger.info(f"Roll dice pressed by user {user_id} in chat {chat_id}")
+        logger.debug("Roll dice pressed by user %s in chat %s", user_id, chat_id)
         game_key = context.bot_data.get('user_games', {}).get((chat_id, user_id))
         if not game_key:
-            logger.info("No game key found")
+            logger.debug("No game key found")
             await send_with_retry(context.bot, chat_id, text="No active game found!")
             return
         game = context.bot_data.get('games', {}).get(game_key)
         if not game:
-            logger.info("Game not found in bot_data")
+            logger.debug("Game not found in bot_data")
             await send_with_retry(context.bot, chat_id, text="Game data missing!")
             return
         if max(game['scores'].values()) >= game['points_to_win']:
@@ -352,7 +367,7 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             return
         player_key = 'player1' if game['player1'] == user_id else 'player2' if game['player2'] == user_id else None
         if not player_key:
-            logger.info("User is not a player in this game")
+            logger.debug("User is not a player in this game")
             return
         try:
             turn_round = int(data.split('_')[2])
@@ -363,10 +378,11 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             await send_with_retry(context.bot, chat_id, text="This button is from a previous round!")
             return
         if player_key != game['current_player']:
-            logger.info(f"User {player_key} is not the current player ({game['current_player']})")
+            logger.debug("User %s is not the current player (%s)", player_key, game['current_player'])
             await send_with_retry(context.bot, chat_id, text="It's not your turn!")
             return
-        logger.info(f"Game state before roll: {game}")
+        touch(game['round_id'])
+        logger.debug("Game state before roll: %s", game)
         dice_msg = await send_with_retry(context.bot, chat_id, emoji='🎲')
         if dice_msg is None:
             await send_with_retry(context.bot, chat_id, text="Failed to roll the dice. Please try again later.")
@@ -375,7 +391,7 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         dice_value = dice_msg.dice.value
         game['rolls'][player_key].append(dice_value)
         game['roll_count'][player_key] += 1
-        logger.info(f"Player {player_key} rolled: {dice_value}, Rolls: {game['rolls'][player_key]}")
+        logger.debug("Player %s rolled: %s, Rolls: %s", player_key, dice_value, game['rolls'][player_key])
 
         if game['roll_count']['player1'] == game['rolls_needed'] and game['roll_count']['player2'] == game['rolls_needed']:
             await evaluate_round(game, chat_id, game_key, context)
@@ -398,7 +414,7 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
                         bot_rolls.append(dice_msg.dice.value)
                     game['rolls'][other_player].extend(bot_rolls)
                     game['roll_count'][other_player] += len(bot_rolls)
-                    logger.info(f"Bot rolled: {bot_rolls}, Game state: {game}")
+                    logger.debug("Bot rolled: %s, Game state: %s", bot_rolls, game)
                     await evaluate_round(game, chat_id, game_key, context)
                 else:
                     other_username = (await context.bot.get_chat_member(chat_id, game[other_player])).user.username or "Player"
@@ -455,7 +471,7 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         opponent = last_game['opponent']
         new_bet = last_game['bet'] * 2
         if opponent == 'bot':
-            balance = get_user_balance(user_id)
+            balance = available_balance(user_id)
             if new_bet > balance:
                 await send_with_retry(context.bot, chat_id, text=f"Insufficient balance! You need ${new_bet:.2f} but have ${balance:.2f}.")
                 return
@@ -465,8 +481,8 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             await start_game_against_bot(context, chat_id, user_id)
         else:
             opponent_id = opponent
-            initiator_balance = get_user_balance(user_id)
-            opponent_balance = get_user_balance(opponent_id)
+            initiator_balance = available_balance(user_id)
+            opponent_balance = available_balance(opponent_id)
             if new_bet > initiator_balance or new_bet > opponent_balance:
                 await send_with_retry(context.bot, chat_id, text="One of you doesn’t have enough balance for the doubled bet!")
                 return
@@ -498,6 +514,7 @@ async def dice_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             await send_with_retry(context.bot, chat_id, text=text, reply_markup=InlineKeyboardMarkup(keyboard))
 
 # Text handler for username input in dice game
+@timed_handler
 async def dice_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -518,7 +535,7 @@ async def dice_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if challenged_user_id == user_id:
             await send_with_retry(context.bot, chat_id, text="You can't challenge yourself!")
             return
-        if get_user_balance(challenged_user_id) < context.user_data['dice_bet']:
+        if available_balance(challenged_user_id) < context.user_data['dice_bet']:
             await send_with_retry(context.bot, chat_id, text=f"@{username} doesn’t have enough balance!")
             return
         if (chat_id, challenged_user_id) in context.bot_data.get('user_games', {}):
@@ -0,0 +1,186 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections import defaultdict
+from math import comb
+import numpy as np
+import mines
+import tower
+from payouts import MINES_EXTRA, MINES_MULTIPLIERS, TOWER_MULTIPLIERS
+
+CELLS = mines.GRID_SIZE * mines.GRID_SIZE
+# COMB[n, k] = n choose k, exact in float64 for n <= 25
+COMB = np.array([[comb(n, k) for k in range(CELLS + 1)] for n in range(CELLS + 1)], dtype=float)
+POLICIES = ('random', 'edges')
+
+def revision():
+    """
+    Short hash of everything the report depends on, so each table revision gets its own report.
+    """
+    inputs = {
+        'mines_multipliers': MINES_MULTIPLIERS,
+        'mines_extra': MINES_EXTRA,
+        'cell_weights': mines.CELL_WEIGHTS,
+        'tower_multipliers': TOWER_MULTIPLIERS,
+        'tower_columns': tower.MODE_CONFIG,
+        'extra_monkeys': tower.EXTRA_MONKEYS,
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:12]
+
+def multiplier_matrix():
+    # Row m, column k: multiplier after k safe tiles with m mines chosen, NaN where the table has none
+    matrix = np.full((CELLS, CELLS), np.nan)
+    for m, values in MINES_MULTIPLIERS.items():
+        matrix[m, 1:len(values) + 1] = values
+    return matrix
+
+def mines_survival_random():
+    """
+    Probability of opening k safe tiles in a row when the cells are picked at random,
+    for every mines count m (rows) and k (columns).
+
+    Whatever the placement weights, a random k-cell pick misses all T = m + MINES_EXTRA
+    mines with probability C(25 - T, k) / C(25, k).
+    """
+    m = np.arange(CELLS)[:, None]
+    k = np.arange(CELLS)[None, :]
+    total = np.minimum(m + MINES_EXTRA, CELLS)
+    safe = CELLS - total
+    return np.where(k <= safe, COMB[safe, np.minimum(k, safe)] / COMB[CELLS, k], 0.0)
+
+def mine_class_distribution(total):
+    """
+    Exact distribution of how many of `total` mines land in each weight class of
+    mines.CELL_WEIGHTS, for cells drawn one at a time in proportion to the weights left.
+
+    Returns:
+        tuple: (class sizes by ascending weight, {mines per class: probability}).
+    """
+    weights = sorted(set(mines.CELL_WEIGHTS))
+    sizes = [mines.CELL_WEIGHTS.count(weight) for weight in weights]
+    states = {tuple(0 for _ in weights): 1.0}
+    for _ in range(total):
+        following = defaultdict(float)
+        for taken, p in states.items():
+            left = [weight * (size - n) for weight, size, n in zip(weights, sizes, taken)]
+            remaining = sum(left)
+            for c, weight_left in enumerate(left):
+                if weight_left:
+                    following[taken[:c] + (taken[c] + 1,) + taken[c + 1:]] += p * weight_left / remaining
+        states = following
+    return sizes, dict(states)
+
+def mines_survival_edges():
+    """
+    Like mines_survival_random, for a player who opens the lightest cells first (the
+    edges, outside mines.COMMON_AREAS), in random order within a weight class.
+    """
+    survival = np.zeros((CELLS, CELLS))
+    k = np.arange(CELLS)
+    for m in range(1, CELLS):
+        sizes, states = mine_class_distribution(min(m + MINES_EXTRA, CELLS))
+        for taken, p in states.items():
+            # Probability that the first k cells in class order are all safe, for every k at once
+            safe = np.ones(CELLS)
+            start = 0
+            for size, count in zip(sizes, taken):
+                opened = np.clip(k - start, 0, size)
+                safe *= COMB[size - count, np.minimum(opened, size - count)] / COMB[size, opened]
+                safe[opened > size - count] = 0.0
+                start += size
+            survival[m] += p * safe
+    return survival
+
+def tower_survival():
+    """
+    Probability of climbing each level, per mode: a level with 1 + extra monkeys on
+    `columns` columns is passed with probability (columns - 1 - extra) / columns.
+
+    Returns:
+        dict: mode -> array, index L = probability of clearing the first L levels.
+    """
+    survival = {}
+    for mode in tower.MODES:
+        columns = tower.MODE_CONFIG[mode]
+        per_level = (columns - 1 - np.array(tower.EXTRA_MONKEYS[mode])) / columns
+        survival[mode] = np.concatenate(([1.0], np.cumprod(np.clip(per_level, 0.0, 1.0))))
+    return survival
+
+def _row(step, survival, multiplier):
+    return {
+        'step': step,
+        'survival': survival,
+        'multiplier': multiplier,
+        'ev': survival * multiplier,
+        'fair_multiplier': 1 / survival if survival else None,
+    }
+
+def build_report():
+    """
+    Exact survival probability and EV per unit staked of every mines (count, safe tiles)
+    and tower (mode, level) entry of the payout tables.
+
+    Returns:
+        dict: {'revision', 'mines': {policy: {m: [row]}}, 'tower': {mode: [row]}}, where a row
+            holds step, survival, multiplier, ev and fair_multiplier (the multiplier of EV 1).
+    """
+    multipliers = multiplier_matrix()
+    report = {'revision': revision(), 'mines': {}, 'tower': {}}
+    for policy, survival in (('random', mines_survival_random()), ('edges', mines_survival_edges())):
+        ev = survival * multipliers
+        report['mines'][policy] = {
+            m: [_row(k, float(survival[m, k]), float(multipliers[m, k])) for k in range(1, CELLS) if not np.isnan(ev[m, k])]
+            for m in MINES_MULTIPLIERS
+        }
+    for mode, survival in tower_survival().items():
+        report['tower'][mode] = [_row(level, float(survival[level]), multiplier)
+                                 for level, multiplier in enumerate(TOWER_MULTIPLIERS[mode], 1)]
+    return report
+
+def _all_rows(report):
+    for policy, table in report['mines'].items():
+        for m, rows in table.items():
+            for row in rows:
+                yield f"mines {policy} m={m} k={row['step']}", row
+    for mode, rows in report['tower'].items():
+        for row in rows:
+            yield f"tower {mode} level {row['step']}", row
+
+def format_report(report):
+    lines = [f"Payout tables revision {report['revision']}", "", "Mines EV per safe tile, random picks:"]
+    for m, rows in report['mines']['random'].items():
+        lines.append(f"{m:>3}: " + " ".join(f"{row['ev']:.3f}" for row in rows))
+    lines += ["", "Mines EV per safe tile, edges first:"]
+    for m, rows in report['mines']['edges'].items():
+        lines.append(f"{m:>3}: " + " ".join(f"{row['ev']:.3f}" for row in rows))
+    lines += ["", "Tower EV per level:"]
+    for mode, rows in report['tower'].items():
+        lines.append(f"{mode:>6}: " + " ".join(f"{row['ev']:.3f}" for row in rows))
+    evs = [(name, row['ev']) for name, row in _all_rows(report)]
+    lines += ["", f"EV range {min(ev for _, ev in evs):.4f} to {max(ev for _, ev in evs):.4f} over {len(evs)} entries"]
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact EV of the mines and tower payout tables.")
+    parser.add_argument('--output-dir', default=None, help="Write the report to <dir>/ev_<revision>.json.")
+    parser.add_argument('--max-ev', type=float, default=None, help="Exit with status 1 if any entry's EV is above this.")
+    args = parser.parse_args()
+
+    report = build_report()
+    print(format_report(report))
+    if args.output_dir:
+        path = os.path.join(args.output_dir, f"ev_{report['revision']}.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {path}")
+
+    if args.max_ev is not None:
+        over = [name for name, row in _all_rows(report) if row['ev'] > args.max_ev]
+        if over:
+            print(f"{len(over)} entries have EV above {args.max_ev}: {', '.join(over)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
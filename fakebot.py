@@ -0,0 +1,152 @@
+import asyncio
+import itertools
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from telegram import Chat, ChatMemberMember, Dice, Message, User
+from telegram.error import RetryAfter
+
+# Value ranges Telegram uses for each animated dice emoji
+DICE_RANGES = {
+    '🎲': 6,
+    '🎯': 6,
+    '🎳': 6,
+    '⚽': 5,
+    '🏀': 5,
+    '🎰': 64
+}
+
+class FakeBot:
+    """
+    In-process stand-in for telegram.Bot covering the methods the game modules call.
+
+    Every call sleeps for a configurable latency and may raise RetryAfter, so handlers
+    can be load-tested without touching Telegram. Dice values come from a seeded RNG.
+
+    Args:
+        seed (int): Seed for dice values and fault injection.
+        latency (float): Mean simulated API latency in seconds.
+        jitter (float): Maximum extra latency added uniformly at random.
+        rate_limit_prob (float): Probability that a call raises RetryAfter.
+        retry_after (int): Seconds reported by injected RetryAfter errors.
+        username (str): Bot username, used by slots for its private chat link.
+    """
+    def __init__(self, seed=None, latency=0.0, jitter=0.0, rate_limit_prob=0.0, retry_after=1, username='fake_bot'):
+        self.random = random.Random(seed)
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_prob = rate_limit_prob
+        self.retry_after = retry_after
+        self.username = username
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def _call(self, method):
+        self.calls[method] += 1
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.rate_limit_prob and self.random.random() < self.rate_limit_prob:
+            self.rate_limited[method] += 1
+            raise RetryAfter(self.retry_after)
+
+    def _message(self, chat_id, message_id=None, **kwargs):
+        chat = Chat(id=chat_id, type=Chat.PRIVATE if chat_id > 0 else Chat.GROUP)
+        message = Message(
+            message_id=message_id or next(self._message_ids),
+            date=datetime.now(timezone.utc),
+            chat=chat,
+            **kwargs
+        )
+        message.set_bot(self)
+        return message
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        await self._call('send_message')
+        return self._message(chat_id, text=text, reply_markup=reply_markup)
+
+    async def send_dice(self, chat_id, emoji='🎲', **kwargs):
+        await self._call('send_dice')
+        value = self.random.randint(1, DICE_RANGES.get(emoji, 6))
+        return self._message(chat_id, dice=Dice(value=value, emoji=emoji))
+
+    async def send_sticker(self, chat_id, sticker, **kwargs):
+        await self._call('send_sticker')
+        return self._message(chat_id)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, reply_markup=None, **kwargs):
+        await self._call('edit_message_text')
+        return self._message(chat_id, message_id=message_id, text=text, reply_markup=reply_markup)
+
+    async def delete_message(self, chat_id, message_id, **kwargs):
+        await self._call('delete_message')
+        return True
+
+    async def get_chat_member(self, chat_id, user_id, **kwargs):
+        await self._call('get_chat_member')
+        return ChatMemberMember(user=User(id=user_id, first_name=f"user{user_id}", is_bot=False, username=f"user{user_id}"))
+
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=None, **kwargs):
+        await self._call('answer_callback_query')
+        return True
+
+def make_user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}", 'username': f"user{user_id}"}
+
+def command_update(update_id, user_id, chat_id, text):
+    """
+    Build a raw message update carrying a command.
+
+    Args:
+        update_id (int): Update identifier.
+        user_id (int): Sender of the command.
+        chat_id (int): Chat the command is sent in.
+        text (str): Full command text, e.g. '/mine 1'.
+
+    Returns:
+        dict: Raw update in Bot API format.
+    """
+    command = text.split(' ', 1)[0]
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+            'from': make_user(user_id),
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        }
+    }
+
+def callback_update(update_id, user_id, chat_id, data, message_id):
+    """
+    Build a raw callback query update for a button tap.
+
+    Args:
+        update_id (int): Update identifier.
+        user_id (int): User tapping the button.
+        chat_id (int): Chat of the message carrying the button.
+        data (str): Callback data of the button.
+        message_id (int): Message carrying the button.
+
+    Returns:
+        dict: Raw update in Bot API format.
+    """
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': make_user(user_id),
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {
+                'message_id': message_id or update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+                'text': ''
+            }
+        }
+    }
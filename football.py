@@ -2,8 +2,15 @@ import logging
 import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from database import user_exists, get_user_balance, update_user_balance
-from utils import send_with_retry, logger
+from database import user_exists
+from utils import send_with_retry
+from ledger import new_round_id
+from settlement import duel_payouts
+from holds import reserve, capture, available_balance, touch, DUEL_TTL
+from metrics import timed_handler
+from money import Money
+
+logger = logging.getLogger(__name__)
 
 # Helper function to calculate effective score based on mode
 def calculate_effective_score(rolls, mode):
@@ -19,7 +26,7 @@ def calculate_effective_score(rolls, mode):
 async def evaluate_round(game, chat_id, game_key, context):
     rolls1, rolls2 = game['rolls']['player1'], game['rolls']['player2']
     required_rolls = game['rolls_needed']
-    logger.info(f"Evaluating round - Mode: {game['mode']}, Player1 rolls: {rolls1}, Player2 rolls: {rolls2}, Needed: {required_rolls}")
+    logger.debug("Evaluating round - Mode: %s, Player1 rolls: %s, Player2 rolls: %s, Needed: %s", game['mode'], rolls1, rolls2, required_rolls)
 
     if len(rolls1) < required_rolls or len(rolls2) < required_rolls:
         logger.error(f"Incomplete rolls: Player1: {len(rolls1)}, Player2: {len(rolls2)}")
@@ -33,17 +40,17 @@ async def evaluate_round(game, chat_id, game_key, context):
     effective_score1 = calculate_effective_score(rolls1, game['mode'])
     effective_score2 = calculate_effective_score(rolls2, game['mode'])
 
-    logger.info(f"Effective scores - Player1: {effective_score1}, Player2: {effective_score2}")
+    logger.debug("Effective scores - Player1: %s, Player2: %s", effective_score1, effective_score2)
 
     # Award points only if one player scores and the other doesn't
     if effective_score1 > 0 and effective_score2 == 0:
         game['scores']['player1'] += 1
-        logger.info("Player1 scored")
+        logger.debug("Player1 scored")
     elif effective_score2 > 0 and effective_score1 == 0:
         game['scores']['player2'] += 1
-        logger.info("Player2 scored")
+        logger.debug("Player2 scored")
     else:
-        logger.info("No points awarded - both scored or both missed")
+        logger.debug("No points awarded - both scored or both missed")
 
     player1_username = (await context.bot.get_chat_member(chat_id, game['player1'])).user.username or "Player1"
     player2_username = "Bot" if game['player2'] == 'bot' else (await context.bot.get_chat_member(chat_id, game['player2'])).user.username or "Player2"
@@ -59,8 +66,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         winner = 'player1' if game['scores']['player1'] > game['scores']['player2'] else 'player2'
         winner_id = game[winner]
         prize = game['bet'] * 1.92
-        if winner_id != 'bot':
-            update_user_balance(winner_id, get_user_balance(winner_id) + prize + game['bet'])
+        capture('football', game['round_id'], duel_payouts(game, winner, prize))
         winner_username = player1_username if winner == 'player1' else player2_username
         text = (
             f"⚽ Final Round Results\n"
@@ -113,6 +119,7 @@ async def evaluate_round(game, chat_id, game_key, context):
         await send_with_retry(context.bot, chat_id, text, reply_markup=reply_markup)
 
 # Command handler for /football
+@timed_handler
 async def football_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -127,10 +134,10 @@ async def football_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     try:
-        amount = float(args[0])
+        amount = Money.parse(args[0])
         if amount <= 0:
             raise ValueError("Bet must be positive.")
-        balance = get_user_balance(user_id)
+        balance = available_balance(user_id)
         if amount > balance:
             await send_with_retry(context.bot, chat_id, text=f"Insufficient balance! You have ${balance:.2f}.")
             return
@@ -161,6 +168,10 @@ async def start_game_against_bot(context, chat_id, user_id):
     bet = context.user_data['football_bet']
     mode = context.user_data['football_mode']
     points = context.user_data['football_points']
+    round_id = new_round_id()
+    if not reserve({user_id: bet}, 'football', round_id, ttl=DUEL_TTL):
+        await send_with_retry(context.bot, chat_id, text="Insufficient balance!")
+        return
     game_key = (chat_id, user_id, 'bot')
     context.bot_data.setdefault('games', {})[game_key] = {
         'player1': user_id,
@@ -173,10 +184,10 @@ async def start_game_against_bot(context, chat_id, user_id):
         'rolls': {'player1': [], 'player2': []},
         'rolls_needed': 2 if mode == 'double' else 1,
         'roll_count': {'player1': 0, 'player2': 0},
-        'round_number': 1
+        'round_number': 1,
+        'round_id': round_id
     }
     context.bot_data.setdefault('user_games', {})[(chat_id, user_id)] = game_key
-    update_user_balance(user_id, get_user_balance(user_id) - bet)
     player1_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player1"
     text = (
         f"⚽ Match started!\n"
@@ -189,6 +200,7 @@ async def start_game_against_bot(context, chat_id, user_id):
     await send_with_retry(context.bot, chat_id, text, reply_markup=reply_markup)
 
 # Button handler for football game
+@timed_handler
 async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -302,6 +314,10 @@ async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_
         if (chat_id, game['initiator']) in context.bot_data.get('user_games', {}) or (chat_id, user_id) in context.bot_data.get('user_games', {}):
             await send_with_retry(context.bot, chat_id, text="One of you is already in a game!")
             return
+        round_id = new_round_id()
+        if not reserve({game['initiator']: game['bet'], user_id: game['bet']}, 'football', round_id, ttl=DUEL_TTL):
+            await send_with_retry(context.bot, chat_id, text="One of you doesn’t have enough balance!")
+            return
         game_key = (chat_id, game['initiator'], user_id)
         context.bot_data.setdefault('games', {})[game_key] = {
             'player1': game['initiator'],
@@ -314,12 +330,11 @@ async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_
             'rolls': {'player1': [], 'player2': []},
             'rolls_needed': 2 if game['mode'] == 'double' else 1,
             'roll_count': {'player1': 0, 'player2': 0},
-            'round_number': 1
+            'round_number': 1,
+            'round_id': round_id
         }
         context.bot_data.setdefault('user_games', {})[(chat_id, game['initiator'])] = game_key
         context.bot_data['user_games'][(chat_id, user_id)] = game_key
-        update_user_balance(game['initiator'], get_user_balance(game['initiator']) - game['bet'])
-        update_user_balance(user_id, get_user_balance(user_id) - game['bet'])
         player1_username = (await context.bot.get_chat_member(chat_id, game['initiator'])).user.username or "Player1"
         player2_username = (await context.bot.get_chat_member(chat_id, user_id)).user.username or "Player2"
         text = (
@@ -344,7 +359,7 @@ async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_
         del context.bot_data['pending_challenges'][game_id]
 
     elif data.startswith("football_take_shot_"):
-        logger.info(f"Take shot pressed by user {user_id} in chat {chat_id}")
+        logger.debug("Take shot pressed by user %s in chat %s", user_id, chat_id)
         game_key = context.bot_data.get('user_games', {}).get((chat_id, user_id))
         if not game_key:
             await send_with_retry(context.bot, chat_id, text="No active game found!")
@@ -370,6 +385,7 @@ async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_
         if player_key != game['current_player']:
             await send_with_retry(context.bot, chat_id, text="It's not your turn!")
             return
+        touch(game['round_id'])
         shot_msg = await send_with_retry(context.bot, chat_id, emoji='⚽')
         if shot_msg is None:
             await send_with_retry(context.bot, chat_id, text="Failed to take a shot. Please try again later.")
@@ -377,7 +393,7 @@ async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_
         shot_value = shot_msg.dice.value
         game['rolls'][player_key].append(shot_value)
         game['roll_count'][player_key] += 1
-        logger.info(f"Player {player_key} rolled: {shot_value}, Rolls: {game['rolls'][player_key]}, Count: {game['roll_count'][player_key]}")
+        logger.debug("Player %s rolled: %s, Rolls: %s, Count: %s", player_key, shot_value, game['rolls'][player_key], game['roll_count'][player_key])
         await asyncio.sleep(2)  # Delay after player's shot for thrill
 
         if game['roll_count'][player_key] < game['rolls_needed']:
@@ -397,7 +413,7 @@ async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_
                     bot_rolls.append(shot_msg.dice.value)
                 game['rolls'][other_player].extend(bot_rolls)
                 game['roll_count'][other_player] += len(bot_rolls)
-                logger.info(f"Bot rolled: {bot_rolls}, Rolls: {game['rolls'][other_player]}, Count: {game['roll_count'][other_player]}")
+                logger.debug("Bot rolled: %s, Rolls: %s, Count: %s", bot_rolls, game['rolls'][other_player], game['roll_count'][other_player])
                 await asyncio.sleep(2)  # Delay after bot's shot for thrill
 
             if game['roll_count']['player1'] == game['rolls_needed'] and game['roll_count']['player2'] == game['rolls_needed']:
@@ -410,6 +426,7 @@ async def football_button_handler(update: Update, context: ContextTypes.DEFAULT_
                 await send_with_retry(context.bot, chat_id, text=f"Round {game['round_number']}: @{other_username}, your turn! Tap the button to take a shot.", reply_markup=reply_markup)
 
 # Text handler for username input in football game
+@timed_handler
 async def football_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -430,7 +447,7 @@ async def football_text_handler(update: Update, context: ContextTypes.DEFAULT_TY
         if challenged_user_id == user_id:
             await send_with_retry(context.bot, chat_id, text="You can't challenge yourself!")
             return
-        if get_user_balance(challenged_user_id) < context.user_data['football_bet']:
+        if available_balance(challenged_user_id) < context.user_data['football_bet']:
             await send_with_retry(context.bot, chat_id, text=f"@{username} doesn’t have enough balance!")
             return
         if (chat_id, challenged_user_id) in context.bot_data.get('user_games', {}):
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import database
+from database import get_user_balance
+from metrics import gauge, register_collector, timed_query
+from money import Money, ZERO
+from settlement import SETTLEMENT_FAILURES, duel_payouts, settle_in
+from utils import send_with_retry
+
+logger = logging.getLogger(__name__)
+
+# Holds configurations
+DEFAULT_OWNER = 'main'
+# A duel nobody rolled in for this long is forfeited by the player whose turn it is
+DUEL_TTL = 30 * 60
+EXPIRE_INTERVAL = 60
+# Holds of other processes are only swept once they are this old, e.g. left by a shard that was removed
+MAX_AGE = 7 * 24 * 3600
+DUEL_PRIZE = 1.92
+
+HELD_AMOUNT = gauge('bot_held_amount_micros', "Stakes held for rounds in progress by this process, in micro-units.")
+HELD_COUNT = gauge('bot_holds', "Holds for rounds in progress by this process.")
+
+# Balance minus every process's holds, read in the transaction that adds a hold
+AVAILABLE = '''SELECT balance - (SELECT COALESCE(SUM(amount), 0) FROM holds WHERE user_id = ?)
+               FROM users WHERE user_id = ?'''
+
+_lock = threading.Lock()
+_swept = False
+# This process's holds, kept in step with its rows so balance checks don't query them:
+# round_id -> {user_id: Money}, and the total per user
+_rounds = {}
+_held = {}
+
+def owner():
+    """
+    Name of this process in the holds table; sharding.py sets HOLDS_OWNER to the shard.
+    """
+    return os.environ.get('HOLDS_OWNER', DEFAULT_OWNER)
+
+def sweep():
+    """
+    Release holds left in the table by this process's previous run, and holds of any
+    process that are older than MAX_AGE.
+
+    Holds never move money, so releasing one simply gives the player their stake
+    back. Runs once per process, before its first reserve.
+
+    Returns:
+        int: Number of orphaned holds released.
+    """
+    global _swept
+    with _lock:
+        if _swept:
+            return 0
+        _swept = True
+    cutoff = time.time_ns() - MAX_AGE * 1_000_000_000
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            orphans = conn.execute("SELECT user_id, game, amount, round_id FROM holds WHERE owner = ? OR created < ?",
+                                   (owner(), cutoff)).fetchall()
+            conn.execute("DELETE FROM holds WHERE owner = ? OR created < ?", (owner(), cutoff))
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error sweeping holds: {e}")
+        return 0
+    for user_id, game, amount, round_id in orphans:
+        logger.warning(f"Released orphaned {game} hold of ${Money.micros(amount):.2f} for user {user_id} (round {round_id})")
+    return len(orphans)
+
+def _cache(round_id, stakes):
+    with _lock:
+        _rounds[round_id] = stakes
+        for user_id, amount in stakes.items():
+            _held[user_id] = _held.get(user_id, ZERO) + amount
+
+def _uncache(round_id):
+    with _lock:
+        for user_id, amount in _rounds.pop(round_id, {}).items():
+            left = _held.pop(user_id) - amount
+            if left:
+                _held[user_id] = left
+
+def held(user_id):
+    """
+    Total stakes this process holds for a user, without a query.
+
+    Holds of other processes aren't counted; reserve checks those, so this is only
+    for the checks and balances shown before a round.
+    """
+    with _lock:
+        return _held.get(user_id, ZERO)
+
+def available_balance(user_id):
+    """
+    Balance minus held stakes: what the user can still bet. One query, see held().
+    """
+    return get_user_balance(user_id) - held(user_id)
+
+@timed_query
+def reserve(stakes, game, round_id, ttl=None):
+    """
+    Hold the stakes of a round for every player, if all of them can cover it.
+
+    The balances and the holds of every process are read in the transaction that
+    adds the new holds, so two shards can't both spend the same balance.
+
+    Args:
+        stakes (dict): user_id -> Money.
+        game (str): Game name, e.g. 'mines'.
+        round_id (str): Identifier of the round; capture and release refer to it.
+        ttl (float): Seconds until expire_job forfeits the round, None to keep it until it's captured.
+
+    Returns:
+        bool: True if every stake is held, False if none is.
+    """
+    sweep()
+    now = time.time_ns()
+    expires = now + int(ttl * 1_000_000_000) if ttl else 0
+    stakes = {user_id: Money.parse(amount) for user_id, amount in stakes.items()}
+    rows = [(round_id, user_id, game, amount, now, owner(), expires) for user_id, amount in stakes.items()]
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            for user_id, amount in stakes.items():
+                row = c.execute(AVAILABLE, (user_id, user_id)).fetchone()
+                if row is None or row[0] < amount:
+                    conn.rollback()
+                    return False
+            c.executemany("INSERT INTO holds (round_id, user_id, game, amount, created, owner, expires) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          rows)
+            conn.commit()
+        _cache(round_id, stakes)
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Database error holding {game} stakes for round {round_id}: {e}")
+        return False
+
+def touch(round_id, ttl=DUEL_TTL):
+    """
+    Push back the expiry of a round that has one, e.g. on every duel roll.
+    """
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            conn.execute("UPDATE holds SET expires = ? WHERE round_id = ? AND expires > 0",
+                         (time.time_ns() + int(ttl * 1_000_000_000), round_id))
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error extending round {round_id}: {e}")
+
+@timed_query
+def capture(game, round_id, payouts):
+    """
+    End a round: drop its holds, take the stakes and credit the payouts in one transaction.
+
+    Args:
+        game (str): Game name, e.g. 'mines'.
+        round_id (str): The round passed to reserve.
+        payouts (dict): user_id -> Money credited, stake included. Missing players lose their stake.
+
+    Returns:
+        bool: True if the round was settled.
+    """
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            stakes = {user_id: Money.micros(amount) for user_id, amount in
+                      c.execute("SELECT user_id, amount FROM holds WHERE round_id = ?", (round_id,)).fetchall()}
+            if not stakes:
+                conn.rollback()
+                _uncache(round_id)
+                logger.warning(f"No holds to capture for {game} round {round_id}")
+                return False
+            c.execute("DELETE FROM holds WHERE round_id = ?", (round_id,))
+            settle_in(c, game, round_id, stakes, payouts)
+            conn.commit()
+        _uncache(round_id)
+        return True
+    except sqlite3.Error as e:
+        SETTLEMENT_FAILURES.inc(game)
+        logger.error(f"Database error capturing {game} round {round_id}: {e}. Payouts owed: {payouts}")
+        return False
+
+def release(round_id):
+    """
+    Drop the holds of a round without moving any money, e.g. when it never started.
+    """
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            released = conn.execute("DELETE FROM holds WHERE round_id = ?", (round_id,)).rowcount
+            conn.commit()
+        _uncache(round_id)
+        return bool(released)
+    except sqlite3.Error as e:
+        logger.error(f"Database error releasing round {round_id}: {e}")
+        return False
+
+def expired(now=None):
+    """
+    Rounds of this process whose expiry has passed.
+
+    Returns:
+        list: (round_id, game) pairs.
+    """
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            return conn.execute('''SELECT DISTINCT round_id, game FROM holds
+                                   WHERE owner = ? AND expires > 0 AND expires <= ?''',
+                                (owner(), now or time.time_ns())).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Database error reading expired holds: {e}")
+        return []
+
+def forfeit_payouts(game):
+    """
+    Payouts of a duel abandoned mid-game: the player whose turn it is forfeits to the other.
+    """
+    winner = 'player2' if game['current_player'] == 'player1' else 'player1'
+    return duel_payouts(game, winner, game['bet'] * DUEL_PRIZE)
+
+async def expire_job(context):
+    # For JobQueue.run_repeating; an abandoned duel is settled here rather than refunded by a later sweep
+    games = context.bot_data.get('games', {})
+    duels = {game.get('round_id'): key for key, game in games.items()}
+    for round_id, name in await asyncio.to_thread(expired):
+        game_key = duels.get(round_id)
+        if game_key is None:
+            # Nothing left to decide the duel with
+            logger.warning(f"Expired {name} round {round_id} has no game state; releasing it")
+            release(round_id)
+            continue
+        game = games.pop(game_key)
+        user_games = context.bot_data.get('user_games', {})
+        for player in ('player1', 'player2'):
+            user_games.pop((game_key[0], game[player]), None)
+        capture(name, round_id, forfeit_payouts(game))
+        await send_with_retry(context.bot, game_key[0], text="⌛ The duel timed out. The player whose turn it was forfeits.")
+
+@register_collector
+def collect_holds():
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            count, amount = conn.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM holds WHERE owner = ?",
+                                         (owner(),)).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Database error reading holds for metrics: {e}")
+        return
+    HELD_AMOUNT.set(value=amount)
+    HELD_COUNT.set(value=count)
@@ -0,0 +1,41 @@
+from functools import lru_cache
+from telegram import InlineKeyboardButton
+
+class KeyboardGrid:
+    """
+    Button rows kept between edits of a game message.
+
+    Building an InlineKeyboardButton costs far more than comparing two strings, so
+    set() only builds one when a cell's text or callback data changed; every other
+    cell keeps its button object from the previous render.
+    """
+    __slots__ = ('rows', 'state')
+
+    def __init__(self, rows, columns):
+        self.rows = [[None] * columns for _ in range(rows)]
+        # Free for the caller, e.g. what was rendered last so only the difference is visited
+        self.state = None
+
+    @property
+    def columns(self):
+        return len(self.rows[0]) if self.rows else 0
+
+    def set(self, row, col, text, callback_data):
+        button = self.rows[row][col]
+        if button is None or button.text != text or button.callback_data != callback_data:
+            self.rows[row][col] = InlineKeyboardButton(text, callback_data=callback_data)
+
+    def buttons(self):
+        """
+        The rows, to be concatenated with other rows and passed to InlineKeyboardMarkup.
+        Don't modify them in place.
+        """
+        return self.rows
+
+@lru_cache(maxsize=4096)
+def button(text, callback_data):
+    """
+    Shared InlineKeyboardButton for menus that are rebuilt with the same buttons.
+    Buttons are immutable, so one object can sit in any number of keyboards.
+    """
+    return InlineKeyboardButton(text, callback_data=callback_data)
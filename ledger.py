@@ -0,0 +1,179 @@
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+import database
+from metrics import counter
+from money import Money
+
+logger = logging.getLogger(__name__)
+
+# Ledger writer configurations
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5
+QUEUE_SIZE = 100000
+# A batch the database was too busy for is retried after RETRY_DELAY, doubled up to MAX_RETRY_DELAY
+RETRY_DELAY = 0.1
+MAX_RETRY_DELAY = 5.0
+# Another connection holds the lock; the batch goes through once it's released
+TRANSIENT_ERRORS = (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+
+LEDGER_ROWS_DROPPED = counter('bot_ledger_rows_dropped_total', "Ledger rows dropped after a database error that retrying can't fix.")
+
+_ts_lock = threading.Lock()
+_last_ts = 0
+
+def new_round_id():
+    """
+    Return a fresh identifier tying together the ledger rows of one round or match.
+    """
+    return uuid.uuid4().hex
+
+def _next_ts():
+    # Nanosecond timestamps, bumped when two bets land in the same tick so (user_id, ts) stays unique
+    global _last_ts
+    with _ts_lock:
+        _last_ts = max(time.time_ns(), _last_ts + 1)
+        return _last_ts
+
+# Per-user aggregates are folded in the same transaction as the ledger rows they summarize
+STATS_UPSERT = '''INSERT INTO user_stats (user_id, bets, wagered, won, net, biggest_win) VALUES (?, ?, ?, ?, ?, ?)
+                  ON CONFLICT(user_id) DO UPDATE SET
+                      bets = bets + excluded.bets,
+                      wagered = wagered + excluded.wagered,
+                      won = won + excluded.won,
+                      net = net + excluded.net,
+                      biggest_win = MAX(biggest_win, excluded.biggest_win)'''
+
+def aggregate_stats(rows):
+    """
+    Sum ledger rows into one user_stats delta per user.
+
+    Args:
+        rows (list): Ledger rows (user_id, ts, game, stake, payout, round_id).
+
+    Returns:
+        list: (user_id, bets, wagered, won, net, biggest_win) tuples.
+    """
+    totals = {}
+    for user_id, _, _, stake, payout, _ in rows:
+        bets, wagered, won, net, biggest_win = totals.get(user_id, (0, 0, 0, 0, 0))
+        totals[user_id] = (bets + 1, wagered + stake, won + payout, net + payout - stake, max(biggest_win, payout - stake))
+    return [(user_id,) + values for user_id, values in totals.items()]
+
+def is_transient(error):
+    # Extended result codes keep the primary code in the low byte
+    code = getattr(error, 'sqlite_errorcode', None)
+    return code is not None and (code & 0xff) in TRANSIENT_ERRORS
+
+class LedgerWriter:
+    """
+    Background thread that appends ledger rows in batches, one transaction per batch.
+    """
+    def __init__(self, db_path=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.written = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='ledger-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, row):
+        self.start()
+        self.queue.put(row)
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            waiters = [item for item in batch if isinstance(item, threading.Event)]
+            rows = [item for item in batch if not isinstance(item, threading.Event)]
+            if rows:
+                self._write(rows)
+            for waiter in waiters:
+                waiter.set()
+            for _ in batch:
+                self.queue.task_done()
+
+    def _write(self, rows):
+        # The balances these rows account for are already changed, so only an error that
+        # will fail again on retry drops them
+        delay = RETRY_DELAY
+        while True:
+            try:
+                with sqlite3.connect(self.db_path or database.DB_PATH) as conn:
+                    conn.executemany(LEDGER_INSERT, rows)
+                    conn.executemany(STATS_UPSERT, aggregate_stats(rows))
+                    conn.commit()
+                self.written += len(rows)
+                return
+            except sqlite3.Error as e:
+                if not is_transient(e):
+                    LEDGER_ROWS_DROPPED.inc(amount=len(rows))
+                    logger.error(f"Database error writing {len(rows)} ledger rows, dropping them: {e}")
+                    return
+                logger.warning(f"Database busy writing {len(rows)} ledger rows, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def flush(self, timeout=10):
+        """
+        Block until every row submitted so far is written.
+        """
+        if self._thread is None:
+            return
+        waiter = threading.Event()
+        self.queue.put(waiter)
+        waiter.wait(timeout)
+
+LEDGER_INSERT = "INSERT INTO ledger (user_id, ts, game, stake, payout, round_id) VALUES (?, ?, ?, ?, ?, ?)"
+
+def ledger_row(user_id, game, stake, payout, round_id=None):
+    """
+    Build a ledger row for callers that write it in their own transaction.
+    """
+    return (user_id, _next_ts(), game, Money.parse(stake), Money.parse(payout), round_id)
+
+_writer = LedgerWriter()
+atexit.register(_writer.flush)
+
+def record_bet(user_id, game, stake, payout, round_id=None):
+    """
+    Queue a ledger row for a settled bet. Returns immediately; rows are committed in batches.
+
+    `payout` is everything credited back for the bet, stake included, so
+    payout - stake is always the net change of the user's balance.
+
+    Args:
+        user_id (int): The Telegram user ID.
+        game (str): Game name, e.g. 'mines'.
+        stake (Money): Amount wagered.
+        payout (Money): Amount credited back, 0 for a loss.
+        round_id (str): Identifier shared by the rows of one round or match.
+    """
+    _writer.submit(ledger_row(user_id, game, stake, payout, round_id))
+
+def flush():
+    _writer.flush()
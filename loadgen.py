@@ -0,0 +1,111 @@
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+CALLBACK_DATA = ['mine_noop_0_{user_id}', 'slots_noop', 'tower_rules', 'roul_cancel', 'predict_bet_half']
+
+_update_ids = itertools.count(1)
+
+def make_update(user_id, chat_id):
+    """
+    Build a synthetic Telegram update, alternating between commands and button taps.
+
+    Args:
+        user_id (int): Sender of the update.
+        chat_id (int): Chat the update belongs to.
+
+    Returns:
+        dict: Raw update in Bot API format.
+    """
+    update_id = next(_update_ids)
+    user = {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}", 'username': f"user{user_id}"}
+    chat = {'id': chat_id, 'type': 'private' if chat_id == user_id else 'group'}
+    message = {'message_id': update_id, 'date': int(time.time()), 'chat': chat, 'from': user}
+    if update_id % 2:
+        message['text'] = '/balance'
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': 8}]
+        return {'update_id': update_id, 'message': message}
+    data = random.choice(CALLBACK_DATA).format(user_id=user_id)
+    return {
+        'update_id': update_id,
+        'callback_query': {'id': str(update_id), 'from': user, 'chat_instance': str(chat_id), 'message': message, 'data': data}
+    }
+
+def run(url, secret=None, count=1000, concurrency=32, users=100):
+    """
+    Post `count` synthetic updates to the webhook and summarize the responses.
+
+    Args:
+        url (str): Webhook endpoint.
+        secret (str): Secret token header value.
+        count (int): Number of updates to send.
+        concurrency (int): Number of concurrent senders.
+        users (int): Number of distinct simulated users.
+
+    Returns:
+        dict: Status code counts, throughput and request latency percentiles.
+    """
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers[SECRET_HEADER] = secret
+    local = threading.local()
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def send(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        user_id = random.randint(1, users)
+        chat_id = user_id if random.random() < 0.5 else -1000 - user_id % 10
+        body = json.dumps(make_update(user_id, chat_id))
+        start = time.perf_counter()
+        try:
+            status = session.post(url, data=body, headers=headers, timeout=10).status_code
+        except requests.RequestException:
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[status] += 1
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, range(count)))
+    duration = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'sent': count,
+        'duration': duration,
+        'throughput': count / duration if duration else 0.0,
+        'statuses': {str(k): v for k, v in statuses.items()},
+        'request_p50': latencies[int(len(latencies) * 0.50)] if latencies else 0.0,
+        'request_p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Send synthetic updates to the webhook endpoint.")
+    parser.add_argument('--url', default='http://127.0.0.1:8443/webhook')
+    parser.add_argument('--secret', default=None)
+    parser.add_argument('--count', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--users', type=int, default=100)
+    args = parser.parse_args()
+    report = run(args.url, args.secret, args.count, args.concurrency, args.users)
+    stats_url = args.url.rsplit('/', 1)[0] + '/stats'
+    try:
+        report['server'] = requests.get(stats_url, timeout=5).json()
+    except (requests.RequestException, ValueError):
+        pass
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
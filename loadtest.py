@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import types
+from collections import defaultdict
+from telegram import Update
+import database
+from database import init_db
+from fakebot import FakeBot, command_update, callback_update
+from money import Money
+import dice
+import mines
+import predict
+import tower
+import roulette
+import slots
+
+FLOWS = ['dice', 'mine', 'tower', 'roulette', 'slots', 'predict']
+GAME_MODULES = [dice, mines, tower, roulette, slots, predict]
+START_BALANCE = Money.parse(1_000_000)
+
+_update_ids = itertools.count(1)
+
+def make_context(bot, user_data, bot_data, args=None):
+    return types.SimpleNamespace(bot=bot, user_data=user_data, bot_data=bot_data, args=args or [])
+
+class Player:
+    def __init__(self, user_id, bot, bot_data, timings):
+        self.user_id = user_id
+        self.chat_id = user_id
+        self.bot = bot
+        self.bot_data = bot_data
+        self.user_data = {}
+        self.timings = timings
+
+    async def _run(self, flow, handler, data, args=None):
+        update = Update.de_json(data, self.bot)
+        context = make_context(self.bot, self.user_data, self.bot_data, args)
+        start = time.perf_counter()
+        await handler(update, context)
+        self.timings[flow].append(time.perf_counter() - start)
+
+    async def command(self, flow, handler, text):
+        data = command_update(next(_update_ids), self.user_id, self.chat_id, text)
+        await self._run(flow, handler, data, text.split()[1:])
+
+    async def tap(self, flow, handler, callback_data, message_id=None):
+        data = callback_update(next(_update_ids), self.user_id, self.chat_id, callback_data, message_id)
+        await self._run(flow, handler, data)
+
+    async def play_dice(self):
+        self.user_data['bet_amount'] = 1
+        await self.command('dice', dice.dice_command, '/dice')
+        for step in ['dice_mode_normal', 'dice_points_1', 'dice_confirm_setup', 'dice_bot']:
+            await self.tap('dice', dice.dice_button_handler, step)
+        while (self.chat_id, self.user_id) in self.bot_data.get('user_games', {}):
+            game = self.bot_data['games'][self.bot_data['user_games'][(self.chat_id, self.user_id)]]
+            await self.tap('dice', dice.dice_button_handler, f"dice_roll_{game['round_number']}")
+
+    async def play_mine(self):
+        await self.command('mine', mines.mine_command, '/mine 1')
+        game = self.user_data['mine_game']
+        await self.tap('mine', mines.mine_button_handler, f"mine_startgame_{self.user_id}", game['message_id'])
+        cells = random.sample([(i, j) for i in range(mines.GRID_SIZE) for j in range(mines.GRID_SIZE)], 3)
+        for i, j in cells:
+            if game['game_over']:
+                break
+            await self.tap('mine', mines.mine_button_handler, f"mine_choose_{i}_{j}_{self.user_id}", game['message_id'])
+        if not game['game_over']:
+            await self.tap('mine', mines.mine_button_handler, f"mine_cashout_{self.user_id}", game['message_id'])
+
+    async def play_tower(self):
+        await self.command('tower', tower.tower_command, '/tower 1')
+        game = self.user_data['tower_game']
+        await self.tap('tower', tower.tower_button_handler, 'tower_start_game', game['message_id'])
+        columns = tower.MODE_CONFIG[game['chosen_mode']]
+        for _ in range(3):
+            if game['game_over']:
+                break
+            col = random.randrange(columns)
+            await self.tap('tower', tower.tower_button_handler, f"tower_choose_{col}_{game['current_level']}", game['message_id'])
+        if not game['game_over']:
+            await self.tap('tower', tower.tower_button_handler, 'tower_cash_out', game['message_id'])
+
+    async def play_roulette(self):
+        if 'roulette_game' not in self.user_data:
+            await self.command('roulette', roulette.roulette_command, '/roul 1')
+        await self.tap('roulette', roulette.roulette_button_handler, 'roul_bet_color_red')
+        if random.random() < 0.5:
+            # A ticket with two bets
+            await self.tap('roulette', roulette.roulette_button_handler, 'roul_bet_number_menu')
+            await self.tap('roulette', roulette.roulette_button_handler, f"roul_select_number_{random.randrange(37)}")
+        await self.tap('roulette', roulette.roulette_button_handler, 'roul_start')
+
+    async def play_slots(self):
+        if 'slots_game' not in self.user_data:
+            await self.command('slots', slots.slots_command, '/slots')
+        if random.random() < 0.2:
+            await self.tap('slots', slots.slots_button_handler, 'slots_auto_start')
+        else:
+            await self.tap('slots', slots.slots_button_handler, 'slots_spin')
+
+    async def play_predict(self):
+        if 'predict_game' not in self.user_data:
+            await self.command('predict', predict.predict_command, '/predict')
+        await self.tap('predict', predict.predict_button_handler, f"predict_{random.randint(1, 6)}")
+        if random.random() < 0.5:
+            # Cycles through the series lengths
+            await self.tap('predict', predict.predict_button_handler, 'predict_series')
+        await self.tap('predict', predict.predict_button_handler, 'predict_start')
+
+    async def play(self, flows, rounds, errors):
+        for _ in range(rounds):
+            flow = random.choice(flows)
+            try:
+                await getattr(self, f"play_{flow}")()
+            except Exception as e:
+                errors[f"{flow}: {type(e).__name__}: {e}"] += 1
+
+def setup_database(players, db_path):
+    """
+    Point the bot at a throwaway database and give every player START_BALANCE.
+
+    Args:
+        players (int): Users to create, with ids 1 to players.
+        db_path (str): Database file; it becomes database.DB_PATH.
+    """
+    database.DB_PATH = db_path
+    init_db()
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO users (user_id, username, balance) VALUES (?, ?, ?)",
+            [(uid, f"user{uid}", START_BALANCE) for uid in range(1, players + 1)]
+        )
+        conn.commit()
+
+def skip_animations():
+    # The game modules only use asyncio for sleep(); replace it so runs measure our code, not animations
+    async def no_sleep(delay, result=None):
+        await asyncio.sleep(0)
+        return result
+
+    fast_asyncio = types.SimpleNamespace(**{name: getattr(asyncio, name) for name in dir(asyncio) if not name.startswith('_')})
+    fast_asyncio.sleep = no_sleep
+    for module in GAME_MODULES:
+        module.asyncio = fast_asyncio
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+async def run(players=1000, rounds=3, flows=FLOWS, seed=None, latency=0.0, jitter=0.0, rate_limit_prob=0.0,
+              db_path=None):
+    """
+    Simulate concurrent players running game flows against a FakeBot.
+
+    Args:
+        players (int): Number of concurrent simulated players.
+        rounds (int): Flows each player runs.
+        flows (list): Flow names to pick from.
+        seed (int): Seed for the bot and the players' choices.
+        latency (float): Simulated Bot API latency in seconds.
+        jitter (float): Extra random latency in seconds.
+        rate_limit_prob (float): Probability of an injected 429 per API call.
+        db_path (str): Throwaway database, a new one in a temporary directory by default.
+
+    Returns:
+        dict: Per-flow and overall latency percentiles, throughput, API call counts and errors.
+    """
+    random.seed(seed)
+    bot = FakeBot(seed=seed, latency=latency, jitter=jitter, rate_limit_prob=rate_limit_prob)
+    bot_data = {}
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    setup_database(players, db_path or os.path.join(tempfile.mkdtemp(prefix='loadtest-'), 'users.db'))
+    start = time.perf_counter()
+    await asyncio.gather(*(Player(uid, bot, bot_data, timings).play(flows, rounds, errors) for uid in range(1, players + 1)))
+    duration = time.perf_counter() - start
+
+    report = {'players': players, 'rounds': rounds, 'duration': duration, 'flows': {}}
+    all_timings = []
+    for flow, values in sorted(timings.items()):
+        values.sort()
+        all_timings.extend(values)
+        report['flows'][flow] = {
+            'updates': len(values),
+            'p50_ms': percentile(values, 0.50) * 1000,
+            'p99_ms': percentile(values, 0.99) * 1000
+        }
+    all_timings.sort()
+    report['updates'] = len(all_timings)
+    report['throughput'] = len(all_timings) / duration if duration else 0.0
+    report['p50_ms'] = percentile(all_timings, 0.50) * 1000
+    report['p99_ms'] = percentile(all_timings, 0.99) * 1000
+    report['api_calls'] = dict(bot.calls)
+    report['rate_limited'] = dict(bot.rate_limited)
+    report['errors'] = dict(errors)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the game handlers against an in-process fake Bot API.")
+    parser.add_argument('--players', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--flows', default=','.join(FLOWS))
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--rate-limit-prob', type=float, default=0.0)
+    parser.add_argument('--animations', action='store_true', help="Keep the handlers' animation sleeps.")
+    parser.add_argument('--workdir', default=None, help="Directory for the throwaway users.db.")
+    args = parser.parse_args()
+
+    if not args.animations:
+        skip_animations()
+    db_path = os.path.join(args.workdir, 'users.db') if args.workdir else None
+    report = asyncio.run(run(args.players, args.rounds, args.flows.split(','), args.seed,
+                             args.latency, args.jitter, args.rate_limit_prob, db_path))
+    print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main()
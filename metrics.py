@@ -0,0 +1,245 @@
+import functools
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from flask import Flask, Response
+from werkzeug.serving import make_server
+
+# metrics is imported by database and utils, so it can't use utils.logger
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DEFAULT_PORT = 9100
+
+_lock = threading.Lock()
+_metrics = {}
+_collectors = []
+# Commands and callback patterns route_of labels by name; see register_commands and register_callbacks
+_commands = set()
+_callbacks = []
+
+def _escape(value):
+    # Label value escaping of the Prometheus text format
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def inc(self, *label_values, amount=1):
+        with _lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Gauge(Counter):
+    def set(self, *label_values, value):
+        with _lock:
+            self.values[label_values] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, *label_values, value):
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self.values.get(label_values)
+            if series is None:
+                series = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels + ('le',), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+def _register(metric):
+    with _lock:
+        return _metrics.setdefault(metric.name, metric)
+
+def counter(name, help_text, labels=()):
+    return _register(Counter(name, help_text, labels))
+
+def gauge(name, help_text, labels=()):
+    return _register(Gauge(name, help_text, labels))
+
+def histogram(name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram(name, help_text, labels, buckets))
+
+HANDLER_LATENCY = histogram('bot_handler_seconds', "Time spent in a handler per command or callback route.", ('route',))
+HANDLER_ERRORS = counter('bot_handler_errors_total', "Handler calls that raised.", ('route',))
+DB_LATENCY = histogram('bot_db_query_seconds', "Time spent in database.py calls.", ('query',))
+API_LATENCY = histogram('bot_api_call_seconds', "Bot API call time in send_with_retry, including retries.", ('method',))
+API_RATE_LIMITED = counter('bot_api_rate_limited_total', "429 responses seen by send_with_retry.", ('method',))
+API_FAILURES = counter('bot_api_failures_total', "Bot API calls that failed after all retries.", ('method',))
+LIVE_GAMES = gauge('bot_live_games', "Games in progress per game type.", ('game',))
+
+def register_collector(func):
+    """
+    Register a callable run on every scrape to refresh gauges.
+    """
+    _collectors.append(func)
+    return func
+
+def render():
+    for collector in list(_collectors):
+        try:
+            collector()
+        except Exception as e:
+            logger.error(f"Metrics collector failed: {e}")
+    lines = []
+    with _lock:
+        metrics = list(_metrics.values())
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def register_commands(commands):
+    """
+    Declare the bot's commands, so route_of can label them; any other command is 'other'.
+
+    Args:
+        commands (iterable): Command names without the slash, e.g. 'mine'.
+    """
+    _commands.update(f"/{command}" for command in commands)
+
+def register_callbacks(patterns):
+    """
+    Declare the bot's callback_data patterns, so route_of labels a button by the pattern
+    it matches, e.g. r'^mine_' as 'mine'; any other callback data is 'other'.
+
+    Args:
+        patterns (iterable): Regular expressions, as given to CallbackQueryHandler.
+    """
+    _callbacks.extend((re.compile(pattern), pattern.strip('^_')) for pattern in patterns)
+
+def route_of(update):
+    """
+    Label an update by its command or callback route, without ids or amounts. Commands
+    and callback data come from the client, so only registered ones get their own label.
+
+    Args:
+        update (telegram.Update): The incoming update.
+
+    Returns:
+        str: e.g. '/mine' or 'mine'.
+    """
+    query = getattr(update, 'callback_query', None)
+    if query is not None and query.data:
+        for pattern, route in _callbacks:
+            if pattern.match(query.data):
+                return route
+        return 'other'
+    message = getattr(update, 'message', None)
+    if message is not None and message.text:
+        if message.text.startswith('/'):
+            command = message.text.split(' ', 1)[0].split('@', 1)[0]
+            return command if command in _commands else 'other'
+        return 'text'
+    return 'other'
+
+def timed_handler(func):
+    """
+    Decorator recording handler latency per command and callback route.
+    """
+    @functools.wraps(func)
+    async def wrapper(update, context, *args, **kwargs):
+        route = route_of(update)
+        start = time.perf_counter()
+        try:
+            return await func(update, context, *args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.inc(route)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(route, value=time.perf_counter() - start)
+    return wrapper
+
+def timed_query(func):
+    """
+    Decorator recording the duration of a database.py call.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_LATENCY.observe(func.__name__, value=time.perf_counter() - start)
+    return wrapper
+
+def track_application(application):
+    """
+    Export live game counts from an Application's user_data and bot_data on every scrape.
+
+    Args:
+        application (telegram.ext.Application): The running application.
+    """
+    user_games = {'mine_game': 'mines', 'tower_game': 'tower', 'slots_game': 'slots',
+                  'roulette_game': 'roulette', 'predict_game': 'predict'}
+
+    @register_collector
+    def collect_live_games():
+        counts = dict.fromkeys(list(user_games.values()) + ['coin', 'duel'], 0)
+        for data in list(application.user_data.values()):
+            for key, game_type in user_games.items():
+                game = data.get(key)
+                if game and game.get('state', 'playing') == 'playing':
+                    counts[game_type] += 1
+        counts['coin'] = len(application.bot_data.get('coin_games', {}))
+        counts['duel'] = len(application.bot_data.get('games', {}))
+        for game_type, count in counts.items():
+            LIVE_GAMES.set(game_type, value=count)
+
+def add_metrics_route(app):
+    app.add_url_rule('/metrics', 'metrics', lambda: Response(render(), mimetype='text/plain; version=0.0.4'))
+    return app
+
+def serve_metrics(host='127.0.0.1', port=DEFAULT_PORT):
+    """
+    Serve /metrics from a background thread.
+
+    Returns:
+        werkzeug.serving.BaseWSGIServer: The server; call shutdown() to stop it.
+    """
+    app = add_metrics_route(Flask(__name__))
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,330 @@
+import argparse
+import logging
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# Set up logging for schema migrations
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+BATCH_PAUSE = 0.05
+BUSY_TIMEOUT = 30.0
+# How long a process waits for another one's migrations to finish
+LOCK_TIMEOUT = 600.0
+MIN_KEY = -9223372036854775808
+
+MIGRATIONS = []
+
+def migration(version, name):
+    """
+    Register a schema migration. Versions are applied in ascending order, each exactly once.
+
+    A migration receives an autocommit connection and must be idempotent: it runs
+    against databases created before this framework existed, and is retried after a
+    crash until its version is recorded.
+    """
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return func
+    return register
+
+def column_names(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+def column_type(conn, table, column):
+    for row in conn.execute(f"PRAGMA table_info({table})"):
+        if row[1] == column:
+            return row[2].upper()
+    return None
+
+def backfill(conn, name, select_sql, apply_batch, batch_size=BATCH_SIZE, pause=BATCH_PAUSE, total_sql=None):
+    """
+    Walk rows in key order and apply changes in small transactions, sleeping between
+    batches so the bot's own reads and writes get the database in between.
+
+    Args:
+        conn (sqlite3.Connection): Autocommit connection.
+        name (str): Label used in progress reports.
+        select_sql (str): Query with one `?` for the last key seen, returning up to
+            `?` (batch size) rows ordered by key, the key first.
+        apply_batch (callable): Called with (conn, rows) inside the batch transaction.
+        batch_size (int): Rows per transaction.
+        pause (float): Seconds to sleep between batches.
+        total_sql (str): Optional count query used for progress percentages.
+
+    Returns:
+        int: Number of rows processed.
+    """
+    total = conn.execute(total_sql).fetchone()[0] if total_sql else None
+    done = 0
+    last_key = None
+    start = time.monotonic()
+    while True:
+        rows = conn.execute(select_sql, (last_key, batch_size)).fetchall()
+        if not rows:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            apply_batch(conn, rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        done += len(rows)
+        last_key = rows[-1][0]
+        rate = done / max(time.monotonic() - start, 1e-9)
+        progress = f"{done}/{total} ({100 * done / total:.1f}%)" if total else f"{done}"
+        logger.info(f"Backfill {name}: {progress} rows, {rate:.0f} rows/s")
+        time.sleep(pause)
+    return done
+
+def rebuild_table(conn, table, definition, columns, convert=None, key=('user_id',), indexes=()):
+    """
+    Rebuild a table under a new definition while it stays in use.
+
+    Triggers mirror every write on the old table into the new one, existing rows are
+    copied over in user_id batches, and the tables are swapped in one short transaction.
+    Safe to rerun after a crash at any point.
+
+    Args:
+        conn (sqlite3.Connection): Autocommit connection.
+        table (str): Table to rebuild; it must have a user_id column.
+        definition (str): Everything after the table name in the new CREATE TABLE.
+        columns (tuple): Columns carried over, in order.
+        convert (dict): SQL expression per column converting an old value, with
+            `{row}` in front of column references.
+        key (tuple): Primary key columns of the table.
+        indexes (list): CREATE INDEX statements to run on the rebuilt table.
+    """
+    new_table = f"{table}_rebuild"
+    convert = convert or {}
+    names = ', '.join(columns)
+
+    def values(row):
+        return ', '.join(convert.get(column, '{row}' + column).format(row=row) for column in columns)
+
+    match_key = ' AND '.join(f"{column} = OLD.{column}" for column in key)
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {new_table} {definition}")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {new_table}_insert AFTER INSERT ON {table} BEGIN
+                     INSERT OR REPLACE INTO {new_table} ({names}) VALUES ({values('NEW.')}); END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {new_table}_update AFTER UPDATE ON {table} BEGIN
+                     DELETE FROM {new_table} WHERE {match_key};
+                     INSERT OR REPLACE INTO {new_table} ({names}) VALUES ({values('NEW.')}); END""")
+    conn.execute(f"""CREATE TRIGGER IF NOT EXISTS {new_table}_delete AFTER DELETE ON {table} BEGIN
+                     DELETE FROM {new_table} WHERE {match_key}; END""")
+
+    # Rows the triggers already mirrored are newer than the copy, hence OR IGNORE
+    def apply_batch(conn, rows):
+        conn.executemany(f"INSERT OR IGNORE INTO {new_table} ({names}) SELECT {values('')} FROM {table} WHERE user_id = ?", rows)
+
+    backfill(
+        conn, table,
+        f"SELECT DISTINCT user_id FROM {table} WHERE user_id > coalesce(?, {MIN_KEY}) ORDER BY user_id LIMIT ?",
+        apply_batch,
+        total_sql=f"SELECT COUNT(DISTINCT user_id) FROM {table}"
+    )
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for trigger in ('insert', 'update', 'delete'):
+            conn.execute(f"DROP TRIGGER {new_table}_{trigger}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+        for index in indexes:
+            conn.execute(index)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+@migration(1, "users table")
+def create_users(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS users
+                    (user_id INTEGER PRIMARY KEY, username TEXT, balance REAL DEFAULT 100.0)''')
+    # Older databases predate the username column
+    if 'username' not in column_names(conn, 'users'):
+        conn.execute("ALTER TABLE users ADD COLUMN username TEXT")
+
+@migration(2, "ledger table")
+def create_ledger(conn):
+    # Append-only record of every settled bet; payout - stake is the balance change
+    conn.execute('''CREATE TABLE IF NOT EXISTS ledger
+                    (user_id INTEGER NOT NULL, ts INTEGER NOT NULL, game TEXT NOT NULL,
+                     stake REAL NOT NULL, payout REAL NOT NULL, round_id TEXT,
+                     PRIMARY KEY (user_id, ts)) WITHOUT ROWID''')
+
+@migration(3, "user_stats table and leaderboard indexes")
+def create_user_stats(conn):
+    # Running per-user totals over the ledger, with covering indexes for the leaderboards
+    conn.execute('''CREATE TABLE IF NOT EXISTS user_stats
+                    (user_id INTEGER PRIMARY KEY, bets INTEGER NOT NULL DEFAULT 0,
+                     wagered REAL NOT NULL DEFAULT 0, won REAL NOT NULL DEFAULT 0,
+                     net REAL NOT NULL DEFAULT 0, biggest_win REAL NOT NULL DEFAULT 0)''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_stats_wagered ON user_stats (wagered DESC, user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_stats_net ON user_stats (net DESC, user_id)")
+
+    # Ledgers written before user_stats existed get their totals built user by user
+    def apply_batch(conn, rows):
+        conn.executemany('''INSERT OR IGNORE INTO user_stats (user_id, bets, wagered, won, net, biggest_win)
+                            SELECT user_id, COUNT(*), SUM(stake), SUM(payout), SUM(payout - stake), MAX(MAX(payout - stake), 0)
+                            FROM ledger WHERE user_id = ?''', [(row[0],) for row in rows])
+
+    backfill(
+        conn, 'user_stats',
+        f'''SELECT DISTINCT user_id FROM ledger
+           WHERE user_id > coalesce(?, {MIN_KEY})
+             AND user_id NOT IN (SELECT user_id FROM user_stats)
+           ORDER BY user_id LIMIT ?''',
+        apply_batch,
+        total_sql="SELECT COUNT(DISTINCT user_id) FROM ledger WHERE user_id NOT IN (SELECT user_id FROM user_stats)"
+    )
+
+@migration(4, "users.username index")
+def index_usernames(conn):
+    # Challenges look players up by username
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)")
+
+# Money columns hold integer micro-units from version 5 on (see money.py)
+TO_MICROS = "CAST(ROUND(coalesce({row}%s, 0) * 1000000) AS INTEGER)"
+
+@migration(5, "users.balance in integer micro-units")
+def users_to_micros(conn):
+    if column_type(conn, 'users', 'balance') == 'INTEGER':
+        return
+    rebuild_table(
+        conn, 'users',
+        '(user_id INTEGER PRIMARY KEY, username TEXT, balance INTEGER NOT NULL DEFAULT 100000000)',
+        ('user_id', 'username', 'balance'),
+        {'balance': TO_MICROS % 'balance'},
+        indexes=["CREATE INDEX IF NOT EXISTS idx_users_username ON users (username)"]
+    )
+
+@migration(6, "ledger amounts in integer micro-units")
+def ledger_to_micros(conn):
+    if column_type(conn, 'ledger', 'stake') == 'INTEGER':
+        return
+    rebuild_table(
+        conn, 'ledger',
+        '''(user_id INTEGER NOT NULL, ts INTEGER NOT NULL, game TEXT NOT NULL,
+            stake INTEGER NOT NULL, payout INTEGER NOT NULL, round_id TEXT,
+            PRIMARY KEY (user_id, ts)) WITHOUT ROWID''',
+        ('user_id', 'ts', 'game', 'stake', 'payout', 'round_id'),
+        {'stake': TO_MICROS % 'stake', 'payout': TO_MICROS % 'payout'},
+        key=('user_id', 'ts')
+    )
+
+@migration(7, "user_stats amounts in integer micro-units")
+def user_stats_to_micros(conn):
+    if column_type(conn, 'user_stats', 'wagered') == 'INTEGER':
+        return
+    amounts = ('wagered', 'won', 'net', 'biggest_win')
+    rebuild_table(
+        conn, 'user_stats',
+        '''(user_id INTEGER PRIMARY KEY, bets INTEGER NOT NULL DEFAULT 0,
+            wagered INTEGER NOT NULL DEFAULT 0, won INTEGER NOT NULL DEFAULT 0,
+            net INTEGER NOT NULL DEFAULT 0, biggest_win INTEGER NOT NULL DEFAULT 0)''',
+        ('user_id', 'bets') + amounts,
+        {column: TO_MICROS % column for column in amounts},
+        indexes=[
+            "CREATE INDEX IF NOT EXISTS idx_user_stats_wagered ON user_stats (wagered DESC, user_id)",
+            "CREATE INDEX IF NOT EXISTS idx_user_stats_net ON user_stats (net DESC, user_id)"
+        ]
+    )
+
+@migration(8, "credit_batches table")
+def create_credit_batches(conn):
+    # One row per user credited by a bulk operation, so a retried batch skips users it already paid
+    conn.execute('''CREATE TABLE IF NOT EXISTS credit_batches
+                    (batch_id TEXT NOT NULL, user_id INTEGER NOT NULL, amount INTEGER NOT NULL, ts INTEGER NOT NULL,
+                     PRIMARY KEY (batch_id, user_id)) WITHOUT ROWID''')
+
+@migration(9, "holds table")
+def create_holds(conn):
+    # Stakes of rounds in progress, see holds.py
+    conn.execute('''CREATE TABLE IF NOT EXISTS holds
+                    (round_id TEXT NOT NULL, user_id INTEGER NOT NULL, game TEXT NOT NULL,
+                     amount INTEGER NOT NULL, created INTEGER NOT NULL,
+                     PRIMARY KEY (round_id, user_id)) WITHOUT ROWID''')
+
+@migration(10, "holds owner, expiry and user index")
+def holds_owner(conn):
+    # Every process checks balances against all holds, and sweeps only the ones it owns
+    columns = column_names(conn, 'holds')
+    if 'owner' not in columns:
+        conn.execute("ALTER TABLE holds ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+    if 'expires' not in columns:
+        conn.execute("ALTER TABLE holds ADD COLUMN expires INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_holds_user ON holds (user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_holds_owner ON holds (owner, expires)")
+
+def current_version(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at REAL NOT NULL)''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+@contextmanager
+def migration_lock(db_path, timeout=LOCK_TIMEOUT):
+    """
+    Let one process at a time migrate the database: shards, the webhook process and
+    the CLIs all call init_db.
+
+    The lock is an exclusive transaction on a file next to the database, since a
+    migration commits in batches and can't hold a transaction on the database itself.
+    """
+    lock = sqlite3.connect(f"{db_path}.migrate-lock", isolation_level=None, timeout=timeout)
+    try:
+        lock.execute("BEGIN EXCLUSIVE")
+        yield
+    finally:
+        # Closing rolls the empty transaction back, which releases the lock
+        lock.close()
+
+def run_migrations(db_path='users.db', target=None):
+    """
+    Apply every pending migration to the database.
+
+    Args:
+        db_path (str): Path of the SQLite database.
+        target (int): Stop after this version, or None for the latest.
+
+    Returns:
+        int: The schema version after migrating.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=BUSY_TIMEOUT)
+    try:
+        # WAL lets readers keep going while a migration batch writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        with migration_lock(db_path):
+            # Read under the lock: a process that waited sees what the one before it applied
+            version = current_version(conn)
+            for number, name, func in MIGRATIONS:
+                if number <= version or (target is not None and number > target):
+                    continue
+                logger.info(f"Applying migration {number}: {name}")
+                start = time.monotonic()
+                func(conn)
+                conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)", (number, name, time.time()))
+                version = number
+                logger.info(f"Migration {number} applied in {time.monotonic() - start:.2f}s")
+        return version
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending users.db schema migrations.")
+    parser.add_argument('--db', default='users.db')
+    parser.add_argument('--target', type=int, default=None)
+    parser.add_argument('--status', action='store_true', help="Only print the current and latest versions.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.status:
+        conn = sqlite3.connect(args.db, isolation_level=None)
+        print(f"Current version: {current_version(conn)}, latest: {MIGRATIONS[-1][0]}")
+        conn.close()
+        return
+    print(f"Schema at version {run_migrations(args.db, args.target)}")
+
+if __name__ == '__main__':
+    main()
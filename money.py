@@ -0,0 +1,134 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+# One dollar is stored as 1_000_000 micro-units
+MICROS = 1_000_000
+
+class Money(int):
+    """
+    An amount of money in integer micro-units.
+
+    Sums and differences of Money stay Money and are exact. Multiplying by a float
+    multiplier goes through its decimal representation, so `bet * 1.92` is exact up
+    to a final rounding to the nearest micro-unit, and so is dividing by a number.
+    Formatting shows dollars, so f"${bet:.2f}" keeps working.
+
+    A float on the left of + or - (`1.5 + bet`) is handled by float itself and gives
+    a float, so amounts must go through Money.parse before any arithmetic.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def micros(cls, value):
+        """
+        Wrap a count of micro-units, e.g. a balance column read from the database.
+
+        Args:
+            value (int): Micro-units.
+
+        Returns:
+            Money: The same amount.
+
+        Raises:
+            TypeError: If the value isn't an integer; dollars go through Money.parse.
+        """
+        if isinstance(value, Money):
+            return value
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise TypeError(f"Money.micros needs an integer, got {type(value).__name__}; use Money.parse for dollars.")
+        return cls(value)
+
+    @classmethod
+    def parse(cls, value):
+        """
+        Convert a dollar amount to Money.
+
+        Args:
+            value (str | int | float | Decimal | Money): Dollars, e.g. "2.50" from a command
+                argument. Money is returned unchanged.
+
+        Returns:
+            Money: The amount in micro-units.
+
+        Raises:
+            ValueError: If the value isn't a finite number.
+        """
+        if isinstance(value, Money):
+            return value
+        try:
+            amount = Decimal(str(value).strip().lstrip('$'))
+        except InvalidOperation:
+            raise ValueError(f"could not convert '{value}' to an amount")
+        if not amount.is_finite():
+            raise ValueError(f"could not convert '{value}' to an amount")
+        return cls((amount * MICROS).to_integral_value(ROUND_HALF_EVEN))
+
+    @property
+    def dollars(self):
+        return Decimal(int(self)).scaleb(-6)
+
+    def __add__(self, other):
+        if isinstance(other, float):
+            raise TypeError("Money can't be added to a float; use Money.parse first.")
+        if isinstance(other, int):
+            return Money(int(self) + int(other))
+        return NotImplemented
+
+    def __radd__(self, other):
+        if isinstance(other, float):
+            raise TypeError("A float can't be added to Money; use Money.parse first.")
+        if isinstance(other, int):
+            return Money(int(other) + int(self))
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, float):
+            raise TypeError("Money can't be subtracted from a float; use Money.parse first.")
+        if isinstance(other, int):
+            return Money(int(self) - int(other))
+        return NotImplemented
+
+    def __rsub__(self, other):
+        if isinstance(other, float):
+            raise TypeError("Money can't be subtracted from a float; use Money.parse first.")
+        if isinstance(other, int):
+            return Money(int(other) - int(self))
+        return NotImplemented
+
+    def __mul__(self, factor):
+        if isinstance(factor, Money):
+            raise TypeError("Money can't be multiplied by Money.")
+        if isinstance(factor, int):
+            return Money(int(self) * factor)
+        if isinstance(factor, (float, Decimal)):
+            return Money((int(self) * Decimal(str(factor))).to_integral_value(ROUND_HALF_EVEN))
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, divisor):
+        # Money / Money is a plain ratio; Money / number is Money, rounded like __mul__
+        if isinstance(divisor, Money):
+            return int(self) / int(divisor)
+        if isinstance(divisor, (int, float, Decimal)):
+            return Money((int(self) / Decimal(str(divisor))).to_integral_value(ROUND_HALF_EVEN))
+        return NotImplemented
+
+    def __rtruediv__(self, other):
+        raise TypeError("Can't divide by Money.")
+
+    def __neg__(self):
+        return Money(-int(self))
+
+    def __abs__(self):
+        return Money(abs(int(self)))
+
+    def __format__(self, spec):
+        return format(self.dollars, spec) if spec else str(self)
+
+    def __str__(self):
+        return format(self.dollars, '.2f')
+
+    def __repr__(self):
+        return f"Money('{self.dollars}')"
+
+ZERO = Money(0)
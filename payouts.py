@@ -0,0 +1,264 @@
+# Payout multipliers of every game, compiled at import into flat tuples indexed by integers.
+# Lookups are one index computation and one tuple access: no fallback lists, no string branches.
+
+from collections import namedtuple
+
+GRID_CELLS = 25
+# Mines dealt on top of the number the player chooses (see mines.generate_grid)
+MINES_EXTRA = 2
+MINES_STRIDE = GRID_CELLS + 1
+TOWER_LEVELS = 9
+TOWER_STRIDE = TOWER_LEVELS + 1
+ROULETTE_POCKETS = 37
+
+# Mines: multiplier after the n-th safe tile, per number of mines chosen
+MINES_MULTIPLIERS = {
+    1: [1.03, 1.07, 1.12, 1.17, 1.23, 1.30, 1.37, 1.45, 1.54, 1.64, 1.76, 1.89, 2.05, 2.23, 2.46, 2.74, 3.08, 3.52, 4.10, 4.93, 6.16, 8.21, 12.31, 24.63],
+    2: [1.07, 1.17, 1.28, 1.41, 1.56, 1.73, 1.92, 2.14, 2.40, 2.69, 3.05, 3.48, 4.00, 4.65, 5.46, 6.50, 7.84, 9.62, 12.07, 15.50, 20.53, 28.25, 41.29],
+    3: [1.12, 1.25, 1.39, 1.56, 1.75, 1.98, 2.24, 2.56, 2.94, 3.40, 3.96, 4.66, 5.54, 6.67, 8.16, 10.16, 12.91, 16.81, 22.55, 31.32, 45.42, 70.38],
+    4: [1.18, 1.35, 1.53, 1.74, 1.98, 2.26, 2.60, 3.01, 3.52, 4.14, 4.92, 5.91, 7.18, 8.85, 11.06, 14.13, 18.53, 25.14, 35.37, 52.28, 83.54],
+    5: [1.23, 1.45, 1.67, 1.93, 2.23, 2.58, 3.01, 3.53, 4.18, 4.99, 6.03, 7.38, 9.17, 11.57, 14.89, 19.62, 26.60, 37.42, 55.62, 90.09],
+    6: [1.30, 1.56, 1.85, 2.19, 2.58, 3.05, 3.62, 4.32, 5.18, 6.25, 7.60, 9.33, 11.57, 14.53, 18.53, 24.13, 32.19, 44.06, 62.50, 92.59],
+    7: [1.37, 1.67, 2.03, 2.46, 2.97, 3.58, 4.32, 5.23, 6.37, 7.80, 9.62, 11.96, 15.03, 19.18, 24.90, 33.01, 45.05, 63.49, 92.59],
+    8: [1.45, 1.80, 2.23, 2.74, 3.36, 4.10, 5.00, 6.13, 7.55, 9.33, 11.64, 14.64, 18.64, 24.13, 31.75, 42.68, 58.82, 83.33],
+    9: [1.54, 1.93, 2.46, 3.05, 3.77, 4.65, 5.76, 7.14, 8.85, 11.06, 13.89, 17.54, 22.55, 29.41, 39.06, 52.91, 73.53],
+    10: [1.64, 2.08, 2.69, 3.40, 4.23, 5.26, 6.58, 8.20, 10.28, 12.94, 16.39, 20.83, 26.79, 35.09, 46.73, 63.49],
+    11: [1.76, 2.25, 2.94, 3.77, 4.76, 5.95, 7.46, 9.33, 11.76, 14.89, 18.87, 24.13, 31.25, 41.10, 55.56],
+    12: [1.89, 2.46, 3.23, 4.18, 5.32, 6.71, 8.47, 10.64, 13.51, 17.24, 22.06, 28.57, 37.31, 49.50],
+    13: [2.05, 2.69, 3.57, 4.65, 5.95, 7.55, 9.62, 12.19, 15.50, 19.84, 25.64, 33.33, 43.86],
+    14: [2.23, 2.94, 3.96, 5.18, 6.67, 8.47, 10.87, 13.89, 17.86, 23.08, 30.03, 39.47],
+    15: [2.46, 3.23, 4.41, 5.76, 7.46, 9.62, 12.50, 16.13, 20.83, 27.17, 35.71],
+    16: [2.74, 3.57, 4.92, 6.45, 8.47, 11.06, 14.53, 19.05, 25.00, 33.33],
+    17: [3.08, 4.00, 5.54, 7.30, 9.62, 12.82, 17.24, 23.26, 31.58],
+    18: [3.52, 4.55, 6.25, 8.33, 11.11, 15.15, 20.83, 28.99],
+    19: [4.10, 5.26, 7.14, 9.62, 13.16, 18.18, 25.64],
+    20: [4.93, 6.25, 8.47, 11.76, 16.67, 23.81],
+    21: [6.16, 7.69, 10.64, 15.38, 23.08],
+    22: [8.21, 10.00, 14.29, 22.22],
+    23: [12.31, 15.38, 25.00],
+    24: [24.63]
+}
+
+# Tower: multiplier after climbing the n-th level, per mode
+TOWER_MODES = ('Easy', 'Medium', 'Hard')
+TOWER_MULTIPLIERS = {
+    'Easy': [1.31, 1.74, 2.32, 3.10, 4.13, 5.51, 7.34, 9.79, 13.05],
+    'Medium': [1.47, 2.21, 3.31, 4.96, 7.44, 11.16, 16.74, 25.11, 37.67],
+    'Hard': [1.72, 3.68, 7.84, 14.68, 30.36, 62.72, 125.44, 250.88, 501.76]
+}
+
+# Predict: multiplier of a correct prediction, per mode and outcome
+PREDICT_MODES = ('dice', 'dart', 'bowling', 'football', 'basketball')
+PREDICT_MULTIPLIERS = {
+    'dice': {str(value): 5.76 for value in range(1, 7)},
+    'dart': {str(value): 5.76 for value in range(1, 7)},
+    'bowling': {str(value): 5.76 for value in range(1, 7)},
+    'football': {'goal': 1.6, 'miss': 2.4, 'bar': 2.4},
+    'basketball': {'score': 2.3, 'miss': 1.6, 'stuck': 3.7}
+}
+# Predict: outcome of each dice value (1-6); ⚽ and 🏀 only roll 1-5
+PREDICT_FACES = {
+    'dice': ('1', '2', '3', '4', '5', '6'),
+    'dart': ('1', '2', '3', '4', '5', '6'),
+    'bowling': ('1', '2', '3', '4', '5', '6'),
+    'football': ('miss', 'miss', 'bar', 'goal', 'goal', 'miss'),
+    'basketball': ('miss', 'miss', 'stuck', 'score', 'score', 'miss')
+}
+
+ROULETTE_RED = (1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36)
+ROULETTE_BLACK = tuple(number for number in range(1, ROULETTE_POCKETS) if number not in ROULETTE_RED)
+# Roulette: (multiplier, pockets covered) per bet type and value
+ROULETTE_BETS = {
+    'number': {str(number): (36.0, 1) for number in range(ROULETTE_POCKETS)},
+    'range': {'1-12': (3.0, 12), '13-24': (3.0, 12), '25-36': (3.0, 12), '1-18': (2.0, 18), '19-36': (2.0, 18)},
+    'even': {None: (2.0, 18)},
+    'odd': {None: (2.0, 18)},
+    'color': {'red': (2.0, 18), 'black': (2.0, 18)}
+}
+
+# Slots: the 🎰 dice value v encodes reel k as ((v - 1) // 4 ** k) % 4
+SLOTS_SYMBOLS = ("🍫", "🍇", "🍋", "7️⃣")
+SLOTS_VALUES = 64
+# (pattern, multiplier, note), first match wins; None matches any symbol
+SLOTS_PAYTABLE = (
+    (("7️⃣", "7️⃣", "7️⃣"), 20.0, "Jackpot!"),
+    (("🍫", "🍫", "🍫"), 7.0, ""),
+    (("🍋", "🍋", "🍋"), 7.0, ""),
+    (("🍇", "🍇", "🍇"), 7.0, ""),
+    (("7️⃣", "7️⃣", None), 2.0, ""),
+    ((None, "7️⃣", "7️⃣"), 1.0, ""),
+    (("🍫", "🍫", None), 0.5, ""),
+    (("🍋", "🍋", None), 0.25, ""),
+    (("🍇", "🍇", None), 0.25, ""),
+)
+
+class SlotResult(namedtuple('SlotResult', ('symbols', 'multiplier', 'text'))):
+    __slots__ = ()
+
+def compile_paytable(paytable=SLOTS_PAYTABLE, symbols=SLOTS_SYMBOLS):
+    """
+    Resolve every 🎰 dice value against a paytable once.
+
+    Args:
+        paytable (tuple): (pattern, multiplier, note) rules, first match wins.
+        symbols (tuple): The four reel symbols in dice value order.
+
+    Returns:
+        tuple: SlotResult per dice value, indexed by the value itself (index 0 unused).
+    """
+    if len(symbols) != 4 or len(set(symbols)) != 4:
+        raise ValueError(f"Slots need four distinct symbols, got {symbols}")
+    for pattern, multiplier, _ in paytable:
+        if len(pattern) != 3 or any(s is not None and s not in symbols for s in pattern) or multiplier <= 0:
+            raise ValueError(f"Invalid slots rule {pattern} -> {multiplier}")
+    table = [None]
+    for value in range(1, SLOTS_VALUES + 1):
+        reels = tuple(symbols[(value - 1) // 4 ** k % 4] for k in range(3))
+        multiplier = next((m for pattern, m, _ in paytable
+                           if all(p is None or p == s for p, s in zip(pattern, reels))), 0.0)
+        table.append(SlotResult(reels, multiplier, " ".join(reels)))
+    if len({result.symbols for result in table[1:]}) != SLOTS_VALUES:
+        raise ValueError("Slots dice values must decode to distinct reels")
+    return tuple(table)
+
+def paytable_text(paytable=SLOTS_PAYTABLE):
+    # One line per rule, ❔ for any symbol
+    return "\n".join(f"{''.join(s or '❔' for s in pattern)} — {multiplier:g}x{' ' + note if note else ''}"
+                     for pattern, multiplier, note in paytable)
+
+def _increasing(name, values):
+    if not values or values[0] <= 1 or any(b <= a for a, b in zip(values, values[1:])):
+        raise ValueError(f"{name} must be above 1 and strictly increasing: {values}")
+
+def _compile_mines():
+    if sorted(MINES_MULTIPLIERS) != list(range(1, GRID_CELLS)):
+        raise ValueError(f"Mines multipliers must cover 1 to {GRID_CELLS - 1} mines")
+    table = [0.0] * (GRID_CELLS * MINES_STRIDE)
+    for m, values in MINES_MULTIPLIERS.items():
+        reachable = GRID_CELLS - min(m + MINES_EXTRA, GRID_CELLS)
+        if not reachable <= len(values) < GRID_CELLS:
+            raise ValueError(f"Mines multipliers for {m} mines need {reachable} to {GRID_CELLS - 1} entries, got {len(values)}")
+        _increasing(f"Mines multipliers for {m} mines", values)
+        # Past the last entry the multiplier stays at the last value, as the old min() clamp did
+        for n in range(1, MINES_STRIDE):
+            table[m * MINES_STRIDE + n] = values[min(n, len(values)) - 1]
+    return tuple(table)
+
+def _compile_tower():
+    if set(TOWER_MULTIPLIERS) != set(TOWER_MODES):
+        raise ValueError(f"Tower multipliers must cover the modes {TOWER_MODES}")
+    table = [0.0] * (len(TOWER_MODES) * TOWER_STRIDE)
+    for index, mode in enumerate(TOWER_MODES):
+        values = TOWER_MULTIPLIERS[mode]
+        if len(values) != TOWER_LEVELS:
+            raise ValueError(f"Tower multipliers for {mode} need {TOWER_LEVELS} entries, got {len(values)}")
+        _increasing(f"Tower multipliers for {mode}", values)
+        table[index * TOWER_STRIDE + 1:(index + 1) * TOWER_STRIDE] = values
+    return tuple(table)
+
+def _compile_outcomes(name, spec, check):
+    # Flattens {key: {value: entry}} into a tuple plus {key: {value: index}}; index 0 is the no-payout slot
+    entries = [check(name, None, None)]
+    index = {}
+    for key, values in spec.items():
+        index[key] = {}
+        for value, entry in values.items():
+            index[key][value] = len(entries)
+            entries.append(check(name, key, value, entry))
+    return tuple(entries), index
+
+def _check_predict(name, mode, outcome, multiplier=0.0):
+    if mode is not None and multiplier <= 1:
+        raise ValueError(f"{name} multiplier for {mode} '{outcome}' must be above 1, got {multiplier}")
+    return multiplier
+
+def _compile_predict_outcomes():
+    # mode -> tuple indexed by the dice value, slot 0 unused
+    outcomes = {}
+    for mode in PREDICT_MODES:
+        faces = PREDICT_FACES[mode]
+        if len(faces) != 6 or any(face not in PREDICT_MULTIPLIERS[mode] for face in faces):
+            raise ValueError(f"Predict faces for {mode} must be 6 outcomes of {sorted(PREDICT_MULTIPLIERS[mode])}: {faces}")
+        outcomes[mode] = (None,) + faces
+    return outcomes
+
+def _check_roulette(name, bet_type, bet_value, entry=(0.0, 0)):
+    multiplier, covered = entry
+    # A bet paying more than the wheel's odds would give the house a negative edge
+    if bet_type is not None and not 0 < multiplier * covered <= ROULETTE_POCKETS:
+        raise ValueError(f"{name} bet {bet_type} {bet_value} pays {multiplier}x on {covered} of {ROULETTE_POCKETS} pockets")
+    return multiplier
+
+def _roulette_pockets(bet_type, bet_value):
+    # Pockets a bet wins on; zero is only covered by its own number bet
+    if bet_type == 'number':
+        return (int(bet_value),)
+    if bet_type == 'range':
+        low, high = map(int, bet_value.split('-'))
+        return range(low, high + 1)
+    if bet_type in ('even', 'odd'):
+        return range(2 if bet_type == 'even' else 1, ROULETTE_POCKETS, 2)
+    if bet_type == 'color' and bet_value in ('red', 'black'):
+        return ROULETTE_RED if bet_value == 'red' else ROULETTE_BLACK
+    raise ValueError(f"Roulette bet {bet_type} {bet_value} has no pockets")
+
+def _compile_roulette_masks():
+    # Bit n of a bet's mask is set if the bet wins when n is spun; slot 0 wins nowhere
+    masks = [0] * len(ROULETTE_TABLE)
+    for bet_type, values in ROULETTE_INDEX.items():
+        for bet_value, slot in values.items():
+            mask = 0
+            for pocket in _roulette_pockets(bet_type, bet_value):
+                mask |= 1 << pocket
+            covered = ROULETTE_BETS[bet_type][bet_value][1]
+            if mask.bit_count() != covered or mask >> ROULETTE_POCKETS:
+                raise ValueError(f"Roulette bet {bet_type} {bet_value} covers {mask.bit_count()} pockets, not {covered}")
+            masks[slot] = mask
+    return tuple(masks)
+
+MINES_TABLE = _compile_mines()
+TOWER_TABLE = _compile_tower()
+TOWER_MODE_INDEX = {mode: index for index, mode in enumerate(TOWER_MODES)}
+PREDICT_TABLE, PREDICT_INDEX = _compile_outcomes("Predict", PREDICT_MULTIPLIERS, _check_predict)
+PREDICT_OUTCOMES = _compile_predict_outcomes()
+ROULETTE_TABLE, ROULETTE_INDEX = _compile_outcomes("Roulette", ROULETTE_BETS, _check_roulette)
+ROULETTE_MASKS = _compile_roulette_masks()
+ROULETTE_RED_MASK = sum(1 << number for number in ROULETTE_RED)
+SLOTS_TABLE = compile_paytable()
+
+def mines_multiplier(m, safe_revealed):
+    """
+    Multiplier after `safe_revealed` safe tiles with `m` mines chosen; 0.0 before the first.
+    """
+    return MINES_TABLE[m * MINES_STRIDE + safe_revealed]
+
+def tower_multiplier(mode, level):
+    """
+    Multiplier after climbing `level` levels in `mode`; 0.0 before the first.
+    """
+    return TOWER_TABLE[TOWER_MODE_INDEX[mode] * TOWER_STRIDE + level]
+
+def predict_multiplier(mode, prediction):
+    """
+    Multiplier of a correct `prediction` in `mode`, 0 for an unknown one.
+    """
+    return PREDICT_TABLE[PREDICT_INDEX[mode].get(prediction, 0)]
+
+def predict_outcome(mode, dice_value):
+    """
+    Outcome a dice value stands for in `mode`, e.g. 'goal' for a 4 in football.
+    """
+    return PREDICT_OUTCOMES[mode][dice_value]
+
+def roulette_slot(bet_type, bet_value):
+    """
+    Index of a roulette bet in ROULETTE_TABLE and ROULETTE_MASKS, 0 for an unknown one.
+    """
+    index = ROULETTE_INDEX.get(bet_type)
+    return index.get(bet_value, 0) if index else 0
+
+def roulette_multiplier(bet_type, bet_value):
+    """
+    Multiplier of a winning roulette bet, 0 for an unknown one.
+    """
+    return ROULETTE_TABLE[roulette_slot(bet_type, bet_value)]
@@ -1,8 +1,23 @@
 # predict/predict.py
 import asyncio
+import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from database import get_user_balance, update_user_balance
-from utils import logger
+from database import get_user_balance
+from holds import capture, reserve, release
+from utils import send_with_retry
+from ledger import new_round_id
+from metrics import timed_handler
+from money import Money, ZERO
+from payouts import predict_multiplier as get_multiplier, predict_outcome
+from settlement import settle_batch
+
+logger = logging.getLogger(__name__)
+
+MIN_BET = Money.parse('0.25')
+MAX_BET = Money.parse(50)
+DEFAULT_BET = Money.parse(1)
+# Predictions per series, cycled through by the series button; 1 plays a single round
+SERIES_COUNTS = (1, 3, 5, 10)
 
 MODE_ORDER = ["dice", "dart", "bowling", "football", "basketball"]
 
@@ -14,28 +29,7 @@ MODES = {
     "basketball": {"emoji": "🏀"}
 }
 
-MULTIPLIERS = {
-    "dice": 5.76,
-    "dart": 5.76,
-    "bowling": 5.76,
-    "football": {
-        "goal": 1.6,
-        "miss": 2.4,
-        "bar": 2.4
-    },
-    "basketball": {
-        "score": 2.3,
-        "miss": 1.6,
-        "stuck": 3.7
-    }
-}
-
-def get_multiplier(mode, prediction):
-    multipliers = MULTIPLIERS[mode]
-    if isinstance(multipliers, dict):
-        return multipliers.get(prediction, 0)
-    return multipliers
-
+@timed_handler
 async def predict_command(update, context):
     user_id = update.effective_user.id
     if "predict_game" not in context.user_data:
@@ -44,7 +38,8 @@ async def predict_command(update, context):
             "prediction": None,
             "last_prediction": None,
             "last_outcome": None,
-            "bet": 1.0,
+            "bet": DEFAULT_BET,
+            "series": 1,
             "message_id": None
         }
     await send_prompt(update, context)
@@ -56,11 +51,14 @@ async def send_prompt(update, context, result_text=None):
     mode = game["mode"]
     prediction = game["prediction"]
     bet = game["bet"]
+    series = game.get("series", 1)
     balance = get_user_balance(user_id)
 
     if prediction:
         multiplier = get_multiplier(mode, prediction)
         prediction_text = f"Your prediction: {prediction}\nMultiplier: {multiplier:.2f}x"
+        if series > 1:
+            prediction_text += f"\nSeries: {series} rounds, ${bet * series:.2f} in total"
     else:
         prediction_text = "Make your prediction:"
 
@@ -88,23 +86,24 @@ async def send_prompt(update, context, result_text=None):
         ]
     prediction_buttons = [prediction_buttons]
 
-    half_bet = max(0.25, bet / 2)
-    double_bet = min(50.0, bet * 2)
+    half_bet = max(MIN_BET, bet * 0.5)
+    double_bet = min(MAX_BET, bet * 2)
     bet_buttons = [
         InlineKeyboardButton("Half Bet", callback_data="predict_bet_half"),
-        InlineKeyboardButton(f"Bet ${bet:.2f}", callback_data="noop"),
+        InlineKeyboardButton(f"Bet ${bet:.2f}", callback_data="predict_noop"),
         InlineKeyboardButton("Double Bet", callback_data="predict_bet_double")
     ]
 
     mode_index = MODE_ORDER.index(mode)
     mode_buttons = [
         InlineKeyboardButton("⬅️", callback_data="predict_mode_left"),
-        InlineKeyboardButton(MODES[mode]["emoji"], callback_data="noop"),
+        InlineKeyboardButton(MODES[mode]["emoji"], callback_data="predict_noop"),
         InlineKeyboardButton("➡️", callback_data="predict_mode_right")
     ]
 
     start_cancel_buttons = [
         InlineKeyboardButton("❌ Cancel", callback_data="predict_cancel"),
+        InlineKeyboardButton(f"🔁 x{series}", callback_data="predict_series"),
         InlineKeyboardButton("▶️ Start", callback_data="predict_start")
     ]
 
@@ -127,6 +126,71 @@ async def send_prompt(update, context, result_text=None):
         message = await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
         game["message_id"] = message.message_id
 
+async def play_series(update, context):
+    """
+    Play the locked-in prediction `series` times at once: the dice are sent in parallel
+    through send_with_retry, then the rounds settle in one transaction and the result
+    is one message. Only the dice that arrived are settled.
+    """
+    query = update.callback_query
+    chat_id = query.message.chat_id
+    user_id = query.from_user.id
+    game = context.user_data["predict_game"]
+    mode, prediction, bet, count = game["mode"], game["prediction"], game["bet"], game["series"]
+
+    # Held while the dice roll, so other games can't spend the same balance
+    round_id = new_round_id()
+    if not reserve({user_id: bet * count}, 'predict', round_id):
+        await query.answer("Insufficient balance!", show_alert=True)
+        return
+    outcomes = []
+    payout = bet * get_multiplier(mode, prediction)
+    settled = False
+    try:
+        dice_messages = await asyncio.gather(
+            *(send_with_retry(context.bot, chat_id, emoji=MODES[mode]["emoji"]) for _ in range(count)),
+            return_exceptions=True
+        )
+        for dice_message in dice_messages:
+            if isinstance(dice_message, Exception):
+                logger.error(f"Failed to roll a predict series dice for user {user_id}: {dice_message}")
+            elif dice_message is not None:
+                outcomes.append(predict_outcome(mode, int(dice_message.dice.value)))
+        if outcomes:
+            settled = settle_batch('predict', round_id, user_id,
+                                   [(bet, payout if outcome == prediction else ZERO) for outcome in outcomes])
+    finally:
+        # The stakes stay held until the bets are settled
+        release(round_id)
+    if not outcomes:
+        await query.answer("The dice couldn't be rolled, nothing was charged.", show_alert=True)
+        return
+    if not settled:
+        await query.answer("The series couldn't be settled, nothing was charged.", show_alert=True)
+        return
+
+    rolled = len(outcomes)
+    wins = sum(outcome == prediction for outcome in outcomes)
+    net = payout * wins - bet * rolled
+    missing = f" ({count - rolled} of {count} couldn't be rolled)" if rolled < count else ""
+    result_text = (
+        f"{'✅' if net > 0 else '❌'} Series of {rolled}{missing}: predicted '{prediction}', won {wins} of {rolled} - "
+        f"{'+' if net > 0 else '-' if net < 0 else ''}${abs(net):.2f}\n"
+        f"Got: {', '.join(outcomes)}"
+    )
+    game["last_prediction"] = prediction
+    game["last_outcome"] = outcomes[-1]
+    game["prediction"] = None
+    await asyncio.sleep(3)
+    try:
+        await context.bot.delete_message(chat_id=chat_id, message_id=game["message_id"])
+    except Exception as e:
+        logger.error(f"Failed to delete message: {e}")
+    # Sent as a new message below the dice rather than an edit of the deleted one
+    game["message_id"] = None
+    await send_prompt(update, context, result_text=result_text)
+
+@timed_handler
 async def predict_button_handler(update, context):
     query = update.callback_query
     data = query.data
@@ -140,10 +204,10 @@ async def predict_button_handler(update, context):
     mode = game["mode"]
 
     if action == "bet_half":
-        game["bet"] = max(0.25, game["bet"] / 2)
+        game["bet"] = max(MIN_BET, game["bet"] * 0.5)
         await send_prompt(update, context)
     elif action == "bet_double":
-        game["bet"] = min(50.0, game["bet"] * 2)
+        game["bet"] = min(MAX_BET, game["bet"] * 2)
         await send_prompt(update, context)
     elif action == "mode_left":
         mode_index = MODE_ORDER.index(mode)
@@ -155,32 +219,41 @@ async def predict_button_handler(update, context):
         game["mode"] = MODE_ORDER[(mode_index + 1) % len(MODE_ORDER)]
         game["prediction"] = None
         await send_prompt(update, context)
+    elif action == "series":
+        series = game.get("series", 1)
+        game["series"] = SERIES_COUNTS[(SERIES_COUNTS.index(series) + 1) % len(SERIES_COUNTS)] if series in SERIES_COUNTS else 1
+        await send_prompt(update, context)
     elif action == "start":
         if game["prediction"] is None:
             await query.answer("Please make a prediction first!", show_alert=True)
             return
+        if game.get("series", 1) > 1:
+            await play_series(update, context)
+            return
         bet = game["bet"]
-        balance = get_user_balance(user_id)
-        if balance < bet:
+        # Held while the dice rolls and settled as a delta, so nothing settled meanwhile is overwritten
+        round_id = new_round_id()
+        if not reserve({user_id: bet}, 'predict', round_id):
             await query.answer("Insufficient balance!", show_alert=True)
             return
-        balance -= bet
-        update_user_balance(user_id, balance)
-        emoji = MODES[mode]["emoji"]
-        dice_message = await context.bot.send_dice(chat_id=query.message.chat_id, emoji=emoji)
-        dice_value = int(dice_message.dice.value)
-        if mode in ["dice", "dart", "bowling"]:
-            outcome = str(dice_value)
-        elif mode == "football":
-            outcome = "goal" if dice_value in [4, 5] else "bar" if dice_value == 3 else "miss"
-        elif mode == "basketball":
-            outcome = "score" if dice_value in [4, 5] else "stuck" if dice_value == 3 else "miss"
         prediction = game["prediction"]
-        if prediction == outcome:
-            multiplier = get_multiplier(mode, prediction)
-            winnings = bet * multiplier
-            balance += winnings
-            update_user_balance(user_id, balance)
+        settled = False
+        try:
+            dice_message = await send_with_retry(context.bot, query.message.chat_id, emoji=MODES[mode]["emoji"])
+            if dice_message is not None:
+                outcome = predict_outcome(mode, int(dice_message.dice.value))
+                winnings = bet * get_multiplier(mode, prediction) if prediction == outcome else ZERO
+                settled = capture('predict', round_id, {user_id: winnings} if winnings else {})
+        finally:
+            # Gives the stake back if the round wasn't settled; nothing is left to release after a capture
+            release(round_id)
+        if dice_message is None:
+            await query.answer("The dice couldn't be rolled, nothing was charged.", show_alert=True)
+            return
+        if not settled:
+            await query.answer("The round couldn't be settled, nothing was charged.", show_alert=True)
+            return
+        if winnings:
             result_text = f"✅ Won: Predicted '{prediction}', got '{outcome}' - +${winnings:.2f}"
         else:
             result_text = f"❌ Lost: Predicted '{prediction}', got '{outcome}'"
@@ -193,6 +266,8 @@ async def predict_button_handler(update, context):
         except Exception as e:
             logger.error(f"Failed to delete message: {e}")
         await send_prompt(update, context, result_text=result_text)
+    elif action == "noop":
+        await query.answer()
     elif action == "cancel":
         del context.user_data["predict_game"]
         await context.bot.delete_message(chat_id=query.message.chat_id, message_id=game["message_id"])
@@ -1,8 +1,16 @@
 import asyncio
+import logging
 import random
+from functools import lru_cache
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from database import get_user_balance, update_user_balance
-from utils import logger
+from database import get_user_balance
+from holds import reserve, capture
+from ledger import new_round_id
+from metrics import timed_handler
+from money import Money, ZERO
+from payouts import ROULETTE_POCKETS, ROULETTE_INDEX, ROULETTE_TABLE, ROULETTE_MASKS, ROULETTE_RED_MASK, roulette_slot
+
+logger = logging.getLogger(__name__)
 
 stickers = {
     0: "CAACAgEAAxkBAAEN-Yxnx5tUg_RkiIxq2efYzEREhQamCwACfQQAAsMbOUbFEPpAy1p-TjYE",
@@ -44,95 +52,108 @@ stickers = {
     36: "CAACAgEAAxkBAAEN-Yhnx5tC5e8kP_hGuG0tIINShUDmHwAChQgAAlRvOEYbM-l4m5M2JjYE",
 }
 
-red_numbers = [1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36]
-black_numbers = [2, 4, 6, 8, 10, 11, 13, 15, 17, 20, 22, 24, 26, 28, 29, 31, 33, 35]
+MIN_BET = Money.parse(1)
+HIGH_BET = Money.parse(100)
+MAX_TICKET_BETS = 8
 
-def get_multiplier(bet_type, bet_value):
-    if bet_type == "number":
-        return 36.0
-    elif bet_type == "range":
-        if bet_value in ["1-12", "13-24", "25-36"]:
-            return 3.0
-        elif bet_value in ["1-18", "19-36"]:
-            return 2.0
-    elif bet_type in ["even", "odd", "color"]:
-        return 2.0
-    return 0
+# slot -> (bet_type, bet_value), for rendering a ticket
+BETS = {slot: (bet_type, bet_value) for bet_type, values in ROULETTE_INDEX.items() for bet_value, slot in values.items()}
 
-def get_color_emoji(number):
+def get_color(number):
     if number == 0:
-        return "🟢"
-    elif number in red_numbers:
-        return "🔴"
-    elif number in black_numbers:
-        return "⚫"
-    return ""
-
-def get_winning_set(bet_type, bet_value):
+        return "green"
+    return "red" if ROULETTE_RED_MASK >> number & 1 else "black"
+
+def get_color_emoji(number):
+    return {"green": "🟢", "red": "🔴", "black": "⚫"}[get_color(number)]
+
+def bet_label(slot):
+    bet_type, bet_value = BETS[slot]
     if bet_type == "number":
-        return {int(bet_value)}
+        return f"Number {bet_value}"
     elif bet_type == "range":
-        if bet_value == "1-12":
-            return set(range(1, 13))
-        elif bet_value == "13-24":
-            return set(range(13, 25))
-        elif bet_value == "25-36":
-            return set(range(25, 37))
-        elif bet_value == "1-18":
-            return set(range(1, 19))
-        elif bet_value == "19-36":
-            return set(range(19, 37))
-    elif bet_type == "even":
-        return set(range(2, 37, 2))
-    elif bet_type == "odd":
-        return set(range(1, 37, 2))
+        return bet_value
     elif bet_type == "color":
-        if bet_value == "red":
-            return set(red_numbers)
-        elif bet_value == "black":
-            return set(black_numbers)
-    return set()
+        return bet_value.capitalize()
+    return bet_type.capitalize()
+
+def ticket_mask(ticket):
+    """
+    Pockets on which at least one bet of a ticket wins.
+
+    Args:
+        ticket (dict): slot -> Money staked, see payouts.roulette_slot.
+
+    Returns:
+        int: Bit n is set if spinning n pays something.
+    """
+    mask = 0
+    for slot in ticket:
+        mask |= ROULETTE_MASKS[slot]
+    return mask
+
+@lru_cache(maxsize=1024)
+def spin_weights(mask, high_bet):
+    """
+    cum_weights for random.choices over the pockets, for a ticket winning on `mask`:
+    a winning pocket comes up 37% of the time, and never for a ticket above HIGH_BET.
+    """
+    winning = mask.bit_count()
+    losing = ROULETTE_POCKETS - winning
+    if high_bet and losing:
+        weights = [0 if mask >> n & 1 else 1 for n in range(ROULETTE_POCKETS)]
+    elif winning and losing and not high_bet:
+        weights = [0.37 / winning if mask >> n & 1 else 0.63 / losing for n in range(ROULETTE_POCKETS)]
+    else:
+        weights = [1] * ROULETTE_POCKETS
+    cum_weights = []
+    total = 0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    return tuple(cum_weights)
 
-async def send_roulette_prompt(update, context, result_text=None, last_multiplier=None):
+def spin(ticket):
+    """
+    Spin the wheel for a ticket.
+
+    Args:
+        ticket (dict): slot -> Money staked.
+
+    Returns:
+        tuple: (spun number, payout with stakes included as Money, slots of the winning bets).
+    """
+    high_bet = sum(ticket.values(), ZERO) > HIGH_BET
+    spun_number = random.choices(range(ROULETTE_POCKETS), cum_weights=spin_weights(ticket_mask(ticket), high_bet))[0]
+    bit = 1 << spun_number
+    winners = [slot for slot in ticket if ROULETTE_MASKS[slot] & bit]
+    payout = sum((ticket[slot] * ROULETTE_TABLE[slot] for slot in winners), ZERO)
+    return spun_number, payout, winners
+
+async def send_roulette_prompt(update, context, result_text=None):
     game = context.user_data["roulette_game"]
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
     
     balance = get_user_balance(user_id)
     bet_amount = game["bet_amount"]
-    bet_type = game["bet_type"]
-    bet_value = game["bet_value"]
+    ticket = game["ticket"]
     menu_state = game["menu_state"]
 
-    if bet_type is None:
-        selected_bet = "None"
-        multiplier_text = ""
-    else:
-        if bet_type == "number":
-            selected_bet = f"Number {bet_value}"
-        elif bet_type == "range":
-            selected_bet = bet_value
-        elif bet_type == "even":
-            selected_bet = "Even"
-        elif bet_type == "odd":
-            selected_bet = "Odd"
-        elif bet_type == "color":
-            selected_bet = bet_value.capitalize()
-        multiplier = get_multiplier(bet_type, bet_value)
-        multiplier_text = f"\nMultiplier: {multiplier:.2f}x"
-
     text = (
         f"🎰 Roulette\n\n"
         f"Bet: ${bet_amount:.2f}\n"
-        f"Balance: ${balance:.2f}\n"
+        f"Balance: ${balance:.2f}\n\n"
     )
-    if last_multiplier is not None:
-        text += f"Multiplier: {last_multiplier:.2f}x\n\n"
     if result_text:
         text += f"{result_text}\n\n"
     if not result_text:
-        text += f"Selected bet: {selected_bet}{multiplier_text}\n\n"
-        text += "Place your bet:"
+        if ticket:
+            lines = "\n".join(f"{bet_label(slot)}: ${amount:.2f} at {ROULETTE_TABLE[slot]:.2f}x" for slot, amount in ticket.items())
+            text += f"Ticket:\n{lines}\nTotal: ${sum(ticket.values(), ZERO):.2f}\n\n"
+        else:
+            text += "Selected bet: None\n\n"
+        text += "Place your bets, tap a bet again to remove it:"
 
     if menu_state == "main":
         keyboard = [
@@ -159,7 +180,10 @@ async def send_roulette_prompt(update, context, result_text=None, last_multiplie
                 InlineKeyboardButton("Bet +$1", callback_data="roul_bet_increase_1"),
                 InlineKeyboardButton("Bet -$1", callback_data="roul_bet_decrease_1"),
             ],
-            [InlineKeyboardButton("Cancel", callback_data="roul_cancel")]
+            [
+                InlineKeyboardButton("Clear", callback_data="roul_clear"),
+                InlineKeyboardButton("Cancel", callback_data="roul_cancel"),
+            ]
         ]
     elif menu_state == "number_selection":
         keyboard = []
@@ -189,6 +213,7 @@ async def send_roulette_prompt(update, context, result_text=None, last_multiplie
         message = await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
         game["message_id"] = message.message_id
 
+@timed_handler
 async def roulette_command(update, context):
     user_id = update.effective_user.id
     if "roulette_game" in context.user_data:
@@ -199,7 +224,7 @@ async def roulette_command(update, context):
         await update.message.reply_text("Please specify a bet amount, e.g., /roul 5")
         return
     try:
-        bet_amount = float(args[0])
+        bet_amount = Money.parse(args[0])
         if bet_amount <= 0:
             raise ValueError
     except ValueError:
@@ -208,57 +233,30 @@ async def roulette_command(update, context):
 
     context.user_data["roulette_game"] = {
         "bet_amount": bet_amount,
-        "bet_type": None,
-        "bet_value": None,
-        "multiplier": None,
+        # slot -> Money staked, see payouts.roulette_slot
+        "ticket": {},
         "menu_state": "main",
         "message_id": None
     }
     await send_roulette_prompt(update, context)
 
 async def start_roulette_game(update, context):
-    query = update.callback_query
     game = context.user_data["roulette_game"]
     user_id = update.effective_user.id
-    bet_amount = game["bet_amount"]
-    bet_type = game["bet_type"]
-    bet_value = game["bet_value"]
-    multiplier = game["multiplier"]
+    ticket = game["ticket"]
+    stake = sum(ticket.values(), ZERO)
 
-    balance = get_user_balance(user_id)
-    if balance < bet_amount:
+    # The whole ticket is held at once, then settled with one balance update and one ledger row
+    round_id = new_round_id()
+    if not reserve({user_id: stake}, 'roulette', round_id):
         await context.bot.send_message(chat_id=update.effective_chat.id, text="Not enough balance to place this bet!")
         del context.user_data["roulette_game"]
         return
 
-    balance -= bet_amount
-    update_user_balance(user_id, balance)
-
-    winning_set = get_winning_set(bet_type, bet_value)
-    losing_set = set(range(0, 37)) - winning_set
-
-    if bet_amount > 100:
-        spun_number = random.choice(list(losing_set)) if losing_set else random.randint(0, 36)
-    else:
-        N_win = len(winning_set)
-        N_lose = len(losing_set)
-        if N_win == 0:
-            spun_number = random.choice(list(losing_set))
-        elif N_lose == 0:
-            spun_number = random.choice(list(winning_set))
-        else:
-            weights = [0.37 / N_win if num in winning_set else 0.63 / N_lose for num in range(37)]
-            spun_number = random.choices(range(37), weights=weights)[0]
-
-    if spun_number == 0:
-        color = "green"
-        even_odd = None
-    elif spun_number in red_numbers:
-        color = "red"
-        even_odd = "even" if spun_number % 2 == 0 else "odd"
-    elif spun_number in black_numbers:
-        color = "black"
-        even_odd = "even" if spun_number % 2 == 0 else "odd"
+    spun_number, payout, winners = spin(ticket)
+    color = get_color(spun_number)
+    # The spin is decided, so it settles before the sticker: a failed send can't leave the stake held
+    capture('roulette', round_id, {user_id: payout} if payout else {})
 
     if spun_number in stickers:
         await context.bot.send_sticker(chat_id=update.effective_chat.id, sticker=stickers[spun_number])
@@ -266,34 +264,17 @@ async def start_roulette_game(update, context):
     else:
         await context.bot.send_message(chat_id=update.effective_chat.id, text=f"Sticker for number {spun_number} is missing!")
 
-    win = False
-    if bet_type == "number":
-        win = (int(bet_value) == spun_number)
-    elif bet_type == "range":
-        if bet_value == "1-12":
-            win = 1 <= spun_number <= 12
-        elif bet_value == "13-24":
-            win = 13 <= spun_number <= 24
-        elif bet_value == "25-36":
-            win = 25 <= spun_number <= 36
-        elif bet_value == "1-18":
-            win = 1 <= spun_number <= 18
-        elif bet_value == "19-36":
-            win = 19 <= spun_number <= 36
-    elif bet_type == "even":
-        win = (spun_number != 0 and even_odd == "even")
-    elif bet_type == "odd":
-        win = (spun_number != 0 and even_odd == "odd")
-    elif bet_type == "color":
-        win = (color == bet_value)
-
-    if win:
-        winnings = bet_amount * multiplier
-        balance += winnings
-        update_user_balance(user_id, balance)
-        result_text = f"🎉 Spun: {spun_number} ({color}). You won ${winnings:.2f}"
+    if payout:
+        result_text = f"🎉 Spun: {spun_number} ({color}). You won ${payout:.2f}"
     else:
         result_text = f"😞 Spun: {spun_number} ({color}). You lost."
+    if len(ticket) > 1:
+        lines = "\n".join(
+            f"{'✅' if slot in winners else '❌'} {bet_label(slot)}: ${amount:.2f}"
+            + (f" → ${amount * ROULETTE_TABLE[slot]:.2f}" if slot in winners else "")
+            for slot, amount in ticket.items()
+        )
+        result_text += f"\n\n{lines}"
 
     try:
         await context.bot.delete_message(chat_id=update.effective_chat.id, message_id=game["message_id"])
@@ -303,12 +284,31 @@ async def start_roulette_game(update, context):
         logger.error(f"Failed to delete message: {e}")
         game["message_id"] = None
 
-    game["bet_type"] = None
-    game["bet_value"] = None
-    game["multiplier"] = None
+    game["ticket"] = {}
 
-    await send_roulette_prompt(update, context, result_text=result_text, last_multiplier=multiplier)
+    await send_roulette_prompt(update, context, result_text=result_text)
 
+async def toggle_bet(update, context, bet_type, bet_value, menu_state=None):
+    # Adds the bet to the ticket at the current bet amount, or removes it if it's already there;
+    # only then switches to menu_state, so a refused bet leaves the screen and the state as they are
+    query = update.callback_query
+    game = context.user_data["roulette_game"]
+    ticket = game["ticket"]
+    slot = roulette_slot(bet_type, bet_value)
+    if not slot:
+        return
+    if slot in ticket:
+        del ticket[slot]
+    elif len(ticket) >= MAX_TICKET_BETS:
+        await query.answer(f"A ticket holds at most {MAX_TICKET_BETS} bets!", show_alert=True)
+        return
+    else:
+        ticket[slot] = game["bet_amount"]
+    if menu_state:
+        game["menu_state"] = menu_state
+    await send_roulette_prompt(update, context)
+
+@timed_handler
 async def roulette_button_handler(update, context):
     query = update.callback_query
     data = query.data
@@ -322,60 +322,43 @@ async def roulette_button_handler(update, context):
 
     if menu_state == "main":
         if action == "bet_number_menu":
-            game["bet_type"] = None
-            game["bet_value"] = None
             game["menu_state"] = "number_selection"
             await send_roulette_prompt(update, context)
         elif action.startswith("bet_range_"):
-            range_str = action.split("_")[2]
-            game["bet_type"] = "range"
-            game["bet_value"] = range_str
-            game["multiplier"] = get_multiplier("range", range_str)
-            await send_roulette_prompt(update, context)
+            await toggle_bet(update, context, "range", action.split("_")[2])
         elif action == "bet_even":
-            game["bet_type"] = "even"
-            game["bet_value"] = None
-            game["multiplier"] = 2.0
-            await send_roulette_prompt(update, context)
+            await toggle_bet(update, context, "even", None)
         elif action == "bet_odd":
-            game["bet_type"] = "odd"
-            game["bet_value"] = None
-            game["multiplier"] = 2.0
-            await send_roulette_prompt(update, context)
+            await toggle_bet(update, context, "odd", None)
         elif action == "bet_color_red":
-            game["bet_type"] = "color"
-            game["bet_value"] = "red"
-            game["multiplier"] = 2.0
-            await send_roulette_prompt(update, context)
+            await toggle_bet(update, context, "color", "red")
         elif action == "bet_color_black":
-            game["bet_type"] = "color"
-            game["bet_value"] = "black"
-            game["multiplier"] = 2.0
-            await send_roulette_prompt(update, context)
+            await toggle_bet(update, context, "color", "black")
         elif action.startswith("bet_increase_"):
-            amount = float(action.split("_")[2])
-            game["bet_amount"] = max(game["bet_amount"] + amount, 1.0)
+            amount = Money.parse(action.split("_")[2])
+            game["bet_amount"] = max(game["bet_amount"] + amount, MIN_BET)
             await send_roulette_prompt(update, context)
         elif action.startswith("bet_decrease_"):
-            amount = float(action.split("_")[2])
-            game["bet_amount"] = max(game["bet_amount"] - amount, 1.0)
+            amount = Money.parse(action.split("_")[2])
+            game["bet_amount"] = max(game["bet_amount"] - amount, MIN_BET)
+            await send_roulette_prompt(update, context)
+        elif action == "clear":
+            game["ticket"] = {}
             await send_roulette_prompt(update, context)
         elif action == "start":
-            if game["bet_type"] is None:
+            if not game["ticket"]:
                 await query.answer("Please select a bet first!", show_alert=True)
                 return
             await start_roulette_game(update, context)
         elif action == "cancel":
             await context.bot.send_message(chat_id=update.effective_chat.id, text="Game canceled!")
             del context.user_data["roulette_game"]
+        elif action == "back":
+            # A Back tap from a number screen that is no longer current; show the main menu again
+            await send_roulette_prompt(update, context)
     elif menu_state == "number_selection":
         if action.startswith("select_number_"):
-            number = action.split("_")[2]
-            game["bet_type"] = "number"
-            game["bet_value"] = number
-            game["multiplier"] = 36.0
-            game["menu_state"] = "main"
-            await send_roulette_prompt(update, context)
+            await toggle_bet(update, context, "number", action.split("_")[2], menu_state="main")
         elif action == "back":
             game["menu_state"] = "main"
             await send_roulette_prompt(update, context)
\ No newline at end of file
@@ -0,0 +1,217 @@
+import argparse
+import json
+import math
+import sys
+import time
+from statistics import NormalDist
+import numpy as np
+import coin
+import mines
+import roulette
+import tower
+from payouts import (MINES_EXTRA, MINES_MULTIPLIERS, PREDICT_MODES, PREDICT_MULTIPLIERS, PREDICT_OUTCOMES,
+                     ROULETTE_INDEX, ROULETTE_MASKS, ROULETTE_POCKETS, ROULETTE_TABLE, SLOTS_TABLE, SLOTS_VALUES,
+                     mines_multiplier, predict_multiplier, tower_multiplier)
+
+# Simulation configurations
+DEFAULT_ROUNDS = 1_000_000
+BATCH_SIZE = 250_000
+DEFAULT_CONFIDENCE = 0.95
+# Values the Bot API's animated dice can land on, per predict mode
+PREDICT_SIDES = {'dice': 6, 'dart': 6, 'bowling': 6, 'football': 5, 'basketball': 5}
+CELLS = mines.GRID_SIZE * mines.GRID_SIZE
+
+# Every simulator takes (rng, n, **params) and yields (scenario, payouts): what n rounds
+# staking 1 return, stake included, so the mean of the payouts is the RTP
+
+def simulate_coin(rng, n):
+    yield 'flip', np.where(rng.random(n) < coin.PLAYER_WIN_PROB, coin.WIN_MULTIPLIER, 0.0)
+
+def simulate_slots(rng, n):
+    # A winning spin keeps the stake and adds stake * multiplier, see slots.auto_spin
+    returns = np.array([0.0] + [1 + result.multiplier if result.multiplier > 0 else 0.0 for result in SLOTS_TABLE[1:]])
+    yield 'spin', returns[rng.integers(1, SLOTS_VALUES + 1, n)]
+
+def simulate_roulette(rng, n, high_bet=False):
+    # Every bet on its own; all number bets have the same odds, so 17 stands for them
+    pockets = np.arange(ROULETTE_POCKETS)
+    for bet_type, values in ROULETTE_INDEX.items():
+        for bet_value, slot in values.items():
+            if bet_type == 'number' and bet_value != '17':
+                continue
+            mask = ROULETTE_MASKS[slot]
+            cum_weights = np.array(roulette.spin_weights(mask, high_bet), dtype=float)
+            spun = np.searchsorted(cum_weights, rng.random(n) * cum_weights[-1], side='right')
+            wins = (mask >> pockets & 1).astype(bool)[spun]
+            label = f"{bet_type} {bet_value}" if bet_value is not None else bet_type
+            yield label, np.where(wins, ROULETTE_TABLE[slot], 0.0)
+
+def simulate_mines(rng, n, counts=tuple(MINES_MULTIPLIERS), policy='random'):
+    """
+    Rounds of every mines count, cashed out after each possible number of safe tiles.
+
+    Mines are placed like mines.sample_mine_mask. With the 'random' policy the player
+    opens cells in a random order; 'edges' opens the cells outside mines.COMMON_AREAS first.
+    """
+    weights = np.array(mines.CELL_WEIGHTS, dtype=float)
+    preferred = np.array([weight == 1 for weight in mines.CELL_WEIGHTS]) if policy == 'edges' else np.zeros(CELLS, dtype=bool)
+    rows = np.arange(n)[:, None]
+    for m in counts:
+        total = min(m + MINES_EXTRA, CELLS)
+        keys = rng.random((n, CELLS)) ** (1 / weights)
+        mined = np.zeros((n, CELLS), dtype=bool)
+        mined[rows, np.argpartition(-keys, total - 1, axis=1)[:, :total]] = True
+        order = np.argsort(-(rng.random((n, CELLS)) + preferred), axis=1)
+        # Safe tiles opened before the first mine
+        survived = np.argmax(mined[rows, order], axis=1)
+        # The extra mines leave fewer safe tiles than the table has multipliers for
+        for safe in range(1, min(len(MINES_MULTIPLIERS[m]), CELLS - total) + 1):
+            yield f"{m} mines, cash out at {safe}", np.where(survived >= safe, mines_multiplier(m, safe), 0.0)
+
+def simulate_tower(rng, n, modes=tuple(tower.MODES)):
+    """
+    Rounds of every mode, cashed out after each level. The player picks a random column;
+    the level's monkey and EXTRA_MONKEYS are on distinct columns, placed like tower.deal_monkeys.
+    """
+    for mode in modes:
+        columns = tower.MODE_CONFIG[mode]
+        climbed = np.zeros(n, dtype=int)
+        alive = np.ones(n, dtype=bool)
+        for level, extra in enumerate(tower.EXTRA_MONKEYS[mode]):
+            monkeys = np.argsort(rng.random((n, columns)), axis=1)[:, :1 + extra]
+            pick = rng.integers(0, columns, n)
+            alive &= ~(monkeys == pick[:, None]).any(axis=1)
+            climbed += alive
+        for level in range(1, len(tower.EXTRA_MONKEYS[mode]) + 1):
+            yield f"{mode}, cash out at {level}", np.where(climbed >= level, tower_multiplier(mode, level), 0.0)
+
+def simulate_predict(rng, n, modes=PREDICT_MODES):
+    for mode in modes:
+        values = rng.integers(1, PREDICT_SIDES[mode] + 1, n)
+        outcomes = PREDICT_OUTCOMES[mode]
+        for prediction in PREDICT_MULTIPLIERS[mode]:
+            returns = np.array([0.0] + [predict_multiplier(mode, prediction) if outcome == prediction else 0.0
+                                        for outcome in outcomes[1:]])
+            yield f"{mode} '{prediction}'", returns[values]
+
+SIMULATORS = {
+    'coin': simulate_coin,
+    'slots': simulate_slots,
+    'roulette': simulate_roulette,
+    'mines': simulate_mines,
+    'tower': simulate_tower,
+    'predict': simulate_predict,
+}
+
+class Tally:
+    """
+    Running sums of one scenario's payouts, enough for the mean, the variance and a
+    normal confidence interval without keeping the rounds.
+    """
+    __slots__ = ('rounds', 'total', 'squares', 'hits', 'best')
+
+    def __init__(self):
+        self.rounds = 0
+        self.total = 0.0
+        self.squares = 0.0
+        self.hits = 0
+        self.best = 0.0
+
+    def add(self, payouts):
+        self.rounds += len(payouts)
+        self.total += float(payouts.sum())
+        self.squares += float(np.dot(payouts, payouts))
+        self.hits += int(np.count_nonzero(payouts))
+        self.best = max(self.best, float(payouts.max(initial=0.0)))
+
+    def report(self, confidence=DEFAULT_CONFIDENCE):
+        rtp = self.total / self.rounds
+        variance = max(self.squares / self.rounds - rtp * rtp, 0.0) * self.rounds / max(self.rounds - 1, 1)
+        margin = NormalDist().inv_cdf(0.5 + confidence / 2) * math.sqrt(variance / self.rounds)
+        return {
+            'rounds': self.rounds,
+            'rtp': rtp,
+            'variance': variance,
+            'ci_low': max(rtp - margin, 0.0),
+            'ci_high': rtp + margin,
+            'hit_rate': self.hits / self.rounds,
+            'max_payout': self.best,
+        }
+
+def run(games=tuple(SIMULATORS), rounds=DEFAULT_ROUNDS, batch_size=BATCH_SIZE, seed=None,
+        confidence=DEFAULT_CONFIDENCE, params=None):
+    """
+    Simulate every scenario of the given games.
+
+    Args:
+        games (tuple): Keys of SIMULATORS.
+        rounds (int): Rounds per scenario.
+        batch_size (int): Rounds simulated per vectorized batch; bounds the memory used.
+        seed (int): Seed of the generator, for reproducible reports.
+        confidence (float): Level of the confidence intervals.
+        params (dict): game -> keyword arguments of its simulator.
+
+    Returns:
+        dict: game -> scenario -> statistics, see Tally.report.
+    """
+    rng = np.random.default_rng(seed)
+    params = params or {}
+    report = {}
+    for game in games:
+        start = time.perf_counter()
+        tallies = {}
+        done = 0
+        while done < rounds:
+            n = min(batch_size, rounds - done)
+            for scenario, payouts in SIMULATORS[game](rng, n, **params.get(game, {})):
+                tallies.setdefault(scenario, Tally()).add(payouts)
+            done += n
+        report[game] = {scenario: tally.report(confidence) for scenario, tally in tallies.items()}
+        print(f"{game}: {len(tallies)} scenarios x {rounds} rounds in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return report
+
+def format_report(report, confidence=DEFAULT_CONFIDENCE):
+    lines = [f"{'scenario':<40} {'RTP':>8} {f'{confidence:.0%} CI':>19} {'std dev':>9} {'hit rate':>9}"]
+    for game, scenarios in report.items():
+        for scenario, stats in scenarios.items():
+            interval = f"[{stats['ci_low']:.4f}, {stats['ci_high']:.4f}]"
+            lines.append(
+                f"{game + ' ' + scenario:<40} {stats['rtp']:>8.4f} {interval:>19} "
+                f"{math.sqrt(stats['variance']):>9.3f} {stats['hit_rate']:>9.4f}"
+            )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo return-to-player of every game.")
+    parser.add_argument('--games', nargs='+', choices=list(SIMULATORS), default=list(SIMULATORS))
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help="Rounds per scenario.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument('--mines', type=int, nargs='+', default=list(MINES_MULTIPLIERS), help="Mines counts to simulate.")
+    parser.add_argument('--mines-policy', choices=['random', 'edges'], default='random')
+    parser.add_argument('--high-bet', action='store_true', help="Roulette tickets above roulette.HIGH_BET.")
+    parser.add_argument('--max-rtp', type=float, default=None,
+                        help="Exit with status 1 if any scenario's RTP is above this with the given confidence.")
+    parser.add_argument('--output', default=None, help="Also write the report as JSON to this file.")
+    args = parser.parse_args()
+
+    params = {
+        'mines': {'counts': tuple(args.mines), 'policy': args.mines_policy},
+        'roulette': {'high_bet': args.high_bet},
+    }
+    report = run(args.games, args.rounds, args.batch_size, args.seed, args.confidence, params)
+    print(format_report(report, args.confidence))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_rtp is not None:
+        over = [f"{game} {scenario}" for game, scenarios in report.items()
+                for scenario, stats in scenarios.items() if stats['ci_low'] > args.max_rtp]
+        if over:
+            print(f"{len(over)} scenarios return more than {args.max_rtp}: {', '.join(over)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
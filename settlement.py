@@ -0,0 +1,97 @@
+import logging
+import sqlite3
+import database
+from ledger import LEDGER_INSERT, STATS_UPSERT, aggregate_stats, ledger_row
+from metrics import timed_query, counter
+from money import Money, ZERO
+
+logger = logging.getLogger(__name__)
+
+SETTLEMENT_FAILURES = counter('bot_settlement_failures_total', "Match settlements that could not be committed.", ('game',))
+
+@timed_query
+def settle(game, round_id, stakes, payouts):
+    """
+    Close a match for every player in one transaction: take the stakes, credit the
+    payouts, append the ledger rows and update the per-user statistics.
+
+    The stakes are held (see holds.py), not yet debited, so each balance moves
+    once by payout - stake.
+
+    Args:
+        game (str): Game name, e.g. 'dice'.
+        round_id (str): Identifier of the match.
+        stakes (dict): user_id -> Money staked.
+        payouts (dict): user_id -> Money credited back, stake included. Missing players get nothing.
+
+    Returns:
+        bool: True if the settlement was committed.
+    """
+    deltas, rows = _settlement(game, round_id, stakes, payouts)
+    return _commit(game, round_id, deltas, rows, f"Payouts owed: {payouts}")
+
+def settle_in(c, game, round_id, stakes, payouts):
+    """
+    Apply what settle does on a cursor inside the caller's transaction, e.g. so
+    holds.capture drops a round's holds in the same commit. Doesn't commit.
+
+    Raises:
+        sqlite3.Error: If a statement fails; the caller rolls back.
+    """
+    _apply(c, *_settlement(game, round_id, stakes, payouts))
+
+def _settlement(game, round_id, stakes, payouts):
+    rows = [ledger_row(user_id, game, stake, payouts.get(user_id, 0), round_id) for user_id, stake in stakes.items()]
+    deltas = [(Money.parse(payouts.get(user_id, 0)) - Money.parse(stake), user_id) for user_id, stake in stakes.items()]
+    return deltas, rows
+
+@timed_query
+def settle_batch(game, round_id, user_id, bets):
+    """
+    Settle a run of one player's bets, e.g. an auto-spin, in one transaction: one
+    balance update by the net result and one ledger row per bet.
+
+    Args:
+        game (str): Game name, e.g. 'slots'.
+        round_id (str): Identifier shared by the bets' ledger rows.
+        user_id (int): The Telegram user ID.
+        bets (list): (stake, payout) per bet, payout including the stake.
+
+    Returns:
+        bool: True if the batch was committed.
+    """
+    rows = [ledger_row(user_id, game, stake, payout, round_id) for stake, payout in bets]
+    net = sum((payout - stake for _, _, _, stake, payout, _ in rows), ZERO)
+    return _commit(game, round_id, [(net, user_id)], rows, f"Net owed to {user_id}: {net}")
+
+def _commit(game, round_id, deltas, rows, owed):
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            _apply(c, deltas, rows)
+            conn.commit()
+            return True
+    except sqlite3.Error as e:
+        SETTLEMENT_FAILURES.inc(game)
+        logger.error(f"Database error settling {game} round {round_id}: {e}. {owed}")
+        return False
+
+def _apply(c, deltas, rows):
+    c.executemany("UPDATE users SET balance = balance + ? WHERE user_id = ?", deltas)
+    c.executemany(LEDGER_INSERT, rows)
+    c.executemany(STATS_UPSERT, aggregate_stats(rows))
+
+def duel_payouts(game, winner, prize):
+    """
+    Payouts of a finished duel: the winner gets prize plus the stake back, unless the bot won.
+
+    Args:
+        game (dict): The duel as stored in bot_data['games'].
+        winner (str): 'player1' or 'player2'.
+        prize (Money): Winnings on top of the returned stake.
+
+    Returns:
+        dict: user_id -> Money.
+    """
+    return {game[winner]: prize + game['bet']} if game[winner] != 'bot' else {}
@@ -0,0 +1,351 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import random
+from multiprocessing.reduction import ForkingPickler
+import time
+from collections import deque, Counter
+from telegram import Update
+import utils  # Sets up logging on import
+
+logger = logging.getLogger(__name__)
+
+# Sharding configurations
+DEFAULT_WORKERS = 4
+DEFAULT_REPLICAS = 64
+DEFAULT_CONCURRENCY = 64
+MAX_RESTARTS = 3
+PENDING_LIMIT = 1000
+# How long a dead shard's inbox must stay silent before it counts as drained
+DRAIN_TIMEOUT = 0.1
+
+# Games whose state lives in user_data follow the player, not the chat
+PRIVATE_PREFIXES = ('mine_', 'tower_', 'slots_', 'roul_', 'predict_', 'coin_')
+PRIVATE_COMMANDS = ('/mine', '/tower', '/slots', '/roul', '/predict', '/coin')
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes, so adding or removing a shard only moves
+    the keys that shard owned.
+    """
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self.hashes = []
+        self.owners = {}
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], 'big')
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            h = self._hash(f"{node}:{replica}")
+            if h not in self.owners:
+                bisect.insort(self.hashes, h)
+            self.owners[h] = node
+
+    def remove(self, node):
+        for replica in range(self.replicas):
+            h = self._hash(f"{node}:{replica}")
+            if self.owners.get(h) == node:
+                del self.owners[h]
+                self.hashes.pop(bisect.bisect_left(self.hashes, h))
+
+    def nodes(self):
+        return set(self.owners.values())
+
+    def get(self, key):
+        if not self.hashes:
+            raise LookupError("Hash ring is empty.")
+        index = bisect.bisect(self.hashes, self._hash(key)) % len(self.hashes)
+        return self.owners[self.hashes[index]]
+
+def shard_key(data):
+    """
+    Pick the routing key of a raw update.
+
+    Args:
+        data (dict): Raw update in Bot API format.
+
+    Returns:
+        str: 'u<user_id>' for games kept in user_data, 'c<chat_id>' otherwise.
+    """
+    query = data.get('callback_query')
+    if query:
+        user_id = query['from']['id']
+        if query.get('data', '').startswith(PRIVATE_PREFIXES):
+            return f"u{user_id}"
+        message = query.get('message')
+        return f"c{message['chat']['id']}" if message else f"u{user_id}"
+    message = data.get('message') or data.get('edited_message')
+    if message:
+        command = (message.get('text') or '').split(' ', 1)[0].split('@', 1)[0]
+        if command in PRIVATE_COMMANDS and 'from' in message:
+            return f"u{message['from']['id']}"
+        return f"c{message['chat']['id']}"
+    return f"x{data.get('update_id', 0)}"
+
+def load_factory(path):
+    module_name, _, attr = path.partition(':')
+    return getattr(importlib.import_module(module_name), attr)
+
+async def _worker_loop(shard_id, inbox, outbox, app_factory, concurrency):
+    loop = asyncio.get_running_loop()
+    owned_keys = Counter()
+    application = None
+    if app_factory:
+        application = load_factory(app_factory)()
+        await application.initialize()
+        # PTB only runs post_init from run_polling/run_webhook, so the shard runs it like they do
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+
+    async def process(data):
+        owned_keys[shard_key(data)] += 1
+        if application is not None:
+            await application.process_update(Update.de_json(data, application.bot))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def run(data):
+        async with semaphore:
+            try:
+                await process(data)
+            except Exception as e:
+                logger.error(f"Shard {shard_id} failed to process update: {e}")
+
+    outbox.put(('ready', shard_id, None))
+    while True:
+        data = await loop.run_in_executor(None, inbox.get)
+        if data is None:
+            break
+        task = asyncio.create_task(run(data))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+    if application is not None:
+        await application.stop()
+        await application.shutdown()
+    outbox.put(('stopped', shard_id, dict(owned_keys)))
+
+def worker_main(shard_id, inbox, outbox, app_factory=None, concurrency=DEFAULT_CONCURRENCY):
+    """
+    Entry point of a shard process. Owns the game state of every key routed to it.
+
+    Args:
+        shard_id (int): Position of the shard on the ring.
+        inbox (multiprocessing.Queue): Raw updates for this shard, None to stop.
+        outbox (multiprocessing.Queue): Status messages back to the dispatcher.
+        app_factory (str): 'module:callable' returning an Application, or None for a stub shard.
+        concurrency (int): Maximum number of updates processed at once.
+    """
+    # Holds are tagged per shard, so a restarted shard sweeps only the holds of its previous run
+    os.environ['HOLDS_OWNER'] = f"shard-{shard_id}"
+    # Every shard shares one database, so only the first takes the scheduled snapshots
+    if shard_id:
+        os.environ['BACKUP_INTERVAL'] = '0'
+    asyncio.run(_worker_loop(shard_id, inbox, outbox, app_factory, concurrency))
+
+class Worker:
+    def __init__(self, shard_id):
+        self.shard_id = shard_id
+        self.process = None
+        self.inbox = None
+        self.ready = False
+        self.restarts = 0
+        self.pending = deque()
+
+class Dispatcher:
+    """
+    Front process that routes updates onto shard processes by consistent hash.
+
+    A crashed shard keeps its place on the ring and is restarted, with its updates
+    buffered meanwhile, so keys don't bounce between shards. Only a shard that keeps
+    crashing is taken off the ring and its keys move to the neighbouring shards.
+    """
+    def __init__(self, workers=DEFAULT_WORKERS, app_factory=None, replicas=DEFAULT_REPLICAS,
+                 max_restarts=MAX_RESTARTS, concurrency=DEFAULT_CONCURRENCY):
+        self.app_factory = app_factory
+        self.max_restarts = max_restarts
+        self.concurrency = concurrency
+        self.outbox = multiprocessing.Queue()
+        self.workers = {shard_id: Worker(shard_id) for shard_id in range(workers)}
+        self.ring = HashRing(self.workers, replicas)
+        self.routed = Counter()
+        self.dropped = 0
+        self.reports = {}
+
+    def _spawn(self, worker):
+        worker.inbox = multiprocessing.Queue()
+        worker.ready = False
+        worker.process = multiprocessing.Process(
+            target=worker_main,
+            args=(worker.shard_id, worker.inbox, self.outbox, self.app_factory, self.concurrency),
+            name=f"shard-{worker.shard_id}",
+            daemon=True
+        )
+        worker.process.start()
+
+    def start(self):
+        for worker in self.workers.values():
+            self._spawn(worker)
+
+    def dispatch(self, data):
+        worker = self.workers[self.ring.get(shard_key(data))]
+        self.routed[worker.shard_id] += 1
+        if worker.ready and worker.process.is_alive():
+            worker.inbox.put(data)
+            return
+        # Dead shards are buffered until poll() restarts them, not fed into an inbox nobody reads
+        worker.ready = False
+        self._buffer(worker, data)
+
+    def _buffer(self, worker, data):
+        if len(worker.pending) >= PENDING_LIMIT:
+            worker.pending.popleft()
+            self.dropped += 1
+            logger.warning(f"Shard {worker.shard_id} backlog full. Dropping oldest update.")
+        worker.pending.append(data)
+
+    def _drain(self, worker):
+        """
+        Move the updates a dead shard never read from its inbox to the front of its backlog.
+
+        The shard most likely died inside inbox.get() holding the queue's read lock, so the
+        pipe is read directly instead.
+        """
+        reader = worker.inbox._reader
+        unread = []
+        try:
+            while reader.poll(DRAIN_TIMEOUT):
+                data = ForkingPickler.loads(reader.recv_bytes())
+                if data is not None:
+                    unread.append(data)
+        except (EOFError, OSError, ValueError) as e:
+            logger.error(f"Shard {worker.shard_id} inbox could not be drained completely: {e}")
+        worker.inbox.cancel_join_thread()
+        worker.inbox.close()
+        pending, worker.pending = worker.pending, deque()
+        for data in unread + list(pending):
+            self._buffer(worker, data)
+        if unread:
+            logger.warning(f"Recovered {len(unread)} unread updates of shard {worker.shard_id}.")
+
+    def poll(self):
+        """
+        Handle status messages and restart dead shards. Call this regularly from the dispatch loop.
+        """
+        while not self.outbox.empty():
+            kind, shard_id, payload = self.outbox.get()
+            worker = self.workers[shard_id]
+            if kind == 'ready':
+                worker.ready = True
+                while worker.pending:
+                    worker.inbox.put(worker.pending.popleft())
+            elif kind == 'stopped':
+                self.reports[shard_id] = payload
+        for worker in self.workers.values():
+            if worker.process is None or worker.process.is_alive() or worker.shard_id not in self.ring.nodes():
+                continue
+            if worker.process.exitcode == 0 and worker.shard_id in self.reports:
+                continue
+            worker.ready = False
+            self._drain(worker)
+            if worker.restarts < self.max_restarts:
+                worker.restarts += 1
+                logger.warning(f"Shard {worker.shard_id} died (exit code {worker.process.exitcode}). Restarting, attempt {worker.restarts}.")
+                self._spawn(worker)
+            else:
+                self._rebalance(worker)
+
+    def _rebalance(self, worker):
+        logger.error(f"Shard {worker.shard_id} keeps crashing. Moving its keys to the remaining shards.")
+        self.ring.remove(worker.shard_id)
+        pending, worker.pending = worker.pending, deque()
+        for data in pending:
+            self.dispatch(data)
+
+    def stop(self, timeout=10):
+        for worker in self.workers.values():
+            if worker.process is not None and worker.process.is_alive():
+                worker.inbox.put(None)
+        deadline = time.monotonic() + timeout
+        for worker in self.workers.values():
+            if worker.process is not None:
+                worker.process.join(max(0, deadline - time.monotonic()))
+        self.poll()
+
+def stub_updates(count, users=1000, chats=50):
+    """
+    Generate raw updates for exercising the dispatcher without Telegram.
+
+    Args:
+        count (int): Number of updates.
+        users (int): Number of distinct users.
+        chats (int): Number of distinct group chats.
+
+    Yields:
+        dict: Raw update in Bot API format.
+    """
+    private_data = ['mine_choose_0_0_{uid}', 'tower_choose_0_0', 'slots_spin', 'roul_start', 'predict_start']
+    group_data = ['dice_roll_1', 'dart_roll_1', 'bowl_roll_1', 'football_take_shot_1', 'basketball_shoot_1']
+    for update_id in range(1, count + 1):
+        user_id = random.randint(1, users)
+        chat_id = -random.randint(1, chats)
+        user = {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"}
+        callback = random.choice(private_data if random.random() < 0.5 else group_data).format(uid=user_id)
+        message = {'message_id': update_id, 'date': int(time.time()), 'chat': {'id': chat_id, 'type': 'group'}}
+        yield {
+            'update_id': update_id,
+            'callback_query': {'id': str(update_id), 'from': user, 'chat_instance': str(chat_id), 'message': message, 'data': callback}
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the sharded dispatcher against a stub update source.")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--app-factory', default=None, help="'module:callable' returning an Application.")
+    parser.add_argument('--kill-shard', type=int, default=None, help="Kill this shard halfway to exercise restarts.")
+    args = parser.parse_args()
+
+    dispatcher = Dispatcher(args.workers, app_factory=args.app_factory)
+    dispatcher.start()
+    start = time.perf_counter()
+    for n, data in enumerate(stub_updates(args.count), 1):
+        dispatcher.dispatch(data)
+        if n % 100 == 0:
+            dispatcher.poll()
+        if args.kill_shard is not None and n == args.count // 2:
+            dispatcher.workers[args.kill_shard].process.kill()
+    while any(w.pending for w in dispatcher.workers.values()):
+        dispatcher.poll()
+        time.sleep(0.05)
+    dispatcher.stop()
+    duration = time.perf_counter() - start
+
+    owners = {}
+    for shard_id, keys in dispatcher.reports.items():
+        for key in keys:
+            owners.setdefault(key, set()).add(shard_id)
+    print(json.dumps({
+        'updates': args.count,
+        'duration': duration,
+        'throughput': args.count / duration,
+        'routed': dict(dispatcher.routed),
+        'dropped': dispatcher.dropped,
+        'restarts': {w.shard_id: w.restarts for w in dispatcher.workers.values()},
+        'keys_on_multiple_shards': sum(1 for shards in owners.values() if len(shards) > 1)
+    }, indent=2))
+
+if __name__ == '__main__':
+    main()
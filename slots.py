@@ -1,41 +1,121 @@
 import asyncio
+import logging
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from database import user_exists, get_user_balance, update_user_balance
-from utils import logger
-
-def get_combo_parts(dice_value: int) -> list[str]:
-    values = ["🍫", "🍇", "🍋", "7️⃣"]
-    dice_value -= 1
-    result = []
-    for _ in range(3):
-        result.append(values[dice_value % 4])
-        dice_value //= 4
-    return result
-
-def get_payout(symbols: list[str]) -> float:
-    s1, s2, s3 = symbols
-    if s1 == '7️⃣' and s2 == '7️⃣' and s3 == '7️⃣':
-        return 20.0
-    elif s1 == s2 == s3:
-        if s1 == '🍫':
-            return 7.0
-        elif s1 == '🍋':
-            return 7.0
-        elif s1 == '🍇':
-            return 7.0
-    elif s1 == '7️⃣' and s2 == '7️⃣':
-        return 2.0
-    elif s2 == '7️⃣' and s3 == '7️⃣':
-        return 1.0
-    elif s1 == s2:
-        if s1 == '🍫':
-            return 0.5
-        elif s1 == '🍋':
-            return 0.25
-        elif s1 == '🍇':
-            return 0.25
-    return 0.0
+import random
+from database import user_exists, get_user_balance
+from holds import capture, held, release, reserve
+from ledger import new_round_id
+from metrics import timed_handler
+from money import Money, ZERO
+from payouts import SLOTS_TABLE, SLOTS_VALUES, paytable_text
+from settlement import settle_batch
+from utils import send_with_retry
 
+logger = logging.getLogger(__name__)
+
+MIN_BET = Money.parse('0.25')
+MAX_BET = Money.parse(50)
+BET_STEP = Money.parse(1)
+DEFAULT_BET = Money.parse(1)
+
+# Auto-spin choices, cycled through by their buttons; None turns a limit off
+AUTO_SPINS = (10, 25, 50, 100)
+AUTO_LIMITS = (None, Money.parse(10), Money.parse(25), Money.parse(50), Money.parse(100), Money.parse(250))
+
+_PAYOUT_BY_SYMBOLS = {result.symbols: result.multiplier for result in SLOTS_TABLE[1:]}
+
+def get_combo_parts(dice_value: int) -> tuple[str, ...]:
+    return SLOTS_TABLE[dice_value].symbols
+
+def get_payout(symbols) -> float:
+    return _PAYOUT_BY_SYMBOLS.get(tuple(symbols), 0.0)
+
+def bet_keyboard(bet_size):
+    keyboard = [
+        [InlineKeyboardButton("-1", callback_data="slots_bet_-1"),
+         InlineKeyboardButton(f"${bet_size:.2f}", callback_data="slots_noop"),
+         InlineKeyboardButton("+1", callback_data="slots_bet_+1")],
+        [InlineKeyboardButton("Min", callback_data="slots_bet_min"),
+         InlineKeyboardButton("Double", callback_data="slots_bet_double"),
+         InlineKeyboardButton("Max", callback_data="slots_bet_max")],
+        [InlineKeyboardButton("Combos", callback_data="slots_show_combos"),
+         InlineKeyboardButton("🔁 Auto", callback_data="slots_auto"),
+         InlineKeyboardButton("🎰 Spin", callback_data="slots_spin")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def _limit_text(limit):
+    return f"${limit:.2f}" if limit else "off"
+
+def auto_keyboard(game):
+    keyboard = [
+        [InlineKeyboardButton(f"Spins: {game['auto_spins']}", callback_data="slots_auto_spins")],
+        [InlineKeyboardButton(f"Stop loss: {_limit_text(game['stop_loss'])}", callback_data="slots_auto_loss")],
+        [InlineKeyboardButton(f"Stop win: {_limit_text(game['stop_win'])}", callback_data="slots_auto_win")],
+        [InlineKeyboardButton("⬅️ Back", callback_data="slots_back"),
+         InlineKeyboardButton("🔁 Start", callback_data="slots_auto_start")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def _next_choice(choices, current):
+    return choices[(choices.index(current) + 1) % len(choices)] if current in choices else choices[0]
+
+def auto_spin(bet_size, spins, available, stop_loss=None, stop_win=None, rng=random):
+    """
+    Play up to `spins` spins server-side, without sending a dice per spin.
+
+    A spin pays like a 🎰 dice: the value is drawn uniformly from the 64 Telegram
+    can return and resolved through SLOTS_TABLE.
+
+    Args:
+        bet_size (Money): Stake of every spin.
+        spins (int): Spins asked for.
+        available (Money): Balance the player can stake; the run stops when the next spin isn't covered.
+        stop_loss (Money): Stop once the run has lost at least this much, None for no limit.
+        stop_win (Money): Stop once the run has won at least this much, None for no limit.
+        rng (random.Random): Source of the dice values.
+
+    Returns:
+        tuple: ([(SlotResult, payout as Money with the stake included)], reason the run stopped:
+            'done', 'stop_loss', 'stop_win' or 'balance').
+    """
+    results = []
+    net = ZERO
+    for _ in range(spins):
+        if available + net < bet_size:
+            return results, 'balance'
+        result = SLOTS_TABLE[rng.randint(1, SLOTS_VALUES)]
+        payout = bet_size + bet_size * result.multiplier if result.multiplier > 0 else ZERO
+        net += payout - bet_size
+        results.append((result, payout))
+        if stop_loss and -net >= stop_loss:
+            return results, 'stop_loss'
+        if stop_win and net >= stop_win:
+            return results, 'stop_win'
+    return results, 'done'
+
+STOP_REASONS = {
+    'done': "",
+    'stop_loss': " (stop loss reached)",
+    'stop_win': " (stop win reached)",
+    'balance': " (not enough balance)",
+}
+
+def auto_spin_summary(bet_size, results, reason):
+    # One line per spin: the reels and the change of balance
+    lines = []
+    for n, (result, payout) in enumerate(results, 1):
+        delta = payout - bet_size
+        lines.append(f"{n}. {result.text}  {'+' if delta > 0 else '-' if delta < 0 else ''}${abs(delta):.2f}")
+    wagered = bet_size * len(results)
+    won = sum((payout for _, payout in results), ZERO)
+    return (
+        f"🔁 Auto-spin: {len(results)} spins{STOP_REASONS[reason]}\n"
+        f"Wagered ${wagered:.2f}, returned ${won:.2f}, net {'-' if won < wagered else '+'}${abs(won - wagered):.2f}\n\n"
+        + "\n".join(lines)
+    )
+
+@timed_handler
 async def slots_command(update, context):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -52,97 +132,83 @@ async def slots_command(update, context):
         return
 
     balance = get_user_balance(user_id)
-    bet_size = 1.0
+    bet_size = DEFAULT_BET
     text = f"💰 Balance: ${balance:.2f}\n\nChoose the bet size:"
-    keyboard = [
-        [InlineKeyboardButton("-1", callback_data="slots_bet_-1"),
-         InlineKeyboardButton(f"${bet_size:.2f}", callback_data="slots_noop"),
-         InlineKeyboardButton("+1", callback_data="slots_bet_+1")],
-        [InlineKeyboardButton("Min", callback_data="slots_bet_min"),
-         InlineKeyboardButton("Double", callback_data="slots_bet_double"),
-         InlineKeyboardButton("Max", callback_data="slots_bet_max")],
-        [InlineKeyboardButton("Combos", callback_data="slots_show_combos"),
-         InlineKeyboardButton("🎰 Spin", callback_data="slots_spin")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = bet_keyboard(bet_size)
     message = await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
-    context.user_data['slots_game'] = {'bet_size': bet_size, 'prompt_message_id': message.message_id}
+    context.user_data['slots_game'] = {
+        'bet_size': bet_size, 'prompt_message_id': message.message_id,
+        'auto_spins': AUTO_SPINS[0], 'stop_loss': None, 'stop_win': None
+    }
 
+@timed_handler
 async def slots_button_handler(update, context):
     query = update.callback_query
-    await query.answer()
     data = query.data
+    # A callback query takes a single answer; spins give theirs below, as an alert when they can't run
+    spins = data in ("slots_spin", "slots_auto_start")
+    if not spins:
+        await query.answer()
     user_id = query.from_user.id
     chat_id = query.message.chat_id
     game = context.user_data.get('slots_game')
 
     if not game or 'prompt_message_id' not in game:
+        if spins:
+            await query.answer()
         return
 
     balance = get_user_balance(user_id)
     bet_size = game['bet_size']
 
     if data == "slots_spin":
-        if balance < bet_size:
+        # Held while the reels spin and settled as a delta, so nothing settled meanwhile is overwritten
+        round_id = new_round_id()
+        if not reserve({user_id: bet_size}, 'slots', round_id):
             await query.answer("Not enough balance to spin!", show_alert=True)
             return
+        await query.answer()
 
-        await context.bot.delete_message(chat_id=chat_id, message_id=game['prompt_message_id'])
-        dice_message = await context.bot.send_dice(chat_id=chat_id, emoji='🎰')
-        dice_value = dice_message.dice.value
-        symbols = get_combo_parts(dice_value)
-        payout_multiplier = get_payout(symbols)
-
-        if payout_multiplier > 0:
-            winnings = bet_size * payout_multiplier
-            balance += winnings
-            update_user_balance(user_id, balance)
-            outcome_text = f"{symbols[0]} {symbols[1]} {symbols[2]}\n\nYou won ${winnings:.2f}!"
-        else:
-            balance -= bet_size
-            update_user_balance(user_id, balance)
-            outcome_text = f"{symbols[0]} {symbols[1]} {symbols[2]}\n\nNo win this time."
+        try:
+            await context.bot.delete_message(chat_id=chat_id, message_id=game['prompt_message_id'])
+            dice_message = await send_with_retry(context.bot, chat_id, emoji='🎰')
+            if dice_message is None:
+                outcome_text = "The reels couldn't be spun, nothing was charged."
+            else:
+                result = SLOTS_TABLE[dice_message.dice.value]
+                winnings = bet_size * result.multiplier if result.multiplier > 0 else ZERO
+                if not capture('slots', round_id, {user_id: bet_size + winnings} if winnings else {}):
+                    outcome_text = "The spin couldn't be settled, nothing was charged."
+                elif winnings:
+                    balance += winnings
+                    outcome_text = f"{result.text}\n\nYou won ${winnings:.2f}!"
+                else:
+                    balance -= bet_size
+                    outcome_text = f"{result.text}\n\nNo win this time."
+        finally:
+            # Gives the stake back if the spin wasn't settled; nothing is left to release after a capture
+            release(round_id)
 
         await asyncio.sleep(3)
         text = f"💰 Balance: ${balance:.2f}\n\n{outcome_text}\n\nChoose the bet size:"
-        keyboard = [
-            [InlineKeyboardButton("-1", callback_data="slots_bet_-1"),
-             InlineKeyboardButton(f"${bet_size:.2f}", callback_data="slots_noop"),
-             InlineKeyboardButton("+1", callback_data="slots_bet_+1")],
-            [InlineKeyboardButton("Min", callback_data="slots_bet_min"),
-             InlineKeyboardButton("Double", callback_data="slots_bet_double"),
-             InlineKeyboardButton("Max", callback_data="slots_bet_max")],
-            [InlineKeyboardButton("Combos", callback_data="slots_show_combos"),
-             InlineKeyboardButton("🎰 Spin", callback_data="slots_spin")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = bet_keyboard(bet_size)
         message = await context.bot.send_message(chat_id=chat_id, text=text, reply_markup=reply_markup)
         game['prompt_message_id'] = message.message_id
 
     elif data.startswith("slots_bet_"):
         if data == "slots_bet_-1":
-            bet_size = max(0.25, bet_size - 1)
+            bet_size = max(MIN_BET, bet_size - BET_STEP)
         elif data == "slots_bet_+1":
-            bet_size = min(50, bet_size + 1)
+            bet_size = min(MAX_BET, bet_size + BET_STEP)
         elif data == "slots_bet_min":
-            bet_size = 0.25
+            bet_size = MIN_BET
         elif data == "slots_bet_double":
-            bet_size = min(50, bet_size * 2)
+            bet_size = min(MAX_BET, bet_size * 2)
         elif data == "slots_bet_max":
-            bet_size = 50
+            bet_size = MAX_BET
         game['bet_size'] = bet_size
         text = f"💰 Balance: ${balance:.2f}\n\nChoose the bet size:"
-        keyboard = [
-            [InlineKeyboardButton("-1", callback_data="slots_bet_-1"),
-             InlineKeyboardButton(f"${bet_size:.2f}", callback_data="slots_noop"),
-             InlineKeyboardButton("+1", callback_data="slots_bet_+1")],
-            [InlineKeyboardButton("Min", callback_data="slots_bet_min"),
-             InlineKeyboardButton("Double", callback_data="slots_bet_double"),
-             InlineKeyboardButton("Max", callback_data="slots_bet_max")],
-            [InlineKeyboardButton("Combos", callback_data="slots_show_combos"),
-             InlineKeyboardButton("🎰 Spin", callback_data="slots_spin")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = bet_keyboard(bet_size)
         await context.bot.edit_message_text(
             text,
             chat_id=chat_id,
@@ -153,15 +219,7 @@ async def slots_button_handler(update, context):
     elif data == "slots_show_combos":
         combos_text = (
             "Winning combinations:\n\n"
-            "7️⃣7️⃣7️⃣ — 20x Jackpot!\n"
-            "🍫🍫🍫 — 7x\n"
-            "🍋🍋🍋 — 7x\n"
-            "🍇🍇🍇 — 7x\n"
-            "7️⃣7️⃣❔ — 2x\n"
-            "❔7️⃣7️⃣ — 1x\n"
-            "🍫🍫❔ — 0.5x\n"
-            "🍋🍋❔ — 0.25x\n"
-            "🍇🍇❔ — 0.25x\n\n"
+            f"{paytable_text()}\n\n"
             "❔ represents any symbol\n"
             "🍀 Good Luck!"
         )
@@ -173,19 +231,46 @@ async def slots_button_handler(update, context):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
+    elif data.startswith("slots_auto"):
+        # Games started before auto-spin existed have no settings yet
+        game.setdefault('auto_spins', AUTO_SPINS[0])
+        game.setdefault('stop_loss', None)
+        game.setdefault('stop_win', None)
+
+        if data == "slots_auto_start":
+            available = balance - held(user_id)
+            if available < bet_size:
+                await query.answer("Not enough balance to spin!", show_alert=True)
+                return
+            results, reason = auto_spin(bet_size, game['auto_spins'], available, game['stop_loss'], game['stop_win'])
+            # One transaction for the whole run: one balance update and a ledger row per spin
+            if not settle_batch('slots', new_round_id(), user_id, [(bet_size, payout) for _, payout in results]):
+                await query.answer("Auto-spin failed, nothing was charged. Please try again.", show_alert=True)
+                return
+            await query.answer()
+            balance += sum((payout for _, payout in results), ZERO) - bet_size * len(results)
+            text = f"💰 Balance: ${balance:.2f}\n\n{auto_spin_summary(bet_size, results, reason)}\n\nChoose the bet size:"
+            reply_markup = bet_keyboard(bet_size)
+        else:
+            if data == "slots_auto_spins":
+                game['auto_spins'] = _next_choice(AUTO_SPINS, game['auto_spins'])
+            elif data == "slots_auto_loss":
+                game['stop_loss'] = _next_choice(AUTO_LIMITS, game['stop_loss'])
+            elif data == "slots_auto_win":
+                game['stop_win'] = _next_choice(AUTO_LIMITS, game['stop_win'])
+            text = (f"💰 Balance: ${balance:.2f}\n\n🔁 Auto-spin at ${bet_size:.2f} per spin\n\n"
+                    "Spins stop early once a stop limit is reached.")
+            reply_markup = auto_keyboard(game)
+        await context.bot.edit_message_text(
+            text,
+            chat_id=chat_id,
+            message_id=game['prompt_message_id'],
+            reply_markup=reply_markup
+        )
+
     elif data == "slots_back":
         text = f"💰 Balance: ${balance:.2f}\n\nChoose the bet size:"
-        keyboard = [
-            [InlineKeyboardButton("-1", callback_data="slots_bet_-1"),
-             InlineKeyboardButton(f"${bet_size:.2f}", callback_data="slots_noop"),
-             InlineKeyboardButton("+1", callback_data="slots_bet_+1")],
-            [InlineKeyboardButton("Min", callback_data="slots_bet_min"),
-             InlineKeyboardButton("Double", callback_data="slots_bet_double"),
-             InlineKeyboardButton("Max", callback_data="slots_bet_max")],
-            [InlineKeyboardButton("Combos", callback_data="slots_show_combos"),
-             InlineKeyboardButton("🎰 Spin", callback_data="slots_spin")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = bet_keyboard(bet_size)
         await context.bot.edit_message_text(
             text,
             chat_id=chat_id,
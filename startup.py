@@ -0,0 +1,238 @@
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+# Taken before anything heavy is imported, so time-to-first-update covers the whole start
+STARTED = time.monotonic()
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, CallbackQueryHandler, CommandHandler, MessageHandler, TypeHandler, filters
+import backup
+import database
+import holds
+import metrics
+import utils  # Sets up logging on import
+
+logger = logging.getLogger(__name__)
+
+# Startup configurations
+HOT_USERS = 5000
+WARM_INTERVAL = 300
+
+# command -> (module, handler)
+COMMANDS = {
+    'dice': ('dice', 'dice_command'),
+    'dart': ('darts', 'dart_command'),
+    'bowl': ('bowling', 'bowling_command'),
+    'football': ('football', 'football_command'),
+    'basketball': ('basketball', 'basketball_command'),
+    'coin': ('coin', 'coin_command'),
+    'mine': ('mines', 'mine_command'),
+    'tower': ('tower', 'tower_command'),
+    'slots': ('slots', 'slots_command'),
+    'roul': ('roulette', 'roulette_command'),
+    'predict': ('predict', 'predict_command'),
+    'top': ('stats', 'top_command'),
+    'stats': ('stats', 'stats_command'),
+    'credit': ('admin', 'credit_command'),
+}
+
+# callback_data pattern -> (module, handler)
+CALLBACKS = {
+    r'^dice_': ('dice', 'dice_button_handler'),
+    r'^dart_': ('darts', 'dart_button_handler'),
+    r'^bowl_': ('bowling', 'bowling_button_handler'),
+    r'^football_': ('football', 'football_button_handler'),
+    r'^basketball_': ('basketball', 'basketball_button_handler'),
+    r'^coin_': ('coin', 'coin_button_handler'),
+    r'^mine_': ('mines', 'mine_button_handler'),
+    r'^tower_': ('tower', 'tower_button_handler'),
+    r'^slots_': ('slots', 'slots_button_handler'),
+    r'^roul_': ('roulette', 'roulette_button_handler'),
+    r'^predict_': ('predict', 'predict_button_handler'),
+}
+
+# Plain-text handlers of the duel modules; each reads every text message, so each gets its own group
+TEXT_HANDLERS = [
+    ('dice', 'dice_text_handler'),
+    ('darts', 'dart_text_handler'),
+    ('bowling', 'bowling_text_handler'),
+    ('football', 'football_text_handler'),
+    ('basketball', 'basketball_text_handler'),
+]
+
+STARTUP_SECONDS = metrics.gauge('bot_startup_seconds', "Time taken by each startup phase.", ('phase',))
+FIRST_UPDATE_SECONDS = metrics.gauge('bot_time_to_first_update_seconds', "Time from process start to the first handled update.")
+MODULE_IMPORT_SECONDS = metrics.gauge('bot_module_import_seconds', "Time taken to import a game module on first use.", ('module',))
+
+def lazy(module_name, attr, load=True):
+    """
+    Handler callback that imports its module on first use.
+
+    Args:
+        module_name (str): Module holding the handler, e.g. 'mines'.
+        attr (str): Name of the handler coroutine function.
+        load (bool): Import the module if needed. With False the callback does nothing
+            until something else has imported the module.
+
+    Returns:
+        callable: Coroutine function suitable for a python-telegram-bot handler.
+    """
+    target = None
+
+    async def callback(update, context):
+        nonlocal target
+        if target is None:
+            if not load and module_name not in sys.modules:
+                return
+            start = time.perf_counter()
+            target = getattr(importlib.import_module(module_name), attr)
+            MODULE_IMPORT_SECONDS.set(module_name, value=time.perf_counter() - start)
+        return await target(update, context)
+
+    callback.__name__ = attr
+    return callback
+
+def register_handlers(application):
+    """
+    Register every command, callback and text handler without importing the game modules.
+
+    Args:
+        application (telegram.ext.Application): Application to register on.
+    """
+    metrics.register_commands(COMMANDS)
+    metrics.register_callbacks(CALLBACKS)
+    for command, (module_name, attr) in COMMANDS.items():
+        application.add_handler(CommandHandler(command, lazy(module_name, attr)))
+    for pattern, (module_name, attr) in CALLBACKS.items():
+        application.add_handler(CallbackQueryHandler(lazy(module_name, attr), pattern=pattern))
+    # A duel only expects a username after its own buttons were used, which imports the module,
+    # so a text message never needs to load one
+    for group, (module_name, attr) in enumerate(TEXT_HANDLERS, 1):
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, lazy(module_name, attr, load=False)), group=group)
+    application.add_handler(TypeHandler(Update, _first_update), group=-1)
+
+_first_update_seen = False
+
+async def _first_update(update, context):
+    global _first_update_seen
+    if not _first_update_seen:
+        _first_update_seen = True
+        elapsed = time.monotonic() - STARTED
+        FIRST_UPDATE_SECONDS.set(value=elapsed)
+        logger.info(f"First update handled {elapsed:.3f}s after start")
+
+def warm_up(db_path=None, hot_users=HOT_USERS):
+    """
+    Read the pages the first requests will need, so they come from the OS page cache.
+
+    Reads the balances of the most recently active users, then the whole users table.
+    Nothing is kept in the process: balance reads still query the database, they just
+    don't wait on the disk.
+
+    Args:
+        db_path (str): Database to warm, database.DB_PATH by default.
+        hot_users (int): How many recently active users to load first.
+
+    Returns:
+        dict: Users loaded, users table rows read and seconds taken.
+    """
+    start = time.perf_counter()
+    try:
+        with sqlite3.connect(db_path or database.DB_PATH) as conn:
+            # One primary key seek per user for their latest bet, instead of scanning the ledger
+            hot = conn.execute('''SELECT u.user_id, u.balance FROM users u
+                                  ORDER BY (SELECT MAX(ts) FROM ledger l WHERE l.user_id = u.user_id) DESC
+                                  LIMIT ?''', (hot_users,)).fetchall()
+            rows = conn.execute("SELECT COUNT(*), SUM(balance) FROM users").fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Database error warming the cache: {e}")
+        return {'hot_users': 0, 'users': 0, 'seconds': time.perf_counter() - start}
+    return {'hot_users': len(hot), 'users': rows, 'seconds': time.perf_counter() - start}
+
+async def warm_job(context):
+    # For JobQueue.run_repeating; re-reading users keeps its pages from being evicted between bursts
+    try:
+        await asyncio.to_thread(warm_up, hot_users=0)
+    except Exception as e:
+        logger.error(f"Cache warm-up failed: {e}")
+
+def _phase(name, start):
+    elapsed = time.perf_counter() - start
+    STARTUP_SECONDS.set(name, value=elapsed)
+    return elapsed
+
+async def post_init(application):
+    """
+    Startup sequence, run once the application is initialized and before updates are fetched.
+    """
+    start = time.perf_counter()
+    await asyncio.to_thread(database.init_db)
+    migrate = _phase('migrations', start)
+
+    start = time.perf_counter()
+    released = await asyncio.to_thread(holds.sweep)
+    sweep = _phase('holds_sweep', start)
+
+    start = time.perf_counter()
+    warmed = await asyncio.to_thread(warm_up)
+    warm = _phase('warm_up', start)
+
+    if application.job_queue is not None:
+        application.job_queue.run_repeating(warm_job, interval=WARM_INTERVAL, first=WARM_INTERVAL)
+        application.job_queue.run_repeating(holds.expire_job, interval=holds.EXPIRE_INTERVAL, first=holds.EXPIRE_INTERVAL)
+        backup_interval = backup.interval()
+        if backup_interval > 0:
+            application.job_queue.run_repeating(backup.backup_job, interval=backup_interval, first=backup_interval)
+
+    ready = time.monotonic() - STARTED
+    STARTUP_SECONDS.set('ready', value=ready)
+    logger.info(f"Ready {ready:.3f}s after start: migrations {migrate:.3f}s, "
+                f"holds sweep {sweep:.3f}s ({released} released), "
+                f"warm-up {warm:.3f}s ({warmed['hot_users']} hot users, {warmed['users']} users)")
+
+def build_application(token=None):
+    """
+    Build the bot Application with its handlers registered lazily.
+
+    Also usable as a sharding.py app factory: 'startup:build_application'.
+
+    Args:
+        token (str): Bot token, the BOT_TOKEN environment variable by default.
+
+    Returns:
+        telegram.ext.Application: The application, not yet initialized.
+    """
+    application = ApplicationBuilder().token(token or os.environ['BOT_TOKEN']).post_init(post_init).build()
+    register_handlers(application)
+    return application
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot.")
+    parser.add_argument('--webhook-url', default=None, help="Serve through webhook.py instead of polling.")
+    parser.add_argument('--secret', default=os.environ.get('WEBHOOK_SECRET'))
+    parser.add_argument('--metrics-port', type=int, default=metrics.DEFAULT_PORT)
+    args = parser.parse_args()
+
+    application = build_application()
+    metrics.serve_metrics(port=args.metrics_port)
+    metrics.track_application(application)
+    if args.webhook_url:
+        import webhook
+
+        async def run():
+            # run_webhook initializes the application itself, so the startup sequence is called here
+            await post_init(application)
+            await webhook.run_webhook(application, args.webhook_url, args.secret)
+
+        asyncio.run(run())
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import sqlite3
+import database
+from utils import send_with_retry
+from metrics import timed_handler, timed_query
+from money import Money
+
+logger = logging.getLogger(__name__)
+
+LEADERBOARD_SIZE = 10
+LEADERBOARDS = {
+    'wagered': "Top wagered",
+    'net': "Top winners"
+}
+
+@timed_query
+def get_user_stats(user_id):
+    """
+    Retrieve the aggregated betting statistics of a user.
+
+    Args:
+        user_id (int): The Telegram user ID.
+
+    Returns:
+        dict: bets, wagered, won, net and biggest_win, or None if the user never bet.
+    """
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            c = conn.cursor()
+            c.execute("SELECT bets, wagered, won, net, biggest_win FROM user_stats WHERE user_id = ?", (user_id,))
+            result = c.fetchone()
+            if not result:
+                return None
+            bets, *amounts = result
+            return dict(zip(('bets', 'wagered', 'won', 'net', 'biggest_win'), [bets] + [Money.micros(amount) for amount in amounts]))
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_user_stats: {e}")
+        return None
+
+@timed_query
+def get_leaderboard(order='wagered', limit=LEADERBOARD_SIZE):
+    """
+    Retrieve the top users by a statistic, walking the matching covering index.
+
+    Args:
+        order (str): 'wagered' or 'net'.
+        limit (int): Number of users to return.
+
+    Returns:
+        list: (user_id, username, value) tuples, best first.
+    """
+    if order not in LEADERBOARDS:
+        raise ValueError(f"Unknown leaderboard: {order}")
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            c = conn.cursor()
+            c.execute(f'''SELECT s.user_id, u.username, s.{order}
+                          FROM (SELECT user_id, {order} FROM user_stats ORDER BY {order} DESC, user_id LIMIT ?) s
+                          LEFT JOIN users u ON u.user_id = s.user_id
+                          ORDER BY s.{order} DESC, s.user_id''', (limit,))
+            return [(user_id, username, Money.micros(value)) for user_id, username, value in c.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Database error in get_leaderboard: {e}")
+        return []
+
+def reconcile_stats():
+    """
+    Recompute user_stats from the raw ledger and repair rows that drifted.
+
+    Returns:
+        int: Number of users whose statistics were corrected.
+    """
+    try:
+        with sqlite3.connect(database.DB_PATH) as conn:
+            c = conn.cursor()
+            # Take the write lock before reading, so no bet lands between the ledger scan and the repair
+            c.execute("BEGIN IMMEDIATE")
+            c.execute('''SELECT user_id, COUNT(*), SUM(stake), SUM(payout), SUM(payout - stake), MAX(payout - stake)
+                         FROM ledger GROUP BY user_id''')
+            expected = {row[0]: row[1:] for row in c.fetchall()}
+            c.execute("SELECT user_id, bets, wagered, won, net, biggest_win FROM user_stats")
+            actual = {row[0]: row[1:] for row in c.fetchall()}
+            fixes = []
+            for user_id, values in expected.items():
+                values = values[:4] + (max(values[4], 0),)
+                if actual.get(user_id) != values:
+                    fixes.append((user_id,) + values)
+            c.executemany("INSERT OR REPLACE INTO user_stats (user_id, bets, wagered, won, net, biggest_win) VALUES (?, ?, ?, ?, ?, ?)", fixes)
+            orphans = [(user_id,) for user_id in actual if user_id not in expected]
+            c.executemany("DELETE FROM user_stats WHERE user_id = ?", orphans)
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Database error in reconcile_stats: {e}")
+        return 0
+    if fixes or orphans:
+        logger.warning(f"Reconciled user_stats: {len(fixes)} corrected, {len(orphans)} removed")
+    return len(fixes) + len(orphans)
+
+async def reconcile_job(context):
+    # For JobQueue.run_repeating; the ledger scan runs in a thread to keep the loop free
+    await asyncio.to_thread(reconcile_stats)
+
+@timed_handler
+async def top_command(update, context):
+    chat_id = update.effective_chat.id
+    order = context.args[0].lower() if context.args else 'wagered'
+    if order not in LEADERBOARDS:
+        await send_with_retry(context.bot, chat_id, "Usage: /top [wagered|net]")
+        return
+    rows = get_leaderboard(order)
+    if not rows:
+        await send_with_retry(context.bot, chat_id, "No bets recorded yet.")
+        return
+    lines = [f"🏆 {LEADERBOARDS[order]}\n"]
+    for rank, (user_id, username, value) in enumerate(rows, 1):
+        name = f"@{username}" if username else f"User {user_id}"
+        lines.append(f"{rank}. {name} — ${value:.2f}")
+    await send_with_retry(context.bot, chat_id, "\n".join(lines))
+
+@timed_handler
+async def stats_command(update, context):
+    user_id = update.effective_user.id
+    chat_id = update.effective_chat.id
+    stats = get_user_stats(user_id)
+    if not stats:
+        await send_with_retry(context.bot, chat_id, "You haven't placed any bets yet.")
+        return
+    text = (
+        f"📊 Your stats\n\n"
+        f"Bets: {stats['bets']}\n"
+        f"Wagered: ${stats['wagered']:.2f}\n"
+        f"Won: ${stats['won']:.2f}\n"
+        f"Net: ${stats['net']:.2f}\n"
+        f"Biggest win: ${stats['biggest_win']:.2f}"
+    )
+    await send_with_retry(context.bot, chat_id, text)
@@ -0,0 +1,46 @@
+import pytest
+import payouts
+import slots
+from bench import legacy_combo_parts, legacy_payout
+
+def legacy_roulette_win(bet_type, bet_value, spun_number):
+    # The set construction and if/elif win check roulette used before ROULETTE_MASKS, kept as the reference
+    red = {1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36}
+    if bet_type == "number":
+        return int(bet_value) == spun_number
+    elif bet_type == "range":
+        low, high = map(int, bet_value.split('-'))
+        return low <= spun_number <= high
+    elif bet_type == "even":
+        return spun_number != 0 and spun_number % 2 == 0
+    elif bet_type == "odd":
+        return spun_number % 2 == 1
+    elif bet_type == "color":
+        return spun_number != 0 and (spun_number in red) == (bet_value == "red")
+    return False
+
+ROULETTE_BETS = [(bet_type, bet_value, slot) for bet_type, values in payouts.ROULETTE_INDEX.items()
+                 for bet_value, slot in values.items()]
+
+@pytest.mark.parametrize('value', range(1, payouts.SLOTS_VALUES + 1))
+def test_slots_table_matches_legacy_decode(value):
+    # Every value Telegram can return, against the legacy decode, payout and rendering
+    symbols = legacy_combo_parts(value)
+    expected = (tuple(symbols), legacy_payout(symbols), f"{symbols[0]} {symbols[1]} {symbols[2]}")
+    assert tuple(payouts.SLOTS_TABLE[value]) == expected
+    assert slots.get_payout(slots.get_combo_parts(value)) == expected[1]
+
+def test_slots_table_has_no_value_zero():
+    assert payouts.SLOTS_TABLE[0] is None
+    assert len(payouts.SLOTS_TABLE) == payouts.SLOTS_VALUES + 1
+
+@pytest.mark.parametrize('bet_type, bet_value, slot', ROULETTE_BETS)
+def test_roulette_masks_match_legacy_win_check(bet_type, bet_value, slot):
+    # Every pocket of one bet
+    mask = payouts.ROULETTE_MASKS[slot]
+    for n in range(payouts.ROULETTE_POCKETS):
+        assert bool(mask >> n & 1) == legacy_roulette_win(bet_type, bet_value, n), n
+    assert payouts.roulette_slot(bet_type, bet_value) == slot
+
+def test_roulette_red_mask():
+    assert [n for n in range(payouts.ROULETTE_POCKETS) if payouts.ROULETTE_RED_MASK >> n & 1] == sorted(payouts.ROULETTE_RED)
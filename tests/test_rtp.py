@@ -0,0 +1,88 @@
+import math
+import pytest
+import coin
+import ev
+import roulette
+import rtp
+from payouts import (PREDICT_MULTIPLIERS, PREDICT_OUTCOMES, ROULETTE_INDEX, ROULETTE_MASKS, ROULETTE_POCKETS,
+                     ROULETTE_TABLE, SLOTS_TABLE, SLOTS_VALUES, predict_multiplier)
+
+ROUNDS = 100_000
+SEED = 49
+# Seeded, so the runs are reproducible; a wide band keeps hundreds of scenarios from needing a retune
+SIGMAS = 5.0
+
+def simulate(game, **params):
+    return rtp.run((game,), rounds=ROUNDS, seed=SEED, params={game: params})[game]
+
+def assert_close(stats, exact, label, variance=None):
+    # Pass the exact variance for rare wins, which a sample without a single hit puts at 0
+    if variance is None:
+        variance = stats['variance']
+    margin = SIGMAS * math.sqrt(variance / stats['rounds']) + 1e-9
+    assert abs(stats['rtp'] - exact) <= margin, f"{label}: simulated {stats['rtp']:.4f}, exact {exact:.4f}"
+
+def exact_variance(row):
+    # Payout of an ev.py row: multiplier with probability survival, else 0
+    return row['survival'] * row['multiplier'] ** 2 - row['ev'] ** 2
+
+def test_coin():
+    stats = simulate('coin')['flip']
+    assert_close(stats, coin.PLAYER_WIN_PROB * coin.WIN_MULTIPLIER, 'coin')
+
+def test_slots():
+    # Every value is equally likely; a winning spin keeps the stake on top of the multiplier
+    exact = sum(1 + result.multiplier for result in SLOTS_TABLE[1:] if result.multiplier > 0) / SLOTS_VALUES
+    assert_close(simulate('slots')['spin'], exact, 'slots')
+
+@pytest.mark.parametrize('high_bet', [False, True])
+def test_roulette(high_bet):
+    report = simulate('roulette', high_bet=high_bet)
+    for bet_type, values in ROULETTE_INDEX.items():
+        for bet_value, slot in values.items():
+            label = f"{bet_type} {bet_value}" if bet_value is not None else bet_type
+            if label not in report:
+                continue
+            cum_weights = roulette.spin_weights(ROULETTE_MASKS[slot], high_bet)
+            weights = [cum_weights[0]] + [b - a for a, b in zip(cum_weights, cum_weights[1:])]
+            won = sum(weights[n] for n in range(ROULETTE_POCKETS) if ROULETTE_MASKS[slot] >> n & 1)
+            assert_close(report[label], won / cum_weights[-1] * ROULETTE_TABLE[slot], label)
+
+@pytest.mark.parametrize('policy', ev.POLICIES)
+def test_mines_matches_exact_ev(policy):
+    report = simulate('mines', policy=policy)
+    exact = ev.build_report()['mines'][policy]
+    checked = 0
+    for m, rows in exact.items():
+        for row in rows:
+            label = f"{m} mines, cash out at {row['step']}"
+            if not row['survival']:
+                # More safe tiles than the extra mines leave; the simulator can't reach them
+                assert label not in report
+                continue
+            assert_close(report[label], row['ev'], f"{policy} {label}", exact_variance(row))
+            checked += 1
+    assert checked == len(report)
+
+def test_tower_matches_exact_ev():
+    report = simulate('tower')
+    for mode, rows in ev.build_report()['tower'].items():
+        for row in rows:
+            label = f"{mode}, cash out at {row['step']}"
+            assert_close(report[label], row['ev'], label, exact_variance(row))
+
+def test_predict():
+    report = simulate('predict')
+    for mode, multipliers in PREDICT_MULTIPLIERS.items():
+        faces = PREDICT_OUTCOMES[mode][1:rtp.PREDICT_SIDES[mode] + 1]
+        for prediction in multipliers:
+            exact = faces.count(prediction) / len(faces) * predict_multiplier(mode, prediction)
+            assert_close(report[f"{mode} '{prediction}'"], exact, f"{mode} {prediction}")
+
+def test_known_table_constants():
+    # Values the payout tables are tuned to; a table change that moves them should be deliberate
+    assert_close(simulate('coin')['flip'], 0.4 * 1.92, 'coin')
+    slots = simulate('slots')['spin']
+    assert_close(slots, 1.125, 'slots')
+    assert slots['max_payout'] == 21.0
+    assert_close(simulate('roulette')['number 17'], 0.37 * 36, 'number 17')
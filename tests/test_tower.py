@@ -0,0 +1,55 @@
+import random
+import tower
+
+def cells(buttons):
+    return [[(button.text, button.callback_data) for button in row] for row in buttons]
+
+def fresh_render(game, reveal_all):
+    # Every cell from scratch, as generate_grid_buttons did before it tracked the last render
+    return cells(tower.generate_grid_buttons(dict(game, keyboard=None), reveal_all))
+
+def play(rng, game):
+    # The renders of one game as the handler makes them: start, picks, then a loss, the top or a cash-out
+    game['current_level'] = 0
+    game['monkey_positions'], game['extra_monkeys'] = tower.deal_monkeys(game['chosen_mode'], rng)
+    game['revealed'] = [None] * 9
+    game['game_over'] = False
+    yield False
+    columns = tower.MODE_CONFIG[game['chosen_mode']]
+    while True:
+        if game['current_level'] and rng.random() < 0.15:
+            game['game_over'] = True
+            yield True
+            return
+        row = game['current_level']
+        col = rng.randrange(columns)
+        game['revealed'][row] = col
+        if col == game['monkey_positions'][row] or col in game['extra_monkeys'][row]:
+            game['game_over'] = True
+            yield True
+            return
+        game['current_level'] += 1
+        if game['current_level'] == 9:
+            game['game_over'] = True
+            yield True
+            return
+        yield False
+
+def test_incremental_render_matches_full_render():
+    rng = random.Random(43)
+    # As tower_command leaves it, before the first game
+    game = {'chosen_mode': 'Easy', 'current_level': -1, 'monkey_positions': None, 'extra_monkeys': [[] for _ in range(9)],
+            'revealed': [None] * 9, 'game_over': False}
+    assert cells(tower.generate_grid_buttons(game)) == fresh_render(game, False)
+    renders = 0
+    for _ in range(500):
+        if rng.random() < 0.3:
+            # A mode change between games, re-rendering the ended board
+            game['chosen_mode'] = rng.choice(tower.MODES)
+            expected = fresh_render(game, game['game_over'])
+            assert cells(tower.generate_grid_buttons(game, reveal_all=game['game_over'])) == expected
+        for reveal_all in play(rng, game):
+            expected = fresh_render(game, reveal_all)
+            assert cells(tower.generate_grid_buttons(game, reveal_all)) == expected
+            renders += 1
+    assert renders > 1000
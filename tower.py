@@ -1,9 +1,18 @@
+import logging
 import random
 import asyncio
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.error import RetryAfter
-from database import user_exists, get_user_balance, update_user_balance
-from utils import logger, send_with_retry
+from keyboards import KeyboardGrid, button
+from database import user_exists
+from utils import send_with_retry
+from ledger import new_round_id
+from holds import reserve, capture, available_balance
+from metrics import timed_handler
+from money import Money, ZERO
+from payouts import tower_multiplier
+
+logger = logging.getLogger(__name__)
 
 # Game configurations
 MODE_CONFIG = {
@@ -12,74 +21,93 @@ MODE_CONFIG = {
     'Hard': 2
 }
 MODES = ['Easy', 'Medium', 'Hard']
-
-MULTIPLIERS = {
-    'Easy': [1.31, 1.74, 2.32, 3.10, 4.13, 5.51, 7.34, 9.79, 13.05],
-    'Medium': [1.47, 2.21, 3.31, 4.96, 7.44, 11.16, 16.74, 25.11, 37.67],
-    'Hard': [1.72, 3.68, 7.84, 14.68, 30.36, 62.72, 125.44, 250.88, 501.76]
+# Monkeys added to each level on top of the one every level has
+EXTRA_MONKEYS = {
+    'Easy': (0, 0, 0, 0, 0, 1, 1, 1, 2),
+    'Medium': (0, 0, 0, 0, 1, 1, 1, 1, 1),
+    'Hard': (0, 0, 0, 1, 1, 1, 1, 1, 1)
 }
 
+def deal_monkeys(mode, rng=random):
+    """
+    Place the monkeys of a new tower: one per level, plus EXTRA_MONKEYS[mode] on other columns.
+
+    Returns:
+        tuple: (monkey column per level, list of extra monkey columns per level).
+    """
+    columns = MODE_CONFIG[mode]
+    positions = [rng.randint(0, columns - 1) for _ in range(9)]
+    extras = [rng.sample([c for c in range(columns) if c != position], count) if count else []
+              for position, count in zip(positions, EXTRA_MONKEYS[mode])]
+    return positions, extras
+
 def get_potential_winnings(game):
     if game['current_level'] > 0:
-        multiplier = MULTIPLIERS[game['chosen_mode']][game['current_level'] - 1]
-        return game['bet_amount'] * multiplier
-    return 0
+        return game['bet_amount'] * tower_multiplier(game['chosen_mode'], game['current_level'])
+    return ZERO
 
-def generate_grid_buttons(game, reveal_all=False):
-    columns = MODE_CONFIG[game['chosen_mode']]
-    current_level = game['current_level']
+def _tile(game, row, col, reveal_all):
+    # (text, callback_data) of one tower cell
     revealed = game['revealed']
-    monkey_positions = game['monkey_positions']
-    grid_buttons = []
+    if reveal_all or game['game_over']:
+        is_monkey = col == game['monkey_positions'][row]
+        if row == 8:
+            emoji = "🐒" if is_monkey else "🍌"
+        else:
+            emoji = "🐒" if is_monkey else "🌴"
+        return (f"> {emoji} <" if col == revealed[row] else emoji), "tower_noop"
+    current_level = game['current_level']
+    if row < current_level:
+        return ("> 🌴 <" if col == revealed[row] else " "), "tower_noop"
+    if row == current_level:
+        emoji = "🍌" if current_level == 8 else "🟩"
+        if revealed[row] is not None and col == revealed[row]:
+            return f"> {emoji} <", "tower_noop"
+        return emoji, f"tower_choose_{col}_{row}"
+    return " ", "tower_noop"
+
+def _changed_rows(last, state):
+    # Rows whose cells can differ between two renders of the (level, revealed, over, monkeys) state
+    if last == state:
+        return ()
+    if last is None or last[2] or state[2]:
+        return range(9)
+    # The level is -1 before the first game and 9 at the top, past the rows of the board
+    low, high = sorted((last[0], state[0]))
+    return set(range(max(low, 0), min(high, 8) + 1)).union(row for row in range(9) if last[1][row] != state[1][row])
 
-    for row in range(8, -1, -1):
-        row_buttons = []
+def generate_grid_buttons(game, reveal_all=False):
+    columns = MODE_CONFIG[game['chosen_mode']]
+    # The keyboard of the last render is kept in the game with the state it showed, so only
+    # the rows that changed since are visited and only cells that changed get a new button
+    keyboard = game.get('keyboard')
+    if keyboard is None or keyboard.columns != columns:
+        keyboard = game['keyboard'] = KeyboardGrid(9, columns)
+    over = reveal_all or game['game_over']
+    state = (game['current_level'], tuple(game['revealed']), over, tuple(game['monkey_positions'] or ()) if over else None)
+    for row in _changed_rows(keyboard.state, state):
         for col in range(columns):
-            if reveal_all or game['game_over']:
-                is_monkey = col == monkey_positions[row]
-                if row == 8:
-                    emoji = "🐒" if is_monkey else "🍌"
-                else:
-                    emoji = "🐒" if is_monkey else "🌴"
-                if col == revealed[row]:
-                    row_buttons.append(InlineKeyboardButton(f"> {emoji} <", callback_data="noop"))
-                else:
-                    row_buttons.append(InlineKeyboardButton(emoji, callback_data="noop"))
-            elif row < current_level:
-                if col == revealed[row]:
-                    row_buttons.append(InlineKeyboardButton("> 🌴 <", callback_data="noop"))
-                else:
-                    row_buttons.append(InlineKeyboardButton(" ", callback_data="noop"))
-            elif row == current_level:
-                if current_level == 8:
-                    emoji = "🍌"
-                else:
-                    emoji = "🟩"
-                if revealed[row] is not None and col == revealed[row]:
-                    row_buttons.append(InlineKeyboardButton(f"> {emoji} <", callback_data="noop"))
-                else:
-                    row_buttons.append(InlineKeyboardButton(emoji, callback_data=f"tower_choose_{col}_{row}"))
-            else:
-                row_buttons.append(InlineKeyboardButton(" ", callback_data="noop"))
-        grid_buttons.append(row_buttons)
-    return grid_buttons
+            keyboard.set(8 - row, col, *_tile(game, row, col, reveal_all))
+    keyboard.state = state
+    return keyboard.buttons()
 
 def get_persistent_buttons(game):
     mode_change_counter = game.get('mode_change_counter', 0)
     if game['state'] == 'playing' and not game['game_over'] and game['current_level'] > 0:
-        action_button = [InlineKeyboardButton("Cash Out", callback_data="tower_cash_out")]
+        action_button = [button("Cash Out", "tower_cash_out")]
     else:
-        action_button = [InlineKeyboardButton("Start Game", callback_data="tower_start_game")]
+        action_button = [button("Start Game", "tower_start_game")]
     return [
         [
-            InlineKeyboardButton("⬅️", callback_data="tower_left"),
-            InlineKeyboardButton(game['chosen_mode'], callback_data=f"noop_{mode_change_counter}"),
-            InlineKeyboardButton("➡️", callback_data="tower_right")
+            button("⬅️", "tower_left"),
+            button(game['chosen_mode'], f"tower_noop_{mode_change_counter}"),
+            button("➡️", "tower_right")
         ],
         action_button,
-        [InlineKeyboardButton("Rules", callback_data="tower_rules")]
+        [button("Rules", "tower_rules")]
     ]
 
+@timed_handler
 async def tower_command(update, context):
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
@@ -94,7 +122,7 @@ async def tower_command(update, context):
         return
 
     try:
-        bet_amount = float(args[0])
+        bet_amount = Money.parse(args[0])
         if bet_amount <= 0:
             raise ValueError("Bet must be positive.")
 
@@ -111,9 +139,13 @@ async def tower_command(update, context):
             'mode_change_counter': 0,
             'ended_text': None
         }
+        # A new /tower abandons a round in play; its stake is lost as before
+        old_game = context.user_data.get('tower_game')
+        if old_game and old_game['state'] == 'playing' and not old_game['game_over']:
+            capture('tower', old_game['round_id'], {})
         context.user_data['tower_game'] = game
 
-        balance = get_user_balance(user_id)
+        balance = available_balance(user_id)
         text = f"🐒 Monkey Tower\n\nBet: ${bet_amount:.2f}\nBalance: ${balance:.2f}\n\nChoose game mode:"
         keyboard = generate_grid_buttons(game) + get_persistent_buttons(game)
         message = await send_with_retry(context.bot, chat_id, text=text, reply_markup=InlineKeyboardMarkup(keyboard))
@@ -121,13 +153,18 @@ async def tower_command(update, context):
     except ValueError as e:
         await send_with_retry(context.bot, chat_id, text=f"Invalid bet amount: {str(e)}. Use a positive number.")
 
+@timed_handler
 async def tower_button_handler(update, context):
     query = update.callback_query
     await query.answer()
     user_id = query.from_user.id
     chat_id = query.message.chat_id
     data = query.data
-    logger.info(f"Handling tower button: {data}")
+    logger.debug("Handling tower button: %s", data)
+
+    # Labels and cells that can't be picked
+    if data.startswith('tower_noop'):
+        return
 
     if 'tower_game' not in context.user_data:
         await query.edit_message_text("No active Monkey Tower game!")
@@ -135,7 +172,7 @@ async def tower_button_handler(update, context):
 
     game = context.user_data['tower_game']
     message_id = game['message_id']
-    balance = get_user_balance(user_id)
+    balance = available_balance(user_id)
 
     if data == 'tower_rules':
         rules_text = (
@@ -174,35 +211,16 @@ async def tower_button_handler(update, context):
         return
 
     if data == 'tower_start_game' and game['state'] in ['setup', 'ended']:
-        balance = get_user_balance(user_id)
-        if balance < game['bet_amount']:
+        balance = available_balance(user_id)
+        round_id = new_round_id()
+        if not reserve({user_id: game['bet_amount']}, 'tower', round_id):
             text = f"🐒 Monkey Tower\n\nBet: ${game['bet_amount']:.2f}\nBalance: ${balance:.2f}\n\nInsufficient balance to start!"
             await send_with_retry(context.bot, chat_id, text=text)
             return
-        update_user_balance(user_id, balance - game['bet_amount'])
         game['state'] = 'playing'
         game['current_level'] = 0
-        columns = MODE_CONFIG[game['chosen_mode']]
-        game['monkey_positions'] = [random.randint(0, columns - 1) for _ in range(9)]
-        game['extra_monkeys'] = [[] for _ in range(9)]
-
-        if game['chosen_mode'] == 'Easy':
-            for level in range(5, 9):
-                available_cols = [c for c in range(4) if c != game['monkey_positions'][level]]
-                if level == 8:
-                    extra = random.sample(available_cols, 2)
-                else:
-                    extra = random.sample(available_cols, 1)
-                game['extra_monkeys'][level] = extra
-        elif game['chosen_mode'] == 'Medium':
-            for level in range(4, 9):
-                available_cols = [c for c in range(3) if c != game['monkey_positions'][level]]
-                extra = random.sample(available_cols, 1)
-                game['extra_monkeys'][level] = extra
-        elif game['chosen_mode'] == 'Hard':
-            for level in range(3, 9):
-                other_col = 1 - game['monkey_positions'][level]
-                game['extra_monkeys'][level] = [other_col]
+        game['round_id'] = round_id
+        game['monkey_positions'], game['extra_monkeys'] = deal_monkeys(game['chosen_mode'])
 
         game['revealed'] = [None] * 9
         game['game_over'] = False
@@ -228,15 +246,16 @@ async def tower_button_handler(update, context):
             if col == monkey_col or col in extra_monkey_cols:
                 game['game_over'] = True
                 game['state'] = 'ended'
+                capture('tower', game['round_id'], {})
                 text = f"🐒 Monkey Tower\n\nBet: ${game['bet_amount']:.2f}\nBalance: ${balance:.2f}\n\nYou found the monkey and lost."
                 game['ended_text'] = text
                 keyboard = generate_grid_buttons(game, reveal_all=True) + get_persistent_buttons(game)
             else:
                 game['current_level'] += 1
                 if game['current_level'] == 9:
-                    multiplier = MULTIPLIERS[game['chosen_mode']][8]
+                    multiplier = tower_multiplier(game['chosen_mode'], 9)
                     winnings = game['bet_amount'] * multiplier
-                    update_user_balance(user_id, balance + winnings)
+                    capture('tower', game['round_id'], {user_id: winnings})
                     text = f"🐒 Monkey Tower\n\nBet: ${game['bet_amount']:.2f}\nBalance: ${balance + winnings:.2f}\n\nReached the top! Won ${winnings:.2f}"
                     game['state'] = 'ended'
                     game['game_over'] = True
@@ -252,9 +271,9 @@ async def tower_button_handler(update, context):
         elif data == "tower_cash_out":
             if game['game_over'] or game['current_level'] == 0:
                 return
-            multiplier = MULTIPLIERS[game['chosen_mode']][game['current_level'] - 1]
+            multiplier = tower_multiplier(game['chosen_mode'], game['current_level'])
             winnings = game['bet_amount'] * multiplier
-            update_user_balance(user_id, balance + winnings)
+            capture('tower', game['round_id'], {user_id: winnings})
             game['game_over'] = True
             game['state'] = 'ended'
             text = f"🐒 Monkey Tower\n\nBet: ${game['bet_amount']:.2f}\nBalance: ${balance + winnings:.2f}\n\nCashed out! Won ${winnings:.2f}"
@@ -1,12 +1,156 @@
 import logging
+import logging.handlers
 import asyncio
+import atexit
+import json
+import os
+import queue
+import random
+import time
 import telegram.error
+from metrics import API_LATENCY, API_RATE_LIMITED, API_FAILURES
+
+LOG_QUEUE_SIZE = 10000
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+    """
+    def format(self, record):
+        entry = {
+            'ts': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of low-level records per logger.
+
+    Args:
+        rates (dict): Logger name to fraction of records kept, e.g. {'utils': 0.01}.
+            Child loggers use the rate of their closest configured parent.
+        max_level (int): Records above this level are never sampled.
+    """
+    def __init__(self, rates, max_level=logging.DEBUG):
+        super().__init__()
+        self.rates = rates
+        self.max_level = max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or not self.rates:
+            return True
+        name = record.name
+        while name:
+            if name in self.rates:
+                return random.random() < self.rates[name]
+            name = name.rpartition('.')[0]
+        return True
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler renders every message before queueing it, which puts the
+    formatting cost back on the event loop. Records carrying mutable containers
+    are still rendered here, since a game dict may change before the listener
+    gets to it.
+
+    Args:
+        queue (queue.Queue): Bounded queue drained by the listener.
+        fallback (logging.Handler): Handler that writes WARNING and above records
+            directly when the queue is full, so only lower levels are ever dropped.
+    """
+    def __init__(self, queue, fallback=None):
+        super().__init__(queue)
+        self.fallback = fallback
+
+    def prepare(self, record):
+        args = record.args
+        if args and any(isinstance(arg, (dict, list, set)) for arg in (args.values() if isinstance(args, dict) else args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record):
+        # Drop low-level records rather than block the event loop when the writer falls behind
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.fallback is not None and record.levelno >= logging.WARNING:
+                self.fallback.handle(record)
+
+_listener = None
+
+def parse_sample_rates(spec):
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, rate = item.partition('=')
+        rates[name] = float(rate)
+    return rates
+
+def setup_logging(level=None, json_format=None, sample_rates=None):
+    """
+    Route all logging through a queue drained by a background thread.
+
+    Defaults come from LOG_LEVEL, LOG_FORMAT ('json' or 'text') and LOG_SAMPLE
+    ('utils=0.01,telegram=0.1').
+
+    Args:
+        level (int|str): Root log level.
+        json_format (bool): Emit JSON lines instead of plain text.
+        sample_rates (dict): Per-logger fraction of DEBUG records kept.
+    """
+    global _listener
+    level = level or os.environ.get('LOG_LEVEL', 'INFO')
+    if json_format is None:
+        json_format = os.environ.get('LOG_FORMAT', 'json') == 'json'
+    if sample_rates is None:
+        sample_rates = parse_sample_rates(os.environ.get('LOG_SAMPLE', ''))
+
+    if _listener is not None:
+        _listener.stop()
+    stream_handler = logging.StreamHandler()
+    if json_format:
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    queue_handler = LazyQueueHandler(log_queue, fallback=stream_handler)
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def shutdown_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
 
 # Logging setup
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging()
+atexit.register(shutdown_logging)
 logger = logging.getLogger(__name__)
 
 async def send_with_retry(bot, chat_id, text=None, emoji=None, reply_markup=None, reply_to_message_id=None, max_retries=3, **kwargs):
+    method = 'send_message' if text is not None else 'send_dice'
+    start = time.perf_counter()
+    try:
+        return await _send_with_retry(bot, chat_id, method, text, emoji, reply_markup, reply_to_message_id, max_retries, **kwargs)
+    finally:
+        API_LATENCY.observe(method, value=time.perf_counter() - start)
+
+async def _send_with_retry(bot, chat_id, method, text, emoji, reply_markup, reply_to_message_id, max_retries, **kwargs):
     for attempt in range(max_retries):
         try:
             if text is not None:
@@ -28,6 +172,7 @@ async def send_with_retry(bot, chat_id, text=None, emoji=None, reply_markup=None
             logger.warning("Timeout occurred. Retrying in 5 seconds...")
             await asyncio.sleep(5)
         except telegram.error.RetryAfter as e:
+            API_RATE_LIMITED.inc(method)
             wait_time = e.retry_after
             logger.warning(f"Rate limit hit. Waiting {wait_time} seconds...")
             await asyncio.sleep(wait_time)
@@ -35,5 +180,6 @@ async def send_with_retry(bot, chat_id, text=None, emoji=None, reply_markup=None
             logger.error(f"Error: {e}")
             if attempt < max_retries - 1:
                 await asyncio.sleep(1 * (2 ** attempt))
+    API_FAILURES.inc(method)
     logger.error("Failed after retries.")
     return None
\ No newline at end of file
@@ -0,0 +1,234 @@
+import argparse
+import asyncio
+import concurrent.futures
+import hmac
+import logging
+import threading
+import time
+from collections import deque
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+from telegram import Update
+import utils  # Sets up logging on import
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Webhook configurations
+DEFAULT_HOST = '0.0.0.0'
+DEFAULT_PORT = 8443
+DEFAULT_PATH = '/webhook'
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_WORKERS = 8
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# How long a request waits for the event loop to take its update before answering 503
+ENQUEUE_TIMEOUT = 2.0
+LATENCY_WINDOW = 1000
+
+UPDATE_LATENCY = metrics.histogram('bot_update_seconds', "Time from webhook receipt to the end of processing.")
+QUEUE_DEPTH = metrics.gauge('bot_update_queue_depth', "Updates waiting in the webhook queue.")
+WEBHOOK_UPDATES = metrics.counter('bot_webhook_updates_total', "Webhook requests by outcome.", ('outcome',))
+
+class WebhookStats:
+    """
+    Counters and a sliding latency window for the webhook pipeline.
+
+    Updated from the HTTP threads and the event loop, so every change goes through count().
+    """
+    def __init__(self, update_queue):
+        self.update_queue = update_queue
+        self.lock = threading.Lock()
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+        self.processed = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def count(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe(self, received_at):
+        latency = time.monotonic() - received_at
+        with self.lock:
+            self.processed += 1
+            self.latencies.append(latency)
+        UPDATE_LATENCY.observe(value=latency)
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            counts = {name: getattr(self, name) for name in ('received', 'rejected', 'dropped', 'processed', 'errors')}
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        return {
+            'queue_depth': self.update_queue.qsize(),
+            'queue_size': self.update_queue.maxsize,
+            **counts,
+            'latency_p50': percentile(0.50),
+            'latency_p99': percentile(0.99)
+        }
+
+def create_app(loop, update_queue, stats, secret_token, path=DEFAULT_PATH):
+    """
+    Build the Flask app that receives Telegram updates.
+
+    The endpoint only validates the secret token and hands the raw JSON over to the
+    event loop, so Telegram gets its 200 without waiting for any handler to run. The
+    200 is only sent once the update is in the queue; a full queue answers 503 so
+    Telegram sends the update again later.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): Loop running the update workers.
+        update_queue (asyncio.Queue): Bounded queue the workers consume.
+        stats (WebhookStats): Counters shared with the workers.
+        secret_token (str): Value expected in the secret token header, or None to skip the check.
+        path (str): URL path of the webhook endpoint.
+
+    Returns:
+        Flask: The webhook application.
+    """
+    app = Flask(__name__)
+
+    async def offer(item):
+        # Runs on the loop, so the check and the put can't interleave with another request's
+        try:
+            update_queue.put_nowait(item)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def enqueue(item):
+        future = asyncio.run_coroutine_threadsafe(offer(item), loop)
+        try:
+            return future.result(timeout=ENQUEUE_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            # cancel() fails if offer already ran; its answer stands then
+            return False if future.cancel() else future.result()
+
+    @app.route(path, methods=['POST'])
+    def receive_update():
+        if secret_token is not None:
+            header = request.headers.get(SECRET_HEADER, '')
+            if not hmac.compare_digest(header, secret_token):
+                stats.count('rejected')
+                WEBHOOK_UPDATES.inc('rejected')
+                return '', 403
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return '', 400
+        # Let Telegram retry later instead of accepting work we can't queue
+        if not enqueue((time.monotonic(), data)):
+            stats.count('dropped')
+            WEBHOOK_UPDATES.inc('dropped')
+            return '', 503
+        stats.count('received')
+        WEBHOOK_UPDATES.inc('accepted')
+        return '', 200
+
+    @app.route('/stats', methods=['GET'])
+    def webhook_stats():
+        return jsonify(stats.snapshot())
+
+    metrics.register_collector(lambda: QUEUE_DEPTH.set(value=update_queue.qsize()))
+    return metrics.add_metrics_route(app)
+
+async def update_worker(process_update, update_queue, stats):
+    while True:
+        received_at, data = await update_queue.get()
+        try:
+            await process_update(data)
+        except Exception as e:
+            stats.count('errors')
+            logger.error(f"Error processing webhook update: {e}")
+        finally:
+            stats.observe(received_at)
+            update_queue.task_done()
+
+async def serve(process_update, secret_token=None, host=DEFAULT_HOST, port=DEFAULT_PORT, path=DEFAULT_PATH,
+                queue_size=DEFAULT_QUEUE_SIZE, workers=DEFAULT_WORKERS, stop_event=None):
+    """
+    Run the webhook HTTP server and a pool of worker coroutines until `stop_event` is set.
+
+    Args:
+        process_update (callable): Coroutine function called with each raw update dict.
+        secret_token (str): Expected secret token header value.
+        host (str): Interface to bind.
+        port (int): Port to bind.
+        path (str): URL path of the webhook endpoint.
+        queue_size (int): Maximum number of queued updates.
+        workers (int): Number of worker coroutines.
+        stop_event (asyncio.Event): Event that stops the server when set.
+    """
+    loop = asyncio.get_running_loop()
+    update_queue = asyncio.Queue(maxsize=queue_size)
+    stats = WebhookStats(update_queue)
+    app = create_app(loop, update_queue, stats, secret_token, path)
+    # Per-request access lines would cost more than the enqueue itself
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='webhook-http', daemon=True)
+    thread.start()
+    tasks = [asyncio.create_task(update_worker(process_update, update_queue, stats)) for _ in range(workers)]
+    logger.info(f"Webhook listening on {host}:{port}{path} with {workers} workers, queue size {queue_size}")
+    stop_event = stop_event or asyncio.Event()
+    try:
+        await stop_event.wait()
+    finally:
+        server.shutdown()
+        await update_queue.join()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+async def run_webhook(application, webhook_url=None, secret_token=None, **kwargs):
+    """
+    Serve a python-telegram-bot Application through the webhook.
+
+    Args:
+        application (telegram.ext.Application): Application with its handlers registered.
+        webhook_url (str): Public URL to register with Telegram, or None if already set.
+        secret_token (str): Secret token shared with Telegram.
+        **kwargs: Passed on to `serve`.
+    """
+    async def process_update(data):
+        await application.process_update(Update.de_json(data, application.bot))
+
+    metrics.track_application(application)
+    await application.initialize()
+    await application.start()
+    if webhook_url:
+        await application.bot.set_webhook(url=webhook_url, secret_token=secret_token)
+    try:
+        await serve(process_update, secret_token=secret_token, **kwargs)
+    finally:
+        await application.stop()
+        await application.shutdown()
+
+def main():
+    # Standalone mode parses updates without handlers, for exercising the pipeline with loadgen.py
+    parser = argparse.ArgumentParser(description="Run the webhook ingestion pipeline without a bot.")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--path', default=DEFAULT_PATH)
+    parser.add_argument('--secret', default=None)
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--handler-delay', type=float, default=0.0, help="Simulated handler time in seconds.")
+    args = parser.parse_args()
+
+    async def process_update(data):
+        Update.de_json(data, None)
+        if args.handler_delay:
+            await asyncio.sleep(args.handler_delay)
+
+    asyncio.run(serve(process_update, secret_token=args.secret, host=args.host, port=args.port, path=args.path,
+                      queue_size=args.queue_size, workers=args.workers))
+
+if __name__ == '__main__':
+    main()